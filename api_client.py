@@ -0,0 +1,194 @@
+# api_client.py — общий HTTP-клиент API zargates: keep-alive, пул соединений, ретраи
+#
+# Базовый адрес — "api_base_url" в config.json (по умолчанию demo-api-rd).
+# Ретраи с экспоненциальной задержкой и джиттером на 5xx/429 и сетевых ошибках,
+# 429 учитывает Retry-After. По каждому эндпоинту копится статистика задержек.
+import json, random, threading, time
+from collections import deque
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+CONFIG_FILE = Path(__file__).with_name("config.json")
+DEFAULT_BASE_URL = "https://demo-api-rd.zargates.com"
+
+BALANCES_PATH = "/api/v1/balances"
+INVENTORY_PATH = "/api/v1/offer-manager/user/inventory"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+class ApiClient:
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, pool_size: int = 16, retries: int = 3,
+                 backoff_s: float = 0.3, backoff_max_s: float = 5.0, timeout_s: float = 20):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.timeout_s = timeout_s
+
+        self.session = requests.Session()
+        # pool_block=True — при нехватке соединений поток ждёт, а не открывает лишнее
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"accept": "application/json"})
+
+        self._lock = threading.Lock()
+        self._latency: dict[str, deque] = {}
+        self._counts: dict[str, dict[str, int]] = {}
+
+    # ----------------- статистика -----------------
+
+    def _record(self, path: str, took_s: float, outcome: str):
+        with self._lock:
+            self._latency.setdefault(path, deque(maxlen=10000)).append(took_s * 1000)
+            c = self._counts.setdefault(path, {"ok": 0, "error": 0, "retry": 0})
+            c[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for path, lat in self._latency.items():
+                vals = sorted(lat)
+                out[path] = {
+                    **self._counts.get(path, {}),
+                    "p50_ms": round(_percentile(vals, 0.50), 1),
+                    "p95_ms": round(_percentile(vals, 0.95), 1),
+                    "max_ms": round(vals[-1], 1) if vals else 0.0,
+                }
+            return out
+
+    def report(self):
+        st = self.stats()
+        if not st:
+            return
+        print("\n=== API: задержки запросов ===")
+        for path, s in st.items():
+            print(f"{path:<42} ok {s['ok']:>4}  err {s['error']:>3}  retry {s['retry']:>3}  "
+                  f"p50 {s['p50_ms']:>7.1f}  p95 {s['p95_ms']:>7.1f}  max {s['max_ms']:>7.1f} мс")
+        print("==============================\n")
+
+    # ----------------- запросы -----------------
+
+    def _sleep_before_retry(self, attempt: int, resp: requests.Response | None):
+        delay = min(self.backoff_max_s, self.backoff_s * (2 ** attempt))
+        if resp is not None and resp.status_code == 429:
+            try:
+                delay = max(delay, float(resp.headers.get("Retry-After", 0)))
+            except ValueError:
+                pass
+        # «full jitter»: равномерно от 0 до delay, чтобы воркеры не били синхронно
+        time.sleep(random.uniform(0, delay))
+
+    def request(self, method: str, path: str, token: str | None = None, params: dict | None = None,
+                timeout_s: float | None = None) -> requests.Response:
+        # последний ответ возвращается как есть (в т.ч. 4xx/5xx); сетевая ошибка после
+        # исчерпания ретраев пробрасывается
+        headers = {"authorization": f"Bearer {token}"} if token else None
+        url = self.base_url + path
+        with tracing.span(f"{method} {path}", cat="http") as sp:
+            resp = self._request_with_retries(method, path, url, headers, params, timeout_s, sp)
+            sp.set(ok=resp.ok, status=resp.status_code)
+            return resp
+
+    def _request_with_retries(self, method, path, url, headers, params, timeout_s, sp) -> requests.Response:
+        # каждая попытка либо возвращает ответ / пробрасывает ошибку, либо ведёт к паузе
+        # и следующей; последняя (attempt == retries) ретраев уже не делает
+        attempt = 0
+        while True:
+            final = attempt >= self.retries
+            started = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, headers=headers, params=params,
+                                            timeout=timeout_s or self.timeout_s)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(path, time.perf_counter() - started, "error" if final else "retry")
+                if final:
+                    raise
+                resp = None
+            else:
+                took = time.perf_counter() - started
+                if final or resp.status_code not in RETRY_STATUSES:
+                    self._record(path, took, "ok" if resp.ok else "error")
+                    sp.set(attempts=attempt + 1)
+                    return resp
+                self._record(path, took, "retry")
+            self._sleep_before_retry(attempt, resp)
+            attempt += 1
+
+    def get(self, path: str, token: str | None = None, params: dict | None = None, **kw) -> requests.Response:
+        return self.request("GET", path, token=token, params=params, **kw)
+
+    # ----------------- эндпоинты -----------------
+
+    def fetch_balances(self, token: str) -> tuple[dict | None, int | None]:
+        # как прежний fetch_balances_from_api: (json, код) / (None, 401) / (None, None)
+        if not token:
+            return None, None
+        try:
+            r = self.get(BALANCES_PATH, token)
+            if r.status_code == 401:
+                return None, 401
+            r.raise_for_status()
+            return r.json(), r.status_code
+        except Exception as e:
+            print(f"[api] Ошибка запроса балансов: {e}")
+            return None, None
+
+    def get_balances(self, token: str) -> dict:
+        r = self.get(BALANCES_PATH, token)
+        r.raise_for_status()
+        return r.json()
+
+    def get_inventory_page(self, token: str, page: int = 1, limit: int = 999, **filters):
+        params = {"page": page, "limit": limit, "filter": "ALL", "rarity_filter": "ALL",
+                  "tradeable": "false", "for_trade": "false", **filters}
+        r = self.get(INVENTORY_PATH, token, params=params)
+        r.raise_for_status()
+        return r.json()
+
+def unwrap_items(data) -> list:
+    # массив предметов из ответа inventory: {data|items|inventory: [...]} или сам список
+    if isinstance(data, dict):
+        for key in ("data", "items", "inventory"):
+            if isinstance(data.get(key), list):
+                return data[key]
+    elif isinstance(data, list):
+        return data
+    return []
+
+# ----------------- общий экземпляр на процесс -----------------
+
+_client: ApiClient | None = None
+_client_lock = threading.Lock()
+
+def _base_url_from_config() -> str:
+    try:
+        cfg = json.loads(CONFIG_FILE.read_text(encoding="utf-8"))
+        return cfg.get("api_base_url") or DEFAULT_BASE_URL
+    except Exception:
+        return DEFAULT_BASE_URL
+
+def client() -> ApiClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient(_base_url_from_config())
+        return _client
+
+def configure(**kwargs) -> ApiClient:
+    # пересоздать общий клиент с другими параметрами (base_url, pool_size, retries…)
+    global _client
+    with _client_lock:
+        kwargs.setdefault("base_url", _base_url_from_config())
+        _client = ApiClient(**kwargs)
+        return _client
@@ -0,0 +1,102 @@
+# async_api.py — параллельная проверка после покупки: балансы, инвентарь и прочие
+# эндпоинты для одного или сотен токенов одновременно
+#
+#   results = fetch_many_sync(tokens, ["balances", "inventory"], concurrency=32)
+#   results[token]["balances"] -> {"ok": True, "data": {...}, "error": None, "code": 200, "ms": 84.1}
+#
+# Запросы идут через общий api_client (пул соединений, ретраи) в отдельном пуле
+# потоков; общий семафор ограничивает число одновременных запросов, у каждого
+# запроса свой таймаут. Время проверки — самый медленный вызов, а не сумма.
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
+
+import api_client
+import inventory
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_TIMEOUT_S = 20
+
+# имя -> функция (client, token) -> данные; исключение = ошибка эндпоинта
+ENDPOINTS = {
+    "balances":  lambda c, token: c.get_balances(token),
+    "inventory": lambda c, token: list(inventory.iter_inventory(token, prefetch=2, client=c)),
+}
+
+def register(name: str, fn):
+    # добавить эндпоинт проверки: fn(client, token) -> данные
+    ENDPOINTS[name] = fn
+
+def _status(exc: Exception) -> int | None:
+    resp = getattr(exc, "response", None)
+    return getattr(resp, "status_code", None)
+
+class AsyncApi:
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, timeout_s: float = DEFAULT_TIMEOUT_S,
+                 client: api_client.ApiClient | None = None):
+        self.concurrency = concurrency
+        self.timeout_s = timeout_s
+        self.client = client or api_client.client()
+        self._sem = asyncio.Semaphore(concurrency)
+        # свой пул: не делим дефолтный executor с asyncio.to_thread из сценариев
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="api")
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def call(self, name: str, token: str) -> dict:
+        fn = ENDPOINTS[name]
+        loop = asyncio.get_running_loop()
+        async with self._sem:
+            started = time.perf_counter()
+            try:
+                data = await asyncio.wait_for(loop.run_in_executor(self._pool, fn, self.client, token),
+                                              self.timeout_s)
+                res = {"ok": True, "data": data, "error": None, "code": 200}
+            except asyncio.TimeoutError:
+                # поток с запросом доработает сам, но результат уже не ждём
+                res = {"ok": False, "data": None, "error": f"таймаут {self.timeout_s} с", "code": None}
+            except Exception as e:
+                res = {"ok": False, "data": None, "error": str(e), "code": _status(e)}
+            res["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return res
+
+    async def fetch_account(self, token: str, endpoints=("balances", "inventory")) -> dict:
+        endpoints = list(endpoints)
+        results = await asyncio.gather(*(self.call(name, token) for name in endpoints))
+        return dict(zip(endpoints, results))
+
+    async def fetch_many(self, tokens, endpoints=("balances", "inventory")) -> dict:
+        tokens = list(dict.fromkeys(tokens))
+        results = await asyncio.gather(*(self.fetch_account(t, endpoints) for t in tokens))
+        return dict(zip(tokens, results))
+
+# ----------------- короткие обёртки -----------------
+
+async def fetch_many(tokens, endpoints=("balances", "inventory"), concurrency: int = DEFAULT_CONCURRENCY,
+                     timeout_s: float = DEFAULT_TIMEOUT_S) -> dict:
+    async with AsyncApi(concurrency, timeout_s) as api:
+        return await api.fetch_many(tokens, endpoints)
+
+def fetch_many_sync(tokens, endpoints=("balances", "inventory"), concurrency: int = DEFAULT_CONCURRENCY,
+                    timeout_s: float = DEFAULT_TIMEOUT_S) -> dict:
+    # для синхронных скриптов (start_tma.py, buy_*.py)
+    return asyncio.run(fetch_many(tokens, endpoints, concurrency, timeout_s))
+
+def report(results: dict):
+    # сводка: по эндпоинту — успехи и самый медленный вызов
+    per = {}
+    for by_ep in results.values():
+        for name, r in by_ep.items():
+            s = per.setdefault(name, {"ok": 0, "error": 0, "max_ms": 0.0})
+            s["ok" if r["ok"] else "error"] += 1
+            s["max_ms"] = max(s["max_ms"], r["ms"])
+    print(f"\n=== Параллельная проверка API: {len(results)} акк. ===")
+    for name, s in per.items():
+        print(f"{name:<12} ok {s['ok']:>4}  err {s['error']:>3}  самый медленный {s['max_ms']:>8.1f} мс")
+    print("=====================================\n")
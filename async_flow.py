@@ -0,0 +1,256 @@
+# async_flow.py — планировщик сценариев на asyncio и playwright.async_api
+#
+# Один процесс и один event loop ведут много страниц сразу:
+#   python async_flow.py --concurrency 8 --accounts acc1 acc2 --scenarios diamonds emeralds --repeat 3
+#
+# Профили аккаунтов — те же .accounts/<имя>/profile, что у parallel_runner.py.
+# С --storage-state каждая задача получает свой контекст из снимка входа, и
+# сценарии одного аккаунта тоже идут параллельно. Шаги Telegram и WebApp — async-
+# варианты из purchase_runner.py, те же, что у sync-сценариев buy_*.py.
+import argparse, asyncio, time
+from collections import defaultdict
+from playwright.async_api import async_playwright
+
+import async_api
+import balance_index
+import balance_store
+import credit_poll
+import debug_capture
+import purchase_runner
+import selector_cache
+import snapshot
+import storage_state
+import token_cache
+import token_sniffer
+import tracing
+import waits
+from browser_server import LAUNCH_ARGS, VIEWPORT
+from purchase_runner import (
+    SCENARIOS, TG_WEB_URL, account_dir, buy_async, click_play_async, credit_stats,
+    get_auth_token_from_webapp_frame_async, load_balances, load_config, maybe_confirm_modal_async,
+    open_tg_async, print_summary, wait_webapp_iframe_async,
+)
+
+def log(msg):
+    print(f"[async] {msg}", flush=True)
+
+# ----------------- балансы -----------------
+
+_api: async_api.AsyncApi | None = None
+
+@tracing.traced("balances_api", cat="api", check=lambda r: r[0] is not None)
+async def fetch_balances(token: str) -> tuple[dict | None, int | None]:
+    # через общий async_api: пул потоков и потолок одновременных запросов на весь прогон
+    global _api
+    if not token:
+        return None, None
+    if _api is None:
+        _api = async_api.AsyncApi()
+    r = await _api.call("balances", token)
+    if not r["ok"]:
+        log(f"Ошибка запроса балансов: {r['error']}")
+    return r["data"], r["code"]
+
+# ----------------- сценарии и планировщик -----------------
+
+async def run_scenario(ctx, account: str, scenario: str, tg_web_url: str, balances_lock,
+                       sniffer: token_sniffer.TokenSniffer | None = None, credit_cfg: dict | None = None,
+                       debug_cfg: dict | None = None) -> dict:
+    # план WebApp и актив — из модуля сценария (buy_*.py), шаги — общие из purchase_runner
+    mod = purchase_runner.scenario(scenario)
+    extract = lambda obj: balance_index.value(obj, mod.ASSET)
+    d = account_dir(account)
+    tracing.set_lane(f"{account}/{scenario}")
+    balance_store.set_account(account)
+    result = {"account": account, "scenario": scenario, "ok": False, "delta": None}
+    started = time.perf_counter()
+    page = await ctx.new_page()
+    debug = debug_capture.attach(page, debug_cfg, name=f"{account}/{scenario}")
+    try:
+        await open_tg_async(page, tg_web_url)
+        if not await click_play_async(page):
+            log(f"{account}/{scenario}: не удалось нажать Play.")
+        await maybe_confirm_modal_async(page)
+        frame = await wait_webapp_iframe_async(page, timeout_ms=30000)
+        if frame:
+            result["ok"] = await buy_async(page, frame, mod.PLAN)
+            flow_done = time.perf_counter()
+        else:
+            log(f"{account}/{scenario}: ⚠ WebApp iframe не нашёлся.")
+
+        tokens = token_cache.for_file(d / "auth.json")
+        with tracing.span("token", cat="token") as sp:
+            token = await sniffer.wait_async(page, timeout_ms=3000 if frame else 0) if sniffer else None
+            source = "network" if token else "auth.json"
+            token = token or tokens.get()
+            sp.set(ok=bool(token), source=source)
+        if not token and frame:
+            token = await get_auth_token_from_webapp_frame_async(frame)
+            if token:
+                tokens.put(token)
+        if token:
+            new_balances, code = await fetch_balances(token)
+        else:
+            # без токена API всё равно ответит 401 — запрос не тратим
+            log(f"{account}/{scenario}: ⚠ токен не найден — балансы не запрошены.")
+            new_balances, code = None, None
+        if code == 401:
+            tokens.invalidate(token)
+            t2 = sniffer.token if sniffer and sniffer.token != token else None
+            if not t2 and frame:
+                t2 = await get_auth_token_from_webapp_frame_async(frame)
+            if t2 and t2 != token:
+                tokens.put(t2)
+                token = t2
+                new_balances, code = await fetch_balances(token)
+
+        # зачисление может прийти не сразу — опрашиваем до ожидаемого изменения
+        if result["ok"] and new_balances:
+            poll_cfg = credit_cfg or {}
+            expected = (poll_cfg.get("expected_delta") or {}).get(mod.ASSET)
+            old_balances = load_balances(d / "balances.json")
+            credit = await credit_poll.wait_for_credit_async(
+                lambda: fetch_balances(token), extract, extract(old_balances) if old_balances else None,
+                new_balances, flow_done=flow_done, expected=expected, cfg=poll_cfg,
+            )
+            new_balances = credit["balances"]
+            result["time_to_credit_ms"] = credit["time_to_credit_ms"]
+            balance_store.record_credit(mod.ASSET, credit, expected)
+
+        # balances.json аккаунта общий для его сценариев — читаем и пишем под замком
+        async with balances_lock:
+            old_balances = load_balances(d / "balances.json")
+            old_val = extract(old_balances) if old_balances else None
+            new_val = extract(new_balances) if new_balances else None
+            if old_val is not None and new_val is not None:
+                result["delta"] = new_val - old_val
+            if new_balances:
+                # в очередь фоновой записи — задача не ждёт диска
+                balance_store.record(new_balances, scenario=scenario)
+                snapshot.write_obj(d / "balances.json", new_balances)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        if not result["ok"]:
+            debug.dump(result.get("error") or "сценарий не прошёл")
+        debug.close()
+        await page.close()
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    log(f"{account}/{scenario}: {'OK' if result['ok'] else 'FAIL'} Δ={result['delta']} за {result['seconds']} с")
+    return result
+
+async def run_all(jobs: list[tuple[str, str]], concurrency: int, headless: bool = False,
+                  from_snapshot: bool = False) -> dict:
+    global _api
+    cfg = load_config()
+    tracing.configure(cfg.get("trace"))
+    balance_store.configure(cfg.get("balance_store"))
+    balance_store.set_batch(balance_store.new_batch_id("async"))
+    tg_web_url = cfg.get("tg_web_url") or TG_WEB_URL
+    sem = asyncio.Semaphore(concurrency)
+    contexts = {}
+    sniffers = {}
+    launch_locks = defaultdict(asyncio.Lock)
+    balances_locks = defaultdict(asyncio.Lock)
+    browser = None
+    started = time.perf_counter()
+
+    async with async_playwright() as p:
+        def watch_token(ctx, account):
+            sniffer = token_sniffer.TokenSniffer(ctx)
+            sniffer.on_token(token_cache.for_file(account_dir(account) / "auth.json").put)
+            return sniffer
+
+        async def get_ctx(account):
+            # один persistent-контекст на аккаунт, страницы сценариев — вкладки в нём
+            async with launch_locks[account]:
+                if account not in contexts:
+                    with tracing.span("browser_launch", cat="browser", account=account):
+                        contexts[account] = await p.chromium.launch_persistent_context(
+                            user_data_dir=str(account_dir(account) / "profile"),
+                            headless=headless, channel="chrome", args=LAUNCH_ARGS, viewport=VIEWPORT,
+                        )
+                    log(f"✔ Запущен Chrome для {account}.")
+                    # один слушатель токена на контекст аккаунта
+                    sniffers[account] = watch_token(contexts[account], account)
+            return contexts[account], sniffers[account]
+
+        async def snapshot_ctx(account):
+            # --storage-state: свой лёгкий контекст на задачу в общем Chrome, сценарии
+            # одного аккаунта идут параллельно; профиль открывается только для экспорта
+            nonlocal browser
+            async with launch_locks[account]:
+                path = await storage_state.ensure_async(p, account_dir(account) / "profile", cfg)
+                if browser is None:
+                    browser = await p.chromium.launch(headless=headless, channel="chrome", args=LAUNCH_ARGS)
+                    log("✔ Запущен общий Chrome для контекстов из снимков.")
+            with tracing.span("browser_launch", cat="browser", account=account, mode="snapshot"):
+                ctx = await browser.new_context(storage_state=path, viewport=VIEWPORT)
+            return ctx, watch_token(ctx, account)
+
+        async def one(account, scenario):
+            async with sem:
+                if not from_snapshot:
+                    ctx, sniffer = await get_ctx(account)
+                    return await run_scenario(ctx, account, scenario, tg_web_url, balances_locks[account], sniffer,
+                                              cfg.get("credit_poll"), cfg.get("debug_capture"))
+                ctx, sniffer = await snapshot_ctx(account)
+                try:
+                    res = await run_scenario(ctx, account, scenario, tg_web_url, balances_locks[account], sniffer,
+                                             cfg.get("credit_poll"), cfg.get("debug_capture"))
+                    if res["ok"]:
+                        await storage_state.save_async(ctx, storage_state.state_path(account_dir(account) / "profile"))
+                    return res
+                finally:
+                    await ctx.close()
+
+        try:
+            results = await asyncio.gather(*(one(a, s) for a, s in jobs))
+        finally:
+            for ctx in contexts.values():
+                await ctx.close()
+            if browser is not None:
+                await browser.close()
+            selector_cache.save()
+            balance_store.flush()
+            if _api is not None:
+                _api.close()
+                _api = None
+
+    wall = time.perf_counter() - started
+    ok = sum(1 for r in results if r["ok"])
+    return {
+        "workers": concurrency,
+        "batch": balance_store.current_batch(),
+        "jobs": len(results),
+        "purchases_ok": ok,
+        "purchases_failed": len(results) - ok,
+        "wall_seconds": round(wall, 2),
+        "purchases_per_minute": round(ok / (wall / 60.0), 2) if wall > 0 else 0.0,
+        **credit_stats(results),
+        "results": list(results),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Конкурентный прогон buy_* сценариев в одном event loop")
+    ap.add_argument("--concurrency", type=int, default=4, help="сколько страниц ведём одновременно")
+    ap.add_argument("--accounts", nargs="+", required=True)
+    ap.add_argument("--scenarios", nargs="+", default=["diamonds"], choices=sorted(SCENARIOS))
+    ap.add_argument("--repeat", type=int, default=1, help="сколько раз повторить каждую пару")
+    ap.add_argument("--headless", action="store_true")
+    ap.add_argument("--storage-state", action="store_true",
+                    help="контексты из снимка входа (storage_state.py) вместо persistent-профилей")
+    args = ap.parse_args()
+
+    jobs = [(a, s) for _ in range(args.repeat) for a in args.accounts for s in args.scenarios]
+    summary = asyncio.run(run_all(jobs, args.concurrency, args.headless, args.storage_state))
+    print_summary(summary)
+    waits.report_savings()
+    selector_cache.report()
+    balance_index.report()
+    token_cache.report()
+    debug_capture.report()
+    tracing.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# balance_index.py — один проход по ответу balances: индекс «актив -> число» для всех активов
+#
+#   balance_index.value(balances, "emeralds")            -> 120.0
+#   balance_index.values(balances, ("diamonds", "sapphires")) -> {"diamonds": 5.0, "sapphires": 0.0}
+#
+# Понимает все формы, что встречались в buy_*.py:
+#   {"diamond": 5}, {"balances": {"Emeralds": "1.2k"}},
+#   {"data": [{"asset": "SAPPHIRE", "amount": 3}, ...]}
+# Путь, где нашёлся актив, запоминается; следующие ответы той же формы читаются
+# прямым обращением по пути, полный обход — только когда форма поменялась.
+import re
+
+NAME_KEYS = ("asset", "asset_type", "type", "currency", "code", "name")
+NUMERIC_KEYS = (
+    "amount", "balance", "available", "available_balance",
+    "value", "qty", "quantity", "total", "current", "count",
+)
+
+# актив -> варианты написания в ответе API
+ASSETS = {
+    "diamonds":  ("diamond", "diamonds"),
+    "emeralds":  ("emerald", "emeralds"),
+    "sapphires": ("sapphire", "sapphires"),
+}
+
+_SUFFIX = {"k": 1_000, "m": 1_000_000, "b": 1_000_000_000}
+
+# имя актива (lower) -> (путь до числа, ключ имени у записи или None)
+_learned: dict[str, tuple[tuple, str | None]] = {}
+_stats = {"fast": 0, "scan": 0}
+
+def _coerce_num(v):
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        s = v.strip().replace(" ", "").replace("_", "")
+        m = re.fullmatch(r"([0-9]+(?:\.[0-9]+)?)([kKmMbB])?", s)
+        if m:
+            return float(m.group(1)) * _SUFFIX.get((m.group(2) or "").lower(), 1)
+        # всё, что понимает float: "-5", "1e3", "+2.5"
+        try:
+            return float(s)
+        except ValueError:
+            return None
+    return None
+
+def _names(asset) -> tuple[str, ...]:
+    if isinstance(asset, str):
+        return ASSETS.get(asset.lower(), (asset.lower(),))
+    return tuple(n.lower() for n in asset)
+
+# ----------------- полный обход -----------------
+
+def build(obj) -> dict[str, tuple[float, tuple, str | None]]:
+    # имя (lower) -> (значение, путь, ключ имени); при повторах побеждает самое мелкое вхождение
+    index: dict[str, tuple[float, tuple, str | None]] = {}
+    depth_of: dict[str, int] = {}
+
+    def put(name: str, num: float, path: tuple, name_key: str | None):
+        if name not in depth_of or len(path) < depth_of[name]:
+            index[name] = (num, path, name_key)
+            depth_of[name] = len(path)
+
+    stack = [(obj, ())]
+    while stack:
+        node, path = stack.pop()
+        if isinstance(node, dict):
+            for k, v in node.items():
+                if isinstance(v, (dict, list)):
+                    stack.append((v, path + (k,)))
+                elif isinstance(k, str):
+                    num = _coerce_num(v)
+                    if num is not None:
+                        put(k.strip().lower(), num, path + (k,), None)
+            for nk in NAME_KEYS:
+                name = node.get(nk)
+                if isinstance(name, str):
+                    for vk in NUMERIC_KEYS:
+                        num = _coerce_num(node.get(vk))
+                        if num is not None:
+                            put(name.strip().lower(), num, path + (vk,), nk)
+                            break
+                    break
+        elif isinstance(node, list):
+            for i in range(len(node) - 1, -1, -1):
+                stack.append((node[i], path + (i,)))
+    return index
+
+# ----------------- быстрый путь -----------------
+
+def _resolve(obj, name: str):
+    learned = _learned.get(name)
+    if learned is None:
+        return None
+    path, name_key = learned
+    node = obj
+    try:
+        for step in path[:-1]:
+            node = node[step]
+        if name_key is not None:
+            # запись в списке могла сместиться — проверяем, что это тот же актив
+            if str(node.get(name_key, "")).strip().lower() != name:
+                return None
+        elif path[-1].strip().lower() != name:
+            return None
+        return _coerce_num(node[path[-1]])
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+def values(obj, assets) -> dict:
+    # все активы за один обход (или вовсе без обхода, если форма знакома)
+    out, missing = {}, []
+    for asset in assets:
+        for name in _names(asset):
+            num = _resolve(obj, name)
+            if num is not None:
+                out[asset] = num
+                break
+        else:
+            missing.append(asset)
+    if not missing:
+        _stats["fast"] += 1
+        return out
+
+    _stats["scan"] += 1
+    index = build(obj)
+    for name, (_, path, name_key) in index.items():
+        _learned[name] = (path, name_key)
+    for asset in missing:
+        # из всех написаний актива — самое мелкое вхождение
+        hits = [index[n] for n in _names(asset) if n in index]
+        out[asset] = min(hits, key=lambda h: len(h[1]))[0] if hits else None
+    return out
+
+def value(obj, asset) -> float | None:
+    if not obj:
+        return None
+    return values(obj, (asset,))[asset]
+
+def report():
+    total = _stats["fast"] + _stats["scan"]
+    if total:
+        print(f"[balances] по запомненному пути: {_stats['fast']}/{total}, полный обход: {_stats['scan']}")
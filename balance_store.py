@@ -0,0 +1,411 @@
+# balance_store.py — история балансов в SQLite: снимки дописываются, не перезаписываются
+#
+# balances.json хранит только последний ответ API: сравнить можно лишь с прошлым
+# прогоном, а параллельные прогоны одного аккаунта затирают друг друга. Здесь каждый
+# снимок — строки (аккаунт, актив, время, значение) в balances.db, плюс результаты
+# ожидания зачисления (credit_poll) в отдельной таблице. Строки не меняются и не
+# удаляются; индексы по (account, asset, ts) и (batch, …) держат запросы быстрыми.
+#
+# Запись идёт через фоновый поток: record() кладёт строки в очередь, поток копит их
+# до flush_ms или max_batch и пишет одной транзакцией (WAL) — воркеры parallel_runner
+# и задачи async_flow не ждут диска и не выстраиваются в очередь на его блокировке.
+#
+#   python balance_store.py since 24h --account acc1       # Δ по активам с момента T
+#   python balance_store.py batch --last                    # Δ всей пачки по аккаунтам
+#   python balance_store.py latency --since 7d              # time-to-credit по активам
+#   python balance_store.py history --asset diamonds --limit 20
+#
+# Настройки в config.json (все необязательны):
+#   "balance_store": {"enabled": true, "path": "balances.db", "flush_ms": 200, "max_batch": 256}
+import argparse, atexit, contextvars, os, queue, sqlite3, threading, time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+import balance_index
+
+DEFAULTS = {
+    "enabled": True,
+    "path": str(Path(__file__).with_name("balances.db")),
+    "flush_ms": 200,
+    "max_batch": 256,
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS balances (
+    account  TEXT NOT NULL,
+    asset    TEXT NOT NULL,
+    ts       REAL NOT NULL,
+    value    REAL NOT NULL,
+    batch    TEXT,
+    scenario TEXT,
+    source   TEXT
+);
+CREATE INDEX IF NOT EXISTS balances_account_asset_ts ON balances (account, asset, ts);
+CREATE INDEX IF NOT EXISTS balances_batch ON balances (batch, account, asset, ts);
+CREATE TABLE IF NOT EXISTS credits (
+    account    TEXT NOT NULL,
+    asset      TEXT NOT NULL,
+    ts         REAL NOT NULL,
+    batch      TEXT,
+    scenario   TEXT,
+    expected   REAL,
+    credited   INTEGER NOT NULL,
+    latency_ms INTEGER,
+    polls      INTEGER
+);
+CREATE INDEX IF NOT EXISTS credits_asset_ts ON credits (asset, ts);
+CREATE INDEX IF NOT EXISTS credits_batch ON credits (batch, asset);
+"""
+INSERT = {
+    "balances": "INSERT INTO balances VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "credits": "INSERT INTO credits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+}
+WRITE_RETRIES = 5
+
+_opts = dict(DEFAULTS)
+_writer = None
+_writer_lock = threading.Lock()
+# аккаунт — на задачу/процесс (bind_account, run_scenario async_flow), пачка — на процесс
+_account = contextvars.ContextVar("balance_account", default="default")
+_batch = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+_stats = {"rows": 0, "writes": 0, "retries": 0}
+
+def log(msg):
+    print(f"[store] {msg}", flush=True)
+
+def configure(cfg_section: dict | None):
+    global _opts
+    _opts = {**DEFAULTS, **(cfg_section or {})}
+    # другой файл базы — старый писатель дописывает своё и останавливается
+    if _writer is not None and _writer.is_alive() and _writer.path != _opts["path"]:
+        _writer.sync(stop=True)
+
+def enabled() -> bool:
+    return bool(_opts["enabled"])
+
+def set_account(name: str):
+    _account.set(name)
+
+def set_batch(batch_id: str):
+    global _batch
+    _batch = batch_id
+
+def current_batch() -> str:
+    return _batch
+
+def new_batch_id(prefix: str) -> str:
+    return f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+def _connect(path: str) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    # WAL: читатели не блокируют писателя, а короткие транзакции разных процессов не ждут fsync друг друга
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+# ----------------- фоновая запись -----------------
+
+class _Writer(threading.Thread):
+    def __init__(self, path: str, flush_ms: float, max_batch: int):
+        super().__init__(name="balance_store", daemon=True)
+        self.path = path
+        self.flush_s = flush_ms / 1000
+        self.max_batch = max_batch
+        self.q: queue.Queue = queue.Queue()
+
+    def put(self, table: str, row: tuple):
+        self.q.put(("row", (table, row)))
+
+    def sync(self, stop: bool = False, timeout: float = 10.0) -> bool:
+        # дождаться, пока всё, что уже в очереди, окажется в базе
+        done = threading.Event()
+        self.q.put(("stop" if stop else "sync", done))
+        ok = done.wait(timeout)
+        if stop:
+            # после stop поток ещё закрывает соединение — без join повторный stop
+            # (configure, atexit) увидел бы живой поток и прождал бы весь timeout
+            self.join(timeout)
+        return ok
+
+    def run(self):
+        conn = _connect(self.path)
+        pending: list[tuple[str, tuple]] = []
+        deadline = 0.0
+        stop = False
+        while not stop:
+            timeout = max(0.0, deadline - time.monotonic()) if pending else None
+            try:
+                kind, payload = self.q.get(timeout=timeout)
+            except queue.Empty:
+                kind, payload = "timeout", None
+            if kind == "row":
+                if not pending:
+                    deadline = time.monotonic() + self.flush_s
+                pending.append(payload)
+                if len(pending) < self.max_batch:
+                    continue
+            if pending:
+                self._write(conn, pending)
+                pending = []
+            if kind in ("sync", "stop"):
+                stop = kind == "stop"
+                payload.set()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, rows: list[tuple[str, tuple]]):
+        by_table: dict[str, list[tuple]] = {}
+        for table, row in rows:
+            by_table.setdefault(table, []).append(row)
+        for attempt in range(WRITE_RETRIES):
+            try:
+                with conn:
+                    for table, batch in by_table.items():
+                        conn.executemany(INSERT[table], batch)
+                _stats["rows"] += len(rows)
+                _stats["writes"] += 1
+                return
+            except sqlite3.OperationalError as e:
+                # база занята другим процессом дольше timeout — подождать и повторить
+                _stats["retries"] += 1
+                if attempt == WRITE_RETRIES - 1:
+                    log(f"Не удалось записать {len(rows)} строк: {e}")
+                    return
+                time.sleep(0.1 * 2 ** attempt)
+            except sqlite3.Error as e:
+                # поток записи не должен падать из-за одной пачки
+                log(f"Не удалось записать {len(rows)} строк: {e}")
+                return
+
+def _get_writer() -> _Writer:
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = _Writer(_opts["path"], _opts["flush_ms"], _opts["max_batch"])
+            _writer.start()
+        return _writer
+
+def flush():
+    if _writer is not None and _writer.is_alive():
+        _writer.sync()
+
+@atexit.register
+def _close():
+    if _writer is not None and _writer.is_alive():
+        _writer.sync(stop=True)
+
+# ----------------- запись -----------------
+
+def record(balances, scenario: str | None = None, source: str = "api", ts: float | None = None) -> int:
+    # снимок всех известных активов из ответа balances; возвращает число строк
+    if not enabled() or not balances:
+        return 0
+    ts = time.time() if ts is None else ts
+    vals = balance_index.values(balances, tuple(balance_index.ASSETS))
+    writer = _get_writer()
+    account = _account.get()
+    vals = {a: v for a, v in vals.items() if v is not None}
+    for asset, value in vals.items():
+        writer.put("balances", (account, asset, ts, value, _batch, scenario, source))
+    return len(vals)
+
+def record_credit(asset: str, credit: dict, expected: float | None = None, scenario: str | None = None):
+    # итог credit_poll.wait_for_credit: зачислено ли и за сколько от конца сценария
+    if not enabled():
+        return
+    _get_writer().put("credits", (
+        _account.get(), asset, time.time(), _batch, scenario or asset, expected,
+        int(bool(credit.get("credited"))), credit.get("time_to_credit_ms"), credit.get("polls"),
+    ))
+
+# ----------------- запросы -----------------
+
+def _read() -> sqlite3.Connection:
+    # перед чтением — дописать очередь, чтобы свои же строки были видны
+    flush()
+    return _connect(_opts["path"])
+
+def value_at(asset: str, ts: float, account: str | None = None) -> float | None:
+    # последнее значение не позже ts
+    if not enabled():
+        return None
+    with closing(_read()) as conn:
+        row = conn.execute(
+            "SELECT value FROM balances WHERE account = ? AND asset = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+            (account or _account.get(), asset, ts),
+        ).fetchone()
+    return row[0] if row else None
+
+def delta_since(asset: str, since: float, account: str | None = None,
+                current: float | None = None) -> float | None:
+    # Δ актива с момента since: от последнего снимка до since (или первого после,
+    # если раньше истории нет) до current или самого свежего снимка
+    if not enabled():
+        return None
+    account = account or _account.get()
+    with closing(_read()) as conn:
+        base = conn.execute(
+            "SELECT value FROM balances WHERE account = ? AND asset = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+            (account, asset, since),
+        ).fetchone() or conn.execute(
+            "SELECT value FROM balances WHERE account = ? AND asset = ? AND ts > ? ORDER BY ts LIMIT 1",
+            (account, asset, since),
+        ).fetchone()
+        if current is None:
+            last = conn.execute(
+                "SELECT value FROM balances WHERE account = ? AND asset = ? ORDER BY ts DESC LIMIT 1",
+                (account, asset),
+            ).fetchone()
+            current = last[0] if last else None
+    if base is None or current is None:
+        return None
+    return current - base[0]
+
+def deltas_since(since: float, account: str | None = None) -> list[dict]:
+    # Δ по всем парам (аккаунт, актив), у которых есть снимки после since
+    with closing(_read()) as conn:
+        pairs = conn.execute(
+            "SELECT DISTINCT account, asset FROM balances WHERE ts > ?"
+            + (" AND account = ?" if account else "") + " ORDER BY account, asset",
+            (since, account) if account else (since,),
+        ).fetchall()
+    return [{"account": acc, "asset": asset, "delta": delta_since(asset, since, acc)} for acc, asset in pairs]
+
+def batch_deltas(batch: str) -> list[dict]:
+    # Δ пачки по (аккаунт, актив): от снимка перед пачкой (или первого в ней) до последнего в ней
+    with closing(_read()) as conn:
+        rows = conn.execute(
+            "SELECT account, asset, COUNT(*), MIN(ts), MAX(ts) FROM balances WHERE batch = ? "
+            "GROUP BY account, asset ORDER BY account, asset", (batch,),
+        ).fetchall()
+        out = []
+        for account, asset, n, first_ts, last_ts in rows:
+            base = conn.execute(
+                "SELECT value FROM balances WHERE account = ? AND asset = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+                (account, asset, first_ts),
+            ).fetchone() or conn.execute(
+                "SELECT value FROM balances WHERE batch = ? AND account = ? AND asset = ? ORDER BY ts LIMIT 1",
+                (batch, account, asset),
+            ).fetchone()
+            last = conn.execute(
+                "SELECT value FROM balances WHERE batch = ? AND account = ? AND asset = ? ORDER BY ts DESC LIMIT 1",
+                (batch, account, asset),
+            ).fetchone()
+            out.append({"account": account, "asset": asset, "snapshots": n, "from": base[0], "to": last[0],
+                        "delta": last[0] - base[0], "seconds": round(last_ts - first_ts, 1)})
+    return out
+
+def last_batch() -> str | None:
+    with closing(_read()) as conn:
+        row = conn.execute("SELECT batch FROM balances ORDER BY ts DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+def _pct(vals: list[int], q: float) -> int | None:
+    return vals[min(len(vals) - 1, round(q * (len(vals) - 1)))] if vals else None
+
+def credit_latency(asset: str | None = None, since: float | None = None, batch: str | None = None) -> dict:
+    # актив -> {n, credited, p50, p95, max} по time-to-credit
+    where, args = ["1 = 1"], []
+    if asset:
+        where.append("asset = ?"); args.append(asset)
+    if since is not None:
+        where.append("ts >= ?"); args.append(since)
+    if batch:
+        where.append("batch = ?"); args.append(batch)
+    with closing(_read()) as conn:
+        rows = conn.execute(
+            f"SELECT asset, credited, latency_ms FROM credits WHERE {' AND '.join(where)} ORDER BY asset, latency_ms",
+            args,
+        ).fetchall()
+    out: dict[str, dict] = {}
+    for a, credited, ms in rows:
+        s = out.setdefault(a, {"n": 0, "credited": 0, "ms": []})
+        s["n"] += 1
+        if credited and ms is not None:
+            s["credited"] += 1
+            s["ms"].append(ms)
+    return {a: {"n": s["n"], "credited": s["credited"], "p50": _pct(s["ms"], 0.5),
+                "p95": _pct(s["ms"], 0.95), "max": s["ms"][-1] if s["ms"] else None}
+            for a, s in out.items()}
+
+def history(asset: str | None = None, account: str | None = None, limit: int = 50) -> list[tuple]:
+    where, args = ["1 = 1"], []
+    if asset:
+        where.append("asset = ?"); args.append(asset)
+    if account:
+        where.append("account = ?"); args.append(account)
+    with closing(_read()) as conn:
+        return conn.execute(
+            f"SELECT ts, account, asset, value, batch, scenario, source FROM balances "
+            f"WHERE {' AND '.join(where)} ORDER BY ts DESC LIMIT ?", (*args, limit),
+        ).fetchall()
+
+def report():
+    flush()
+    if _stats["rows"]:
+        print(f"[store] balances.db: {_stats['rows']} строк за {_stats['writes']} транзакций"
+              + (f", повторов из-за блокировки {_stats['retries']}" if _stats["retries"] else ""))
+
+# ----------------- CLI -----------------
+
+def parse_since(s: str) -> float:
+    # 30m / 24h / 7d назад, ISO-время или unix-время
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if s[-1:] in units and s[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(s[:-1]) * units[s[-1]]
+    try:
+        return float(s)
+    except ValueError:
+        return datetime.fromisoformat(s).timestamp()
+
+def _fmt_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+def main():
+    ap = argparse.ArgumentParser(description="История балансов из balances.db")
+    ap.add_argument("--db", default=DEFAULTS["path"], help="файл базы")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("since", help="Δ по активам с момента T")
+    p.add_argument("since", help="30m, 24h, 7d, ISO-время или unix-время")
+    p.add_argument("--account")
+    p = sub.add_parser("batch", help="Δ всей пачки по аккаунтам и активам")
+    p.add_argument("batch", nargs="?")
+    p.add_argument("--last", action="store_true", help="последняя записанная пачка")
+    p = sub.add_parser("latency", help="time-to-credit по активам")
+    p.add_argument("--asset")
+    p.add_argument("--since")
+    p.add_argument("--batch")
+    p = sub.add_parser("history", help="последние снимки")
+    p.add_argument("--asset")
+    p.add_argument("--account")
+    p.add_argument("--limit", type=int, default=50)
+    args = ap.parse_args()
+    configure({"path": args.db})
+
+    if args.cmd == "since":
+        for r in deltas_since(parse_since(args.since), args.account):
+            delta = f"{r['delta']:+.6f}" if r["delta"] is not None else "—"
+            print(f"{r['account']:<16} {r['asset']:<10} {delta}")
+    elif args.cmd == "batch":
+        batch = last_batch() if args.last or not args.batch else args.batch
+        if not batch:
+            log("Записей нет.")
+            return
+        print(f"пачка {batch}")
+        for r in batch_deltas(batch):
+            print(f"{r['account']:<16} {r['asset']:<10} {r['from']:>12g} → {r['to']:<12g} "
+                  f"Δ {r['delta']:+g}  ({r['snapshots']} снимков за {r['seconds']} с)")
+        for asset, s in credit_latency(batch=batch).items():
+            print(f"зачисление {asset:<10} {s['credited']}/{s['n']}  p50 {s['p50']} мс  p95 {s['p95']} мс")
+    elif args.cmd == "latency":
+        since = parse_since(args.since) if args.since else None
+        for asset, s in credit_latency(args.asset, since, args.batch).items():
+            print(f"{asset:<10} зачислено {s['credited']}/{s['n']}  p50 {s['p50']} мс  "
+                  f"p95 {s['p95']} мс  max {s['max']} мс")
+    else:
+        for ts, account, asset, value, batch, scenario, source in history(args.asset, args.account, args.limit):
+            print(f"{_fmt_ts(ts)}  {account:<16} {asset:<10} {value:>12g}  {batch}  {scenario or '—'}  {source}")
+
+if __name__ == "__main__":
+    main()
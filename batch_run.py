@@ -0,0 +1,240 @@
+# batch_run.py — много покупок за одну сессию: Telegram и WebApp открываются один раз
+#
+#   python batch_run.py --scenarios diamonds emeralds sapphires --repeat 5
+#   python batch_run.py --account acc1 --scenarios sapphires --repeat 20 --order blocks
+#
+# Запуск Chrome, open_tg, Play, модалка и ожидание iframe (15+ с) оплачиваются один
+# раз на пачку, дальше покупки идут подряд внутри того же WebApp. Между покупками
+# WebApp возвращается на экран балансов; если не вернулся — перезагружается iframe,
+# а в крайнем случае заново проходится Play → модалка → iframe. Без input() —
+# пачка идёт без присмотра. Итог: покупок в минуту (с учётом подготовки и без),
+# задержка покупки по активам, зачисление всей пачки по API.
+import argparse, json, time
+from pathlib import Path
+
+import balance_index
+import balance_store
+import credit_poll
+import dom_probe
+import purchase_runner
+import tracing
+import waits
+from purchase_runner import SCENARIOS, ROOT_FILES, Session, bind_account, fetch_balances_from_api
+
+SUMMARY_FILE = Path(__file__).with_name("batch_summary.json")
+
+BALANCES_SCREEN = "div.balances__item"
+# видимые элементы окна покупки: карточки балансов остаются в DOM и под ним,
+# так что «вернулись» — это карточки есть, а ни одного из них нет
+PURCHASE_SHEET = ", ".join(f"{sel}:visible" for sel in (
+    "button.card__submit-button",
+    "button.box__button_continue",
+    "div.code input.code__input",
+    "button.button_yellow_gradient",
+    "div.buy__buy-item",
+))
+# чем закрыть экран покупки, если WebApp сам не вернулся к балансам
+BACK_VARIANTS = [
+    'button:has-text("Назад")',
+    'button:has-text("Back")',
+    'button:has-text("Закрыть")',
+    'button:has-text("Close")',
+    'button[aria-label="Назад"]',
+    'button[aria-label="Back"]',
+    'button[aria-label="Закрыть"]',
+    'button[aria-label="Close"]',
+]
+
+def log(msg):
+    print(f"[batch] {msg}", flush=True)
+
+# ----------------- WebApp: открыть и вернуться к балансам -----------------
+
+def _on_balances(frame, timeout_ms: int) -> bool:
+    deadline = time.perf_counter() + timeout_ms / 1000.0
+    if not waits.wait_for(frame, BALANCES_SCREEN, budget_ms=0, label="batch: экран балансов",
+                          timeout_ms=timeout_ms):
+        return False
+    while frame.locator(PURCHASE_SHEET).count():
+        if time.perf_counter() >= deadline:
+            log("Карточки балансов на месте, но окно покупки не закрылось.")
+            return False
+        frame.wait_for_timeout(100)
+    return True
+
+@tracing.traced("back_to_balances", check=lambda fr: fr is not None)
+def back_to_balances(s: Session, frame, tg_web_url: str):
+    # возвращает фрейм на экране балансов (возможно, новый) или None
+    try:
+        if _on_balances(frame, 3000):
+            return frame
+        win = dom_probe.probe_click(frame, dom_probe.candidates(BACK_VARIANTS), timeout=2000)
+        if win is not None and _on_balances(frame, 3000):
+            log(f"Вернулся к балансам: {BACK_VARIANTS[win['src']]}")
+            return frame
+        # перезагрузка только iframe — без повторного Play
+        frame.goto(frame.url, wait_until="domcontentloaded")
+        if _on_balances(frame, 10000):
+            log("Вернулся к балансам перезагрузкой WebApp.")
+            return frame
+    except Exception as e:
+        log(f"WebApp не отвечает: {e}")
+    log("Открываю WebApp заново через Telegram.")
+    frame = s.open_webapp(tg_web_url)
+    return frame if frame and _on_balances(frame, 10000) else None
+
+def buy_once(page, frame, scenario: str) -> bool:
+    with tracing.span(f"batch/{scenario}", cat="flow") as sp:
+        ok = purchase_runner.buy(page, frame, scenario)
+        sp.set(ok=ok)
+    return ok
+
+def plan(scenarios: list[str], repeat: int, order: str) -> list[str]:
+    # rounds: d e s d e s …; blocks: d d … e e … s s …
+    if order == "blocks":
+        return [s for s in scenarios for _ in range(repeat)]
+    return [s for _ in range(repeat) for s in scenarios]
+
+# ----------------- пачка -----------------
+
+def _pct(vals: list[float], q: float) -> float | None:
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, round(q * (len(vals) - 1)))] if vals else None
+
+def run_batch(sequence: list[str], user_data_dir: str = ".pw_telegram",
+              files: purchase_runner.Files = ROOT_FILES) -> dict:
+    cfg = purchase_runner.load_config()
+    tracing.configure(cfg.get("trace"))
+    tracing.set_lane("batch")
+    balance_store.configure(cfg.get("balance_store"))
+    # все снимки и зачисления пачки — под одним id: balance_store.py batch <id>
+    balance_store.set_batch(balance_store.new_batch_id("batch"))
+    tg_web_url = cfg.get("tg_web_url") or purchase_runner.TG_WEB_URL
+    purchases: list[dict] = []
+    summary = {"planned": len(sequence), "reopens": 0, "batch": balance_store.current_batch()}
+
+    with Session(purchase_runner.playwright(), cfg, user_data_dir, "batch", files) as s:
+        s.failure = "в пачке есть неудачные покупки"
+        # окно записи сохраняется по каждой неудачной покупке, а не целиком на выходе
+        s.persist_on_failure = False
+        page = s.page
+        frame = s.open_webapp(tg_web_url)
+        if not frame:
+            log("⚠ WebApp iframe не открылся — пачка отменена.")
+            return {**summary, "ok": 0, "failed": 0, "purchases": []}
+        s.api_idle.wait_idle(budget_ms=0, label="WebApp: запросы к API", timeout_ms=10000)
+        token = s.token(frame)
+        before, _ = fetch_balances_from_api(token) if token else (None, None)
+        balance_store.record(before, scenario="batch", source="before")
+        setup_s = time.perf_counter() - s.started
+        log(f"Подготовка заняла {setup_s:.1f} с — дальше {len(sequence)} покупок в этой сессии.")
+
+        batch_started = time.perf_counter()
+        for i, scenario in enumerate(sequence, 1):
+            t0 = time.perf_counter()
+            try:
+                ok = buy_once(page, frame, scenario)
+            except Exception as e:
+                log(f"{scenario}: {e}")
+                ok = False
+            took_ms = round((time.perf_counter() - t0) * 1000)
+            purchases.append({"n": i, "scenario": scenario, "ok": ok, "ms": took_ms})
+            log(f"#{i}/{len(sequence)} {scenario}: {'OK' if ok else 'FAIL'} за {took_ms} мс")
+            if not ok:
+                # окно записи — как раз эта покупка; пачка идёт дальше
+                s.recorder.persist(f"#{i} {scenario}")
+            if i == len(sequence):
+                break
+            prev = frame
+            frame = back_to_balances(s, frame, tg_web_url)
+            if frame is None:
+                log("⚠ Не удалось вернуться к балансам — пачка остановлена.")
+                break
+            if frame is not prev:
+                summary["reopens"] += 1
+        flow_done = time.perf_counter()
+        batch_s = flow_done - batch_started
+        s.ok = all(b["ok"] for b in purchases)
+
+        # зачисление всей пачки: итог по каждому активу за вычетом списаний (алмазы и
+        # изумруды покупаются за сапфиры), все активы — одним опросом балансов
+        token = s.sniffer.token or token
+        summary["credit"] = {}
+        bought = [purchase_runner.scenario(b["scenario"]).ASSET for b in purchases if b["ok"]]
+        if token and before and bought:
+            poll_cfg = cfg.get("credit_poll") or {}
+            expected = credit_poll.expected_deltas(bought, poll_cfg)
+            for asset in [a for a, d in expected.items() if d == 0]:
+                log(f"{asset}: зачисления и списания пачки взаимно гасятся — не ждём.")
+                del expected[asset]
+            after, _ = fetch_balances_from_api(token)
+            credit = credit_poll.wait_for_credits(
+                lambda: fetch_balances_from_api(token), balance_index.value,
+                {a: balance_index.value(before, a) for a in expected}, after,
+                flow_done=flow_done, expected=expected, cfg=poll_cfg,
+            )
+            after = credit["balances"] or after
+            for asset, c in credit["assets"].items():
+                balance_store.record_credit(asset, c, expected[asset], scenario="batch")
+                summary["credit"][asset] = {"expected": expected[asset], "credited": c["credited"],
+                                            "time_to_credit_ms": c["time_to_credit_ms"]}
+            if after:
+                purchase_runner.save_balances(files, after, scenario="batch")
+
+        total_s = time.perf_counter() - s.started
+        ok_n = sum(1 for b in purchases if b["ok"])
+        summary.update({
+            "ok": ok_n,
+            "failed": len(purchases) - ok_n,
+            "setup_seconds": round(setup_s, 2),
+            "batch_seconds": round(batch_s, 2),
+            "total_seconds": round(total_s, 2),
+            "purchases_per_minute": round(ok_n / (total_s / 60.0), 2) if total_s else 0.0,
+            "purchases_per_minute_in_session": round(ok_n / (batch_s / 60.0), 2) if batch_s else 0.0,
+            "latency_ms": {
+                name: {"p50": _pct(ms, 0.5), "p95": _pct(ms, 0.95), "max": max(ms)}
+                for name in dict.fromkeys(sequence)
+                if (ms := [b["ms"] for b in purchases if b["scenario"] == name and b["ok"]])
+            },
+            "purchases": purchases,
+        })
+        s.report()
+    return summary
+
+def print_summary(s: dict):
+    print("\n=== Пачка покупок в одной сессии ===")
+    print(f"покупок:             {s['ok']} из {s['planned']} (ошибок {s['failed']}, переоткрытий WebApp {s['reopens']})")
+    if "total_seconds" not in s:
+        print("====================================\n")
+        return
+    print(f"подготовка:          {s['setup_seconds']:.1f} с (один раз)")
+    print(f"покупки:             {s['batch_seconds']:.1f} с")
+    print(f"покупок в минуту:    {s['purchases_per_minute']:.2f} всего, "
+          f"{s['purchases_per_minute_in_session']:.2f} в сессии")
+    for scenario, lat in s["latency_ms"].items():
+        print(f"{scenario:<10} p50 {lat['p50']:>6} мс  p95 {lat['p95']:>6} мс  max {lat['max']:>6} мс")
+    for asset, c in s.get("credit", {}).items():
+        ttc = f"{c['time_to_credit_ms']} мс" if c["credited"] else "не дождались"
+        expected = f"{c['expected']:+g}" if c["expected"] is not None else "±"
+        print(f"зачисление {asset:<10} {expected:>6}: {ttc}")
+    print(f"история пачки:       python balance_store.py batch {s['batch']}")
+    print("====================================\n")
+
+def main():
+    ap = argparse.ArgumentParser(description="Пачка покупок в одной сессии Telegram/WebApp")
+    ap.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=sorted(SCENARIOS))
+    ap.add_argument("--repeat", type=int, default=3, help="сколько раз повторить каждый сценарий")
+    ap.add_argument("--order", choices=("rounds", "blocks"), default="rounds",
+                    help="rounds — по кругу, blocks — все покупки одного актива подряд")
+    ap.add_argument("--profile", default=".pw_telegram", help="папка профиля Chrome")
+    ap.add_argument("--account", help="аккаунт из .accounts/ (профиль, auth.json, balances.json)")
+    args = ap.parse_args()
+
+    profile, files = bind_account(args.account) if args.account else (args.profile, ROOT_FILES)
+    summary = run_batch(plan(args.scenarios, args.repeat, args.order), profile, files)
+    print_summary(summary)
+    SUMMARY_FILE.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    log(f"Сводка сохранена в {SUMMARY_FILE.name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# bench_dom_probe.py — микробенчмарк: цепочка loc.count()+click против одного dom_probe
+#
+#   python bench_dom_probe.py --iterations 200
+#
+# Страница — локальная фикстура fixtures/probe_page.html, сеть не нужна
+# (нужен только playwright install chromium).
+import argparse, statistics, time
+from pathlib import Path
+from playwright.sync_api import sync_playwright
+
+import dom_probe
+from purchase_flows import compile_flow
+from purchase_runner import MODAL_VARIANTS, PAY_RE
+
+FIXTURE = Path(__file__).with_name("fixtures") / "probe_page.html"
+
+# ----------------- текущий подход: по запросу на вариант -----------------
+
+def chain_modal(page) -> int:
+    trips = 0
+    for sel in MODAL_VARIANTS:
+        loc = page.locator(sel)
+        trips += 1
+        if loc.count():
+            try:
+                loc.first.click(timeout=1000)
+                return trips + 1
+            except Exception:
+                trips += 1
+    return trips
+
+def chain_buy(page, selectors) -> int:
+    trips = 0
+    for sel in selectors:
+        loc = page.locator(sel)
+        trips += 1
+        if loc.count():
+            loc.first.click(timeout=1000)
+            return trips + 1
+    return trips
+
+def chain_pay(page) -> int:
+    trips = 0
+    btn = page.get_by_role("button", name=PAY_RE).first
+    trips += 2
+    if btn.count() and btn.is_visible():
+        btn.click(timeout=1000)
+        return trips + 1
+    loc = page.locator("button, .Button, [role=button]").filter(has_text=PAY_RE)
+    trips += 1
+    if loc.count():
+        loc.first.click(timeout=1000)
+        trips += 1
+    return trips
+
+# ----------------- dom_probe: один evaluate + клик -----------------
+
+def _probe(cands):
+    def run(page) -> int:
+        dom_probe.probe_click(page, cands, timeout=1000)
+        return 2  # evaluate + клик
+    return run
+
+def probe_cases(buy_selectors):
+    pay = [{"css": "button, .Button, [role=button]", "text": PAY_RE.pattern}]
+    return {
+        "modal": _probe(dom_probe.candidates(MODAL_VARIANTS)),
+        "buy":   _probe(dom_probe.candidates(buy_selectors)),
+        "pay":   _probe(pay),
+    }
+
+def measure(page, fn, iterations: int) -> tuple[list[float], int]:
+    times, trips = [], 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        trips = fn(page)
+        times.append((time.perf_counter() - started) * 1000)
+    return times, trips
+
+def main():
+    ap = argparse.ArgumentParser(description="dom_probe против цепочки count()+click")
+    ap.add_argument("--iterations", type=int, default=100)
+    args = ap.parse_args()
+
+    buy_selectors = compile_flow("diamonds").steps[1].selectors
+    chain = {
+        "modal": chain_modal,
+        "buy":   lambda page: chain_buy(page, buy_selectors),
+        "pay":   chain_pay,
+    }
+    probe = probe_cases(buy_selectors)
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.set_content(FIXTURE.read_text(encoding="utf-8"))
+
+        print(f"\n=== dom_probe vs цепочка ({args.iterations} итераций, медиана) ===")
+        print(f"{'шаг':<7} {'цепочка, мс':>12} {'запросов':>9} {'probe, мс':>10} {'запросов':>9} {'ускорение':>10}")
+        for case in ("modal", "buy", "pay"):
+            t_chain, n_chain = measure(page, chain[case], args.iterations)
+            t_probe, n_probe = measure(page, probe[case], args.iterations)
+            m_chain, m_probe = statistics.median(t_chain), statistics.median(t_probe)
+            print(f"{case:<7} {m_chain:12.2f} {n_chain:9d} {m_probe:10.2f} {n_probe:9d} {m_chain / m_probe:9.1f}x")
+        print()
+        browser.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# bench_offline.py — сквозной офлайн-бенчмарк buy_* сценариев на локальных фикстурах
+#
+#   python bench_offline.py --runs 5
+#   python bench_offline.py --scenarios sapphires --runs 10 --lag 200
+#   python bench_offline.py --runs 10 --margin 2 --save-thresholds   # новый базовый уровень (так снят текущий)
+#   python bench_offline.py --runs 10 --recorder both      # цена flight_recorder против прогона без записи
+#
+# Локальный сервер раздаёт fixtures/offline/tg.html (чат с Play, модалка запуска,
+# окно «Confirm and Pay») и webapp.html (карточки balances__item, card__submit-button,
+# code__input, пакеты сапфиров) и отвечает как API (mock_api.py). Каждый сценарий
+# идёт целиком через свой run() — сеть и аккаунт Telegram не нужны, нужен только
+# playwright install chromium.
+#
+# Время шагов берётся из спанов tracing; p95 сравнивается с порогами из
+# fixtures/offline/thresholds.json, превышение — код выхода 1 (для CI).
+import argparse, json, math, shutil, tempfile, time
+from pathlib import Path
+
+import api_client
+import mock_api
+import purchase_runner
+import selector_cache
+import snapshot
+from browser_server import LAUNCH_ARGS, VIEWPORT
+from purchase_runner import SCENARIOS
+
+FIXTURES = Path(__file__).with_name("fixtures") / "offline"
+THRESHOLDS_FILE = FIXTURES / "thresholds.json"
+PAGES = {"/tg/": "tg.html", "/twa/": "webapp.html"}
+MIN_THRESHOLD_MS = 100  # шаги в десятки мс (token, webapp_iframe, balances_api) иначе «регрессируют» от шума
+ICON = b'<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24"><circle cx="12" cy="12" r="10"/></svg>'
+
+def log(msg):
+    print(f"[bench] {msg}", flush=True)
+
+# ----------------- сервер: фикстуры + API -----------------
+
+class FixtureHandler(mock_api.Handler):
+    def send_body(self, body: bytes, ctype: str):
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.handle_api("GET"):
+            return
+        path = self.path.split("?", 1)[0].split("#", 1)[0]
+        if path in PAGES:
+            self.send_body((FIXTURES / PAGES[path]).read_bytes(), "text/html; charset=utf-8")
+        elif path.startswith("/static/"):
+            self.send_body(ICON, "image/svg+xml")
+        else:
+            self.send_json(404, {"message": "Not found"})
+
+# ----------------- подготовка сценария -----------------
+
+def bind_offline(work: Path, base_url: str, scenario: str, lag: int, trace_dir: Path,
+                 recorder: bool = False) -> tuple[str, dict, purchase_runner.Files]:
+    # как purchase_runner.bind_account: файлы сценария — во временную папку, конфиг — на локальный сервер
+    cfg = {
+        "tg_web_url": f"{base_url}/tg/?lag={lag}",
+        "tma_url": f"{base_url}/twa/",
+        "api_base_url": base_url,
+        "trace": {"enabled": True, "dir": str(trace_dir)},
+        "credit_poll": {"deadline_s": 15, "first_delay_s": 0.1, "expected_delta": {scenario: 10}},
+        "flight_recorder": {"enabled": recorder, "dir": str(work / "flight")},
+        "balance_store": {"path": str(work / "balances.db")},
+    }
+    return str(work / "profile"), cfg, purchase_runner.Files.under(work)
+
+def headless_launcher(headed: bool):
+    # вместо канала Chrome — встроенный Chromium; профиль свой на каждый сценарий
+    def launch_ctx(p, user_data_dir=".pw_telegram", headless=False):
+        return p.chromium.launch_persistent_context(
+            user_data_dir=user_data_dir, headless=not headed, args=LAUNCH_ARGS, viewport=VIEWPORT,
+        )
+    return launch_ctx
+
+def read_spans(trace_dir: Path) -> dict[str, float]:
+    # имя спана -> длительность, мс (повторы одного шага в прогоне складываются)
+    out: dict[str, float] = {}
+    for path in trace_dir.glob("*.jsonl"):
+        for rec in snapshot.iter_records(path):
+            if rec.get("cat") == "http":
+                continue
+            out[rec["name"]] = out.get(rec["name"], 0.0) + rec["dur_ms"]
+    return out
+
+def run_scenario(scenario: str, runs: int, state: mock_api.MockState, base_url: str,
+                 root: Path, lag: int, headed: bool, recorder: bool = False) -> dict:
+    mod = purchase_runner.scenario(scenario)
+    launcher = headless_launcher(headed)
+    samples: dict[str, list[float]] = {"wall": []}
+    failures = 0
+    for i in range(runs):
+        work = root / scenario
+        work.mkdir(parents=True, exist_ok=True)
+        trace_dir = work / f"trace-{i}"
+        profile, cfg, files = bind_offline(work, base_url, scenario, lag, trace_dir, recorder)
+        # старый баланс — текущее состояние API, чтобы сценарий увидел Δ +10
+        snapshot.write_obj(files.balances, state.balances_payload())
+
+        started = time.perf_counter()
+        try:
+            res = mod.run(user_data_dir=profile, interactive=False, files=files, cfg=cfg, launcher=launcher)
+        except Exception as e:
+            res = {"ok": False, "error": str(e)}
+        wall_ms = (time.perf_counter() - started) * 1000
+        if not res.get("ok"):
+            failures += 1
+            log(f"{scenario} #{i + 1}: FAIL {res.get('error', '')}")
+            continue
+        samples["wall"].append(wall_ms)
+        for name, ms in read_spans(trace_dir).items():
+            samples.setdefault(name, []).append(ms)
+        if res.get("time_to_credit_ms") is not None:
+            samples.setdefault("time_to_credit", []).append(res["time_to_credit_ms"])
+        log(f"{scenario} #{i + 1}: {wall_ms:.0f} мс, Δ={res.get('delta')}")
+    return {"runs": runs, "failures": failures, "samples": samples}
+
+# ----------------- статистика и пороги -----------------
+
+def _pct(vals: list[float], q: float) -> float:
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, round(q * (len(vals) - 1)))]
+
+def load_thresholds() -> dict:
+    try:
+        return json.loads(THRESHOLDS_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def report(scenario: str, res: dict, limits: dict) -> list[str]:
+    # печатает таблицу шагов; возвращает список регрессий
+    regressions = []
+    print(f"\n=== {scenario}: {res['runs'] - res['failures']}/{res['runs']} успешно ===")
+    print(f"{'шаг':<28} {'n':>3} {'p50, мс':>9} {'p95, мс':>9} {'max, мс':>9} {'порог p95':>10}")
+    for name, vals in sorted(res["samples"].items(), key=lambda kv: (kv[0] != "wall", kv[0])):
+        if not vals:
+            continue
+        p95 = _pct(vals, 0.95)
+        limit = limits.get(name)
+        mark = ""
+        if limit is not None and p95 > limit:
+            mark = "  РЕГРЕССИЯ"
+            regressions.append(f"{scenario}/{name}: p95 {p95:.0f} мс > {limit} мс")
+        limit_s = f"{limit:10d}" if limit is not None else f"{'—':>10}"
+        print(f"{name:<28} {len(vals):3d} {_pct(vals, 0.5):9.0f} {p95:9.0f} {max(vals):9.0f} {limit_s}{mark}")
+    if res["failures"]:
+        regressions.append(f"{scenario}: {res['failures']} неуспешных прогона(ов)")
+    return regressions
+
+def save_thresholds(results: dict, margin: float):
+    # порог = наблюдаемый p95 с запасом, но не ниже MIN_THRESHOLD_MS; прежние пороги
+    # других сценариев сохраняются
+    out = load_thresholds()
+    for scenario, res in results.items():
+        out[scenario] = {name: max(MIN_THRESHOLD_MS, int(math.ceil(_pct(vals, 0.95) * margin)))
+                         for name, vals in sorted(res["samples"].items()) if vals}
+    THRESHOLDS_FILE.write_text(json.dumps(out, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    log(f"Пороги сохранены в {THRESHOLDS_FILE} (p95 × {margin:g}).")
+
+def report_overhead(off: dict, on: dict):
+    # flight_recorder против прогона без записи: wall-clock по сценариям
+    print("\n=== Накладные расходы flight_recorder (wall, мс) ===")
+    print(f"{'сценарий':<10} {'без p50':>9} {'с p50':>9} {'Δ p50':>8} {'без p95':>9} {'с p95':>9} {'Δ p95':>8}")
+    for scenario in off:
+        a, b = off[scenario]["samples"]["wall"], on[scenario]["samples"]["wall"]
+        if not a or not b:
+            print(f"{scenario:<10} нет успешных прогонов для сравнения")
+            continue
+        a50, b50, a95, b95 = _pct(a, 0.5), _pct(b, 0.5), _pct(a, 0.95), _pct(b, 0.95)
+        print(f"{scenario:<10} {a50:9.0f} {b50:9.0f} {(b50 - a50) / a50:+8.1%} "
+              f"{a95:9.0f} {b95:9.0f} {(b95 - a95) / a95:+8.1%}")
+    print()
+
+def main():
+    ap = argparse.ArgumentParser(description="Офлайн-бенчмарк buy_* сценариев на локальных фикстурах")
+    ap.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=sorted(SCENARIOS))
+    ap.add_argument("--runs", type=int, default=5, help="прогонов на сценарий")
+    ap.add_argument("--lag", type=int, default=50, help="задержка отрисовки UI в фикстурах, мс")
+    ap.add_argument("--credit-delay", type=float, default=0.5, help="через сколько API зачисляет покупку, с")
+    ap.add_argument("--headed", action="store_true", help="показывать браузер")
+    ap.add_argument("--save-thresholds", action="store_true", help="записать пороги из этого прогона")
+    ap.add_argument("--margin", type=float, default=1.5, help="запас порога относительно p95")
+    ap.add_argument("--recorder", choices=("off", "on", "both"), default="off",
+                    help="flight_recorder: без записи, с записью или сравнить оба режима")
+    args = ap.parse_args()
+
+    state = mock_api.MockState(credit_delay_s=args.credit_delay)
+    server, base_url = mock_api.serve(state, handler=FixtureHandler)
+    api_client.configure(base_url=base_url)
+    root = Path(tempfile.mkdtemp(prefix="bench_offline-"))
+    # победители селекторов — отдельно от боевого selector_cache.json
+    selector_cache.CACHE_FILE = root / "selector_cache.json"
+
+    # при both режимы чередуются по сценариям, чтобы дрейф машины делился поровну
+    modes = ("off", "on") if args.recorder == "both" else (args.recorder,)
+    by_mode = {m: {} for m in modes}
+    try:
+        for scenario in args.scenarios:
+            for mode in modes:
+                by_mode[mode][scenario] = run_scenario(scenario, args.runs, state, base_url, root, args.lag,
+                                                       args.headed, recorder=mode == "on")
+    finally:
+        server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = by_mode[modes[0]]
+    if args.recorder == "both":
+        report_overhead(by_mode["off"], by_mode["on"])
+    thresholds = load_thresholds()
+    regressions = []
+    for scenario, res in results.items():
+        regressions += report(scenario, res, thresholds.get(scenario, {}))
+    print()
+    if args.save_thresholds:
+        save_thresholds(results, args.margin)
+        return 0
+    if not thresholds:
+        log(f"Порогов нет ({THRESHOLDS_FILE.name}) — запусти с --save-thresholds, чтобы их задать.")
+    for r in regressions:
+        log(f"✖ {r}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
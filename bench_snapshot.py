@@ -0,0 +1,66 @@
+# bench_snapshot.py — размер и время записи: json.dump(indent=2) против snapshot (JSONL / .gz)
+#
+#   python bench_snapshot.py --items 50000 --repeat 5
+#
+# Данные — синтетический инвентарь с полями как в ответе API, сеть не нужна.
+import argparse, json, random, statistics, tempfile, time
+from pathlib import Path
+
+import snapshot
+
+RARITIES = ("COMMON", "RARE", "EPIC", "LEGENDARY")
+
+def fake_inventory(n: int, seed: int = 1) -> list[dict]:
+    rnd = random.Random(seed)
+    return [{
+        "id": f"{rnd.getrandbits(64):016x}",
+        "item_id": rnd.randrange(1, 5000),
+        "name": f"Предмет #{i}",
+        "rarity": rnd.choice(RARITIES),
+        "tradeable": rnd.random() < 0.3,
+        "for_trade": False,
+        "price": {"amount": rnd.randrange(1, 10**6), "currency": "DIAMOND"},
+        "created_at": "2025-08-21T08:00:00Z",
+    } for i in range(n)]
+
+def write_pretty(path: Path, items: list):
+    # как было: save_json / save_balances_to_file
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+
+def measure(fn, path: Path, items: list, repeat: int) -> tuple[float, int]:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(path, items)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), path.stat().st_size
+
+def main():
+    ap = argparse.ArgumentParser(description="json.dump(indent=2) против snapshot JSONL/.gz")
+    ap.add_argument("--items", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    items = fake_inventory(args.items)
+    with tempfile.TemporaryDirectory() as d:
+        d = Path(d)
+        cases = [
+            ("json indent=2", d / "inventory.json",     write_pretty),
+            ("jsonl",         d / "inventory.jsonl",    snapshot.write),
+            ("jsonl.gz",      d / "inventory.jsonl.gz", snapshot.write),
+        ]
+        print(f"\n=== Снимок инвентаря: {args.items} предметов, медиана из {args.repeat} ===")
+        print(f"{'формат':<15} {'запись, мс':>11} {'размер, КБ':>11} {'чтение, мс':>11}")
+        for name, path, fn in cases:
+            ms, size = measure(fn, path, items, args.repeat)
+            started = time.perf_counter()
+            n = len(json.loads(path.read_text(encoding="utf-8"))) if fn is write_pretty \
+                else sum(1 for _ in snapshot.iter_records(path))
+            read_ms = (time.perf_counter() - started) * 1000
+            assert n == args.items, (name, n)
+            print(f"{name:<15} {ms:11.1f} {size / 1024:11.0f} {read_ms:11.1f}")
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# browser_server.py — долгоживущий Chrome и пул тёплых контекстов для сценариев
+#
+# Сервер:   python browser_server.py --port 9222
+# Сценарии: в config.json указать "cdp_url": "http://127.0.0.1:9222" — тогда buy_*.py
+#           не запускают Chrome сами, а подключаются к серверу по CDP.
+#
+# Сценарию достаётся своя вкладка залогиненного профиля из пула (ContextPool):
+# параллельные сценарии не делят страницу, а учёт аренды и использований вкладок
+# хранится в .browser_server.json и общий для всех процессов.
+#
+# ЭКСПЕРИМЕНТАЛЬНО: пул вкладок проверен только на заглушках объектов Playwright,
+# на живом Chrome по CDP не прогонялся. Без "cdp_url" сценарии его не трогают.
+import argparse, json, os, time
+from pathlib import Path
+from playwright.sync_api import sync_playwright
+
+import filelock
+import snapshot
+
+STATE_FILE = Path(__file__).with_name(".browser_server.json")
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-site-isolation-trials",
+    "--disable-features=BlockThirdPartyCookies,ThirdPartyStoragePartitioning,PrivacySandboxAdsAPIs",
+]
+VIEWPORT = {"width": 1280, "height": 900}
+TG_HOST = "web.telegram.org"
+LEASE_TTL_S = 15 * 60  # дольше сценарий вкладку не держит — аренда считается брошенной
+
+# STATE_FILE читают и переписывают все процессы-сценарии — только под этой блокировкой
+_state_lock = filelock.FileLock(STATE_FILE.with_name(STATE_FILE.name + ".lock"))
+
+def log(msg):
+    print(f"[browser] {msg}", flush=True)
+
+def _load_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8")) or {}
+    except Exception:
+        return {}
+
+def _save_state(state: dict):
+    try:
+        snapshot.write_obj(STATE_FILE, state)
+    except Exception as e:
+        log(f"Не удалось сохранить {STATE_FILE.name}: {e}")
+
+# ----------------- сервер -----------------
+
+def serve(port: int, user_data_dir: str, headless: bool):
+    with sync_playwright() as p:
+        # тот же профиль и флаги, что в launch_ctx, плюс открытый CDP-порт
+        ctx = p.chromium.launch_persistent_context(
+            user_data_dir=user_data_dir,
+            headless=headless,
+            channel="chrome",
+            args=LAUNCH_ARGS + [f"--remote-debugging-port={port}"],
+            viewport=VIEWPORT,
+        )
+        cdp_url = f"http://127.0.0.1:{port}"
+        with _state_lock:
+            _save_state({"cdp_url": cdp_url, "tabs": {}})
+        log(f"✔ Chrome запущен, CDP: {cdp_url}. Ctrl+C — остановить.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ctx.close()
+            STATE_FILE.unlink(missing_ok=True)
+            log("Chrome остановлен.")
+
+# ----------------- пул вкладок -----------------
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":  # os.kill(pid, 0) на Windows завершает процесс — там только LEASE_TTL_S
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def _leased(info: dict, now: float) -> bool:
+    # аренда упавшего или зависшего сценария не держит вкладку вечно
+    pid = info.get("lease")
+    return bool(pid) and now - info.get("leased_at", 0) < LEASE_TTL_S and _pid_alive(pid)
+
+def _target_id(ctx, page) -> str | None:
+    # id вкладки в Chrome — одинаковый для всех CDP-подключений, в отличие от объекта Page
+    try:
+        cdp = ctx.new_cdp_session(page)
+        try:
+            return cdp.send("Target.getTargetInfo")["targetInfo"]["targetId"]
+        finally:
+            cdp.detach()
+    except Exception:
+        return None
+
+class ContextPool:
+    # Пул вкладок залогиненного профиля сервера. Пул переживает и вызов, и процесс
+    # сценария: сами вкладки живут в Chrome сервера, а счётчики использований и
+    # аренды — в STATE_FILE под файловой блокировкой, общей для всех процессов.
+    # Каждый сценарий получает свою вкладку (параллельные не кликают в одной), на
+    # release вкладка возвращается свободной, а после max_uses закрывается — следующему
+    # сценарию откроется новая. fresh=True — отдельный изолированный контекст,
+    # закрывается при release.
+    def __init__(self, browser, max_uses: int = 20):
+        self.browser = browser
+        self.max_uses = max_uses
+        self.fresh = set()
+        self.leased = {}  # id(page) -> targetId
+
+    def _profile(self):
+        return self.browser.contexts[0] if self.browser.contexts else self.browser.new_context(viewport=VIEWPORT)
+
+    def acquire(self, fresh: bool = False):
+        # -> (ctx, page)
+        if fresh:
+            ctx = self.browser.new_context(viewport=VIEWPORT)
+            self.fresh.add(id(ctx))
+            return ctx, ctx.new_page()
+        ctx = self._profile()
+        with _state_lock:
+            state = _load_state()
+            tabs = state.setdefault("tabs", {})
+            open_pages = {tid: pg for pg in ctx.pages if (tid := _target_id(ctx, pg))}
+            # закрытые вкладки — из учёта, открытые не нами (вход в Telegram при старте) — в пул
+            for tid in list(tabs):
+                if tid not in open_pages:
+                    del tabs[tid]
+            for tid in open_pages:
+                tabs.setdefault(tid, {"uses": 0})
+            now = time.time()
+            # свободная вкладка, уже открытая на Telegram Web, — самая тёплая
+            free = [tid for tid, info in tabs.items() if not _leased(info, now)]
+            free.sort(key=lambda tid: TG_HOST not in (open_pages[tid].url or ""))
+            if free:
+                tid, page = free[0], open_pages[free[0]]
+            else:
+                page = ctx.new_page()
+                tid = _target_id(ctx, page)
+            if tid:
+                tabs.setdefault(tid, {"uses": 0}).update(lease=os.getpid(), leased_at=now)
+                self.leased[id(page)] = tid
+            _save_state(state)
+        return ctx, page
+
+    def release(self, ctx, page):
+        if id(ctx) in self.fresh:
+            self.fresh.discard(id(ctx))
+            ctx.close()
+            return
+        tid = self.leased.pop(id(page), None)
+        if tid is None:
+            # вкладку не удалось учесть в пуле — не оставляем её висеть
+            page.close()
+            return
+        with _state_lock:
+            state = _load_state()
+            tabs = state.setdefault("tabs", {})
+            info = tabs.get(tid, {"uses": 0})
+            info["uses"] = info.get("uses", 0) + 1
+            info.pop("lease", None)
+            info.pop("leased_at", None)
+            if info["uses"] >= self.max_uses:
+                log(f"Вкладка отработала {info['uses']} раз — закрываю, следующему сценарию откроется новая.")
+                tabs.pop(tid, None)
+                if len(ctx.pages) <= 1:
+                    ctx.new_page()  # последняя вкладка закрыла бы окно Chrome сервера
+                page.close()
+            else:
+                tabs[tid] = info
+            _save_state(state)
+
+# ----------------- точка входа для сценариев -----------------
+
+def open_context(p, launch, cdp_url: str | None = None, fresh: bool = False, max_uses: int = 20):
+    # возвращает (ctx, page, release, mode); release() вместо ctx.close()
+    if not cdp_url:
+        ctx = launch()
+        return ctx, ctx.new_page(), ctx.close, "cold"
+    browser = p.chromium.connect_over_cdp(cdp_url)
+    pool = ContextPool(browser, max_uses=max_uses)
+    ctx, page = pool.acquire(fresh=fresh)
+    log(f"Подключился к серверу {cdp_url} ({'новый контекст' if fresh else 'тёплая вкладка из пула, экспериментально'}).")
+
+    def release():
+        try:
+            pool.release(ctx, page)
+        finally:
+            browser.close()  # для CDP-подключения — только отключение, Chrome и вкладки пула остаются
+
+    return ctx, page, release, "fresh" if fresh else "warm"
+
+def report_first_click(started: float, mode: str) -> float:
+    took = time.perf_counter() - started
+    log(f"Старт → первый клик ({mode}): {took:.2f} с")
+    return round(took, 3)
+
+def main():
+    ap = argparse.ArgumentParser(description="Долгоживущий Chrome для buy_* сценариев")
+    ap.add_argument("--port", type=int, default=9222)
+    ap.add_argument("--profile", default=".pw_telegram", help="папка профиля Chrome")
+    ap.add_argument("--headless", action="store_true")
+    args = ap.parse_args()
+    serve(args.port, args.profile, args.headless)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# credit_poll.py — ожидание зачисления после покупки: опрос балансов с нарастающей паузой
+#
+# Бэкенд может зачислять покупку асинхронно: один запрос сразу после сценария
+# даёт ложную «Δ 0». Опрашиваем, пока не появится ожидаемое изменение или не
+# выйдет срок, и считаем time-to-credit — от конца сценария до первого ответа
+# API с зачислением.
+#
+# Настройки в config.json (все необязательны):
+#   "credit_poll": {"deadline_s": 30, "first_delay_s": 0.25, "max_delay_s": 4,
+#                   "expected_delta": {"sapphires": 10, "diamonds": 10},
+#                   "spend": {"diamonds": {"sapphires": 10}}}
+# expected_delta — зачисление за одну покупку актива, spend — чем и сколько за неё
+# списывается (алмазы и изумруды покупаются за сапфиры). Без expected_delta
+# зачислением считается любое изменение баланса.
+import asyncio, random, time
+
+import tracing
+
+DEFAULTS = {"deadline_s": 30.0, "first_delay_s": 0.25, "factor": 1.8, "max_delay_s": 4.0}
+
+def log(msg):
+    print(f"[credit] {msg}", flush=True)
+
+def _credited(old_val, new_val, expected: float | None) -> bool:
+    if old_val is None or new_val is None:
+        return False
+    delta = new_val - old_val
+    if expected is None:
+        return delta != 0
+    # списание (expected < 0) и зачисление сравниваем по модулю
+    return abs(delta) >= abs(expected) - 1e-9 and (delta > 0) == (expected > 0)
+
+def _delays(opts: dict, flow_done: float):
+    # паузы между опросами до дедлайна; джиттер — чтобы воркеры не били в API синхронно
+    deadline = flow_done + opts["deadline_s"]
+    delay = opts["first_delay_s"]
+    while (left := deadline - time.perf_counter()) > 0:
+        yield min(left, delay * random.uniform(0.8, 1.2))
+        delay = min(opts["max_delay_s"], delay * opts["factor"])
+
+def _result(balances, credited: bool, polls: int, flow_done: float, opts: dict, tracked: bool) -> dict:
+    ttc_ms = round((time.perf_counter() - flow_done) * 1000) if credited else None
+    if credited:
+        log(f"Зачислено через {ttc_ms} мс ({polls} запрос(ов) балансов).")
+    elif tracked:
+        log(f"Зачисление не увидели за {opts['deadline_s']:g} с ({polls} запрос(ов)).")
+    return {"balances": balances, "credited": credited, "time_to_credit_ms": ttc_ms, "polls": polls}
+
+@tracing.traced("credit_poll", cat="api", check=lambda r: r["credited"])
+def wait_for_credit(fetch, extract, old_val, first, *, flow_done: float,
+                    expected: float | None = None, cfg: dict | None = None) -> dict:
+    # fetch() -> (balances, code); first — ответ, уже полученный после сценария;
+    # flow_done — perf_counter() в момент окончания сценария
+    opts = {**DEFAULTS, **(cfg or {})}
+    balances, polls = first, 1
+    new_val = extract(balances) if balances else None
+    if old_val is not None:
+        for pause in _delays(opts, flow_done):
+            if _credited(old_val, new_val, expected):
+                break
+            time.sleep(pause)
+            got, code = fetch()
+            polls += 1
+            if got:
+                balances, new_val = got, extract(got)
+            elif code == 401:
+                break
+    credited = _credited(old_val, new_val, expected)
+    return _result(balances, credited, polls, flow_done, opts, old_val is not None)
+
+def expected_deltas(bought: list[str], cfg: dict | None = None) -> dict[str, float | None]:
+    # итог нескольких покупок по активам: зачисления минус списания; bought — актив
+    # каждой успешной покупки. None — зачисление актива не задано, ждём любое изменение
+    cfg = cfg or {}
+    gains = cfg.get("expected_delta") or {}
+    spend = cfg.get("spend") or {}
+    totals: dict[str, float] = {}
+    for asset in bought:
+        totals[asset] = totals.get(asset, 0.0) + (gains.get(asset) or 0.0)
+        for paid_with, cost in (spend.get(asset) or {}).items():
+            totals[paid_with] = totals.get(paid_with, 0.0) - cost
+    return {a: None if a in bought and gains.get(a) is None else v for a, v in totals.items()}
+
+@tracing.traced("credit_poll", cat="api", check=lambda r: all(c["credited"] for c in r["assets"].values()))
+def wait_for_credits(fetch, extract, old: dict, first, *, flow_done: float,
+                     expected: dict, cfg: dict | None = None) -> dict:
+    # несколько активов одним опросом: один запрос балансов на тик, у каждого актива
+    # своё time-to-credit. extract(balances, asset); old и expected — по активам
+    opts = {**DEFAULTS, **(cfg or {})}
+    balances, polls = first, 1
+    done: dict[str, int] = {}
+
+    def check():
+        for asset, exp in expected.items():
+            if asset not in done and balances and _credited(old.get(asset), extract(balances, asset), exp):
+                done[asset] = round((time.perf_counter() - flow_done) * 1000)
+
+    check()
+    tracked = [a for a in expected if old.get(a) is not None]
+    if tracked:
+        for pause in _delays(opts, flow_done):
+            if all(a in done for a in tracked):
+                break
+            time.sleep(pause)
+            got, code = fetch()
+            polls += 1
+            if got:
+                balances = got
+                check()
+            elif code == 401:
+                break
+    assets = {}
+    for asset in expected:
+        if asset in done:
+            log(f"{asset}: зачислено через {done[asset]} мс.")
+        elif asset in tracked:
+            log(f"{asset}: зачисление не увидели за {opts['deadline_s']:g} с.")
+        assets[asset] = {"credited": asset in done, "time_to_credit_ms": done.get(asset), "polls": polls}
+    log(f"Запросов балансов: {polls}.")
+    return {"balances": balances, "polls": polls, "assets": assets}
+
+@tracing.traced("credit_poll", cat="api", check=lambda r: r["credited"])
+async def wait_for_credit_async(fetch, extract, old_val, first, *, flow_done: float,
+                                expected: float | None = None, cfg: dict | None = None) -> dict:
+    # то же для async_flow: fetch — корутина
+    opts = {**DEFAULTS, **(cfg or {})}
+    balances, polls = first, 1
+    new_val = extract(balances) if balances else None
+    if old_val is not None:
+        for pause in _delays(opts, flow_done):
+            if _credited(old_val, new_val, expected):
+                break
+            await asyncio.sleep(pause)
+            got, code = await fetch()
+            polls += 1
+            if got:
+                balances, new_val = got, extract(got)
+            elif code == 401:
+                break
+    credited = _credited(old_val, new_val, expected)
+    return _result(balances, credited, polls, flow_done, opts, old_val is not None)
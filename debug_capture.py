@@ -0,0 +1,132 @@
+# debug_capture.py — console/pageerror/requestfailed страницы в кольцевой буфер вместо print
+#
+# Telegram Web пишет в консоль постоянно; печать каждого сообщения из обработчика
+# событий тормозит сами обработчики и заваливает терминал, когда страниц много.
+# Здесь событие фильтруется по уровню и URL, считается и кладётся в deque
+# фиксированного размера — на диск буфер попадает только при ошибке сценария
+# (dump) или по запросу: kill -USR1 <pid> сбрасывает буферы всех живых страниц.
+#
+# Настройки в config.json (все необязательны):
+#   "debug_capture": {"size": 300, "level": "warning", "ignore_urls": ["google-analytics"],
+#                     "dir": "debug", "echo": false}
+# echo=true — прежнее поведение: отфильтрованные события ещё и печатаются.
+import os, re, signal, threading, time, weakref
+from collections import Counter, deque
+from pathlib import Path
+
+import snapshot
+
+DEFAULTS = {
+    "size": 300,
+    "level": "warning",
+    "ignore_urls": [],
+    # отменённые навигации и запросы, снятые fast_profile, — не ошибки
+    "ignore_failures": ["net::ERR_ABORTED", "net::ERR_FAILED"],
+    "dir": str(Path(__file__).with_name("debug")),
+    "echo": False,
+}
+LEVELS = {"debug": 10, "trace": 10, "log": 20, "info": 20, "dir": 20, "table": 20,
+          "warning": 30, "assert": 40, "error": 40}
+MAX_TEXT = 2000
+
+_live: "weakref.WeakSet[DebugCapture]" = weakref.WeakSet()
+_totals: Counter = Counter()
+_totals_lock = threading.Lock()
+_signal_installed = False
+
+def log(msg):
+    print(f"[debug] {msg}", flush=True)
+
+class DebugCapture:
+    def __init__(self, page, cfg_section: dict | None = None, name: str = "page"):
+        opts = {**DEFAULTS, **(cfg_section or {})}
+        self.name = name
+        self.buf: deque = deque(maxlen=opts["size"])
+        self.counts: Counter = Counter()
+        self.min_level = LEVELS.get(opts["level"], 30)
+        self.echo = bool(opts["echo"])
+        self.dir = Path(opts["dir"])
+        self._ignore_url = re.compile("|".join(opts["ignore_urls"])) if opts["ignore_urls"] else None
+        self._ignore_failures = tuple(opts["ignore_failures"])
+        self.dumped: Path | None = None
+        page.on("console", self._on_console)
+        page.on("pageerror", self._on_pageerror)
+        page.on("requestfailed", self._on_requestfailed)
+        _live.add(self)
+
+    def _keep(self, kind: str, level: str, text: str, url: str = ""):
+        self.counts[kind] += 1
+        self.buf.append((time.time(), kind, level, text[:MAX_TEXT], url))
+        if self.echo:
+            print(f"[{kind}]", level, text, url)
+
+    def _skip(self, key: str):
+        self.counts[key] += 1
+
+    def _on_console(self, m):
+        # уровень проверяется до чтения текста и адреса — основной поток событий отсеивается здесь
+        if LEVELS.get(m.type, 20) < self.min_level:
+            return self._skip("console_filtered")
+        url = (m.location or {}).get("url") or ""
+        if self._ignore_url and url and self._ignore_url.search(url):
+            return self._skip("console_filtered")
+        self._keep("console", m.type, m.text, url)
+
+    def _on_pageerror(self, e):
+        self._keep("pageerror", "error", str(e))
+
+    def _on_requestfailed(self, r):
+        failure = r.failure or ""
+        if failure.startswith(self._ignore_failures) or (self._ignore_url and self._ignore_url.search(r.url)):
+            return self._skip("requestfailed_filtered")
+        self._keep("requestfailed", "error", failure, r.url)
+
+    def dump(self, reason: str = "") -> Path | None:
+        # буфер в debug/<время>-<имя>-<pid>.jsonl: первая строка — сводка, дальше события
+        if not self.buf:
+            return None
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self.dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{self.name.replace('/', '_')}-{os.getpid()}.jsonl"
+        head = {"name": self.name, "reason": reason, "counts": dict(self.counts), "kept": len(self.buf)}
+        events = ({"ts": round(ts, 3), "kind": kind, "level": level, "text": text, **({"url": url} if url else {})}
+                  for ts, kind, level, text, url in list(self.buf))
+        snapshot.write(path, _chain(head, events))
+        self.dumped = path
+        log(f"{self.name}: {len(self.buf)} событий сохранено в {path}" + (f" ({reason})" if reason else ""))
+        return path
+
+    def close(self):
+        # счётчики страницы — в общую статистику процесса
+        with _totals_lock:
+            _totals.update(self.counts)
+        _live.discard(self)
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+def attach(page, cfg_section: dict | None = None, name: str = "page") -> DebugCapture:
+    _install_signal()
+    return DebugCapture(page, cfg_section, name)
+
+def dump_all(reason: str = "по запросу") -> list[Path]:
+    return [p for c in list(_live) if (p := c.dump(reason))]
+
+def _install_signal():
+    # SIGUSR1 — сбросить буферы всех страниц, не останавливая прогон (только POSIX, главный поток)
+    global _signal_installed
+    if _signal_installed or not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(signal.SIGUSR1, lambda *_: dump_all())
+    _signal_installed = True
+
+def report():
+    with _totals_lock:
+        t = Counter(_totals)
+    for c in list(_live):
+        t.update(c.counts)
+    if not t:
+        return
+    print(f"[debug] console: {t['console']} (отфильтровано {t['console_filtered']}), "
+          f"pageerror: {t['pageerror']}, requestfailed: {t['requestfailed']} "
+          f"(отфильтровано {t['requestfailed_filtered']})")
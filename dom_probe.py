@@ -0,0 +1,135 @@
+# dom_probe.py — проверка целой цепочки кандидатов за один evaluate
+#
+# Вместо loc.count() / is_visible() / click() по каждому варианту отправляем в
+# страницу (или фрейм) весь список кандидатов {css, text, has} и получаем их
+# наличие/видимость/доступность, отсортированные по пригодности. Лучший
+# кандидат помечается data-probe, и клик идёт прямо по нему.
+import itertools, re
+from functools import lru_cache
+
+_tokens = itertools.count(1)
+
+PROBE_JS = """
+([cands, token]) => {
+  const norm = s => (s || "").replace(/\\s+/g, " ").trim();
+  const textOk = (el, re) => !re || new RegExp(re, "i").test(norm(el.innerText || el.textContent));
+  const visible = el => {
+    const r = el.getBoundingClientRect();
+    if (!r.width || !r.height) return false;
+    const st = getComputedStyle(el);
+    return st.visibility !== "hidden" && st.display !== "none" && parseFloat(st.opacity || "1") > 0;
+  };
+  const enabled = el => !el.disabled && el.getAttribute("aria-disabled") !== "true";
+  const matches = (el, c) => textOk(el, c.text)
+    && (!c.has || [...el.querySelectorAll(c.has.css)].some(x => textOk(x, c.has.text)));
+
+  document.querySelectorAll("[data-probe]").forEach(el => el.removeAttribute("data-probe"));
+  const out = cands.map((c, i) => {
+    let els = [];
+    try { els = [...document.querySelectorAll(c.css)].filter(el => matches(el, c)); } catch (e) {}
+    const el = c.last ? els[els.length - 1] : els[0];
+    return { i, src: c.src, count: els.length, exists: !!el,
+             visible: !!el && visible(el), enabled: !!el && enabled(el), el };
+  });
+  const score = r => (r.visible ? 2 : 0) + (r.enabled ? 1 : 0);
+  const ranked = out.filter(r => r.exists).sort((a, b) => score(b) - score(a) || a.i - b.i);
+  if (ranked.length && ranked[0].visible && ranked[0].enabled) ranked[0].el.setAttribute("data-probe", token);
+  return ranked.map(({ el, ...r }) => r);
+}
+"""
+
+# ----------------- перевод Playwright-селекторов в кандидатов -----------------
+
+_HAS_TEXT = re.compile(r'^(?P<css>.+?):has-text\("(?P<text>[^"]*)"\)$')
+_HAS_CHILD_TEXT = re.compile(r'^(?P<css>.+?):has\((?P<child>.+?):has-text\("(?P<text>[^"]*)"\)\)$')
+
+def _split_top(sel: str) -> list[str]:
+    # делим по запятым верхнего уровня (вне скобок и кавычек)
+    parts, depth, quote, cur = [], 0, None, ""
+    for ch in sel:
+        if quote:
+            quote = None if ch == quote else quote
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(cur.strip())
+            cur = ""
+            continue
+        cur += ch
+    parts.append(cur.strip())
+    return [p for p in parts if p]
+
+def _js_escape(text: str) -> str:
+    return re.sub(r"[.*+?^${}()|[\]\\/]", lambda m: "\\" + m.group(0), text)
+
+@lru_cache(maxsize=None)
+def _convert(sel: str) -> tuple | None:
+    out = []
+    for part in _split_top(sel):
+        if part.startswith(("role=", "text=", "internal:")):
+            return None
+        m = _HAS_CHILD_TEXT.match(part)
+        if m:
+            out.append({"css": m["css"], "has": {"css": m["child"], "text": _js_escape(m["text"])}})
+            continue
+        m = _HAS_TEXT.match(part)
+        if m:
+            out.append({"css": m["css"], "text": _js_escape(m["text"])})
+            continue
+        if ":has-text(" in part or ":text" in part:
+            return None
+        out.append({"css": part})
+    return tuple(out)
+
+def candidates(selectors) -> list[dict] | None:
+    # src — индекс исходного селектора; None, если что-то не выражается через CSS + текст
+    out = []
+    for i, sel in enumerate(selectors):
+        conv = _convert(sel)
+        if conv is None:
+            return None
+        out.extend(dict(c, src=i) for c in conv)
+    return out
+
+# ----------------- sync -----------------
+
+def probe(target, cands: list[dict]) -> tuple[str, list[dict]]:
+    token = f"p{next(_tokens)}"
+    return token, target.evaluate(PROBE_JS, [cands, token])
+
+def probe_click(target, cands: list[dict], timeout: int = 5000, force_fallback: bool = True) -> dict | None:
+    # один evaluate на выбор + один клик; возвращает выбранного кандидата или None
+    token, ranked = probe(target, cands)
+    if not ranked or not (ranked[0]["visible"] and ranked[0]["enabled"]):
+        return None
+    el = target.locator(f'[data-probe="{token}"]')
+    try:
+        el.click(timeout=timeout)
+    except Exception:
+        if not force_fallback:
+            raise
+        el.click(timeout=timeout, force=True)
+    return ranked[0]
+
+# ----------------- async -----------------
+
+async def probe_async(target, cands: list[dict]) -> tuple[str, list[dict]]:
+    token = f"p{next(_tokens)}"
+    return token, await target.evaluate(PROBE_JS, [cands, token])
+
+async def probe_click_async(target, cands: list[dict], timeout: int = 5000, force_fallback: bool = True) -> dict | None:
+    token, ranked = await probe_async(target, cands)
+    if not ranked or not (ranked[0]["visible"] and ranked[0]["enabled"]):
+        return None
+    el = target.locator(f'[data-probe="{token}"]')
+    try:
+        await el.click(timeout=timeout)
+    except Exception:
+        if not force_fallback:
+            raise
+        await el.click(timeout=timeout, force=True)
+    return ranked[0]
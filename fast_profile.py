@@ -0,0 +1,140 @@
+# fast_profile.py — «быстрый профиль»: headless + блокировка необязательных ресурсов
+#
+# Включается в config.json:
+#   "fast_profile": {
+#     "enabled": true,
+#     "stub_types": ["image"],                  # подменяются пустышкой (img/src остаются для селекторов)
+#     "block_types": ["media", "font"],         # обрываются
+#     "block_domains": ["google-analytics.com"],# обрываются целиком
+#     "domains": {"web.telegram.org": {"block_types": ["media", "font", "image"]}}
+#   }
+# Правила из "domains" переопределяют общие для конкретного хоста.
+import base64, time
+from urllib.parse import urlsplit
+
+DEFAULT_RULES = {
+    "stub_types": ["image"],
+    "block_types": ["media", "font"],
+    "block_domains": [
+        "google-analytics.com", "googletagmanager.com", "mc.yandex.ru",
+        "sentry.io", "amplitude.com", "mixpanel.com", "segment.io",
+    ],
+    # аватарки пользователей Telegram
+    "block_paths": ["/i/userpic/"],
+    "domains": {},
+}
+
+# 1×1 прозрачный GIF — вместо картинок, чтобы вёрстка и селекторы по img не ломались
+_PIXEL = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+def log(msg):
+    print(f"[fast] {msg}", flush=True)
+
+def load_rules(cfg_section: dict | None) -> dict:
+    rules = {k: (dict(v) if isinstance(v, dict) else list(v)) for k, v in DEFAULT_RULES.items()}
+    for k, v in (cfg_section or {}).items():
+        if k in rules:
+            rules[k] = v
+    return rules
+
+def _rules_for(rules: dict, host: str) -> dict:
+    for domain, override in rules.get("domains", {}).items():
+        if host == domain or host.endswith("." + domain):
+            return {**rules, **override}
+    return rules
+
+# ----------------- учёт трафика -----------------
+
+class TrafficStats:
+    # считает запросы и байты на уровне контекста (включая iframe WebApp)
+    def __init__(self, ctx=None):
+        self.requests = 0
+        self.bytes = 0
+        self.blocked = 0
+        self.stubbed = 0
+        if ctx is not None:
+            ctx.on("requestfinished", self._on_finished)
+
+    def _on_finished(self, request):
+        self.requests += 1
+        try:
+            sizes = request.sizes()
+            self.bytes += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        except Exception:
+            pass
+
+    def report(self, title: str = "Трафик"):
+        print(f"\n=== {title} ===")
+        print(f"запросов:      {self.requests}")
+        print(f"получено:      {self.bytes / 1024:.0f} КБ")
+        print(f"заблокировано: {self.blocked}, подменено: {self.stubbed}")
+        print("=" * (len(title) + 8) + "\n")
+
+# ----------------- маршрутизация -----------------
+
+def apply(ctx, cfg_section: dict | None = None) -> TrafficStats:
+    rules = load_rules(cfg_section)
+    stats = TrafficStats(ctx)
+
+    def handler(route):
+        req = route.request
+        parts = urlsplit(req.url)
+        host = parts.hostname or ""
+        r = _rules_for(rules, host)
+        if any(host == d or host.endswith("." + d) for d in r["block_domains"]) \
+                or any(p in parts.path for p in r.get("block_paths", [])):
+            stats.blocked += 1
+            return route.fulfill(status=204, body="")
+        if req.resource_type in r["block_types"]:
+            stats.blocked += 1
+            return route.abort()
+        if req.resource_type in r["stub_types"]:
+            stats.stubbed += 1
+            return route.fulfill(status=200, content_type="image/gif", body=_PIXEL)
+        return route.continue_()
+
+    ctx.route("**/*", handler)
+    log("Включён быстрый профиль: блокировка медиа/шрифтов/аналитики, картинки — заглушки.")
+    return stats
+
+def page_load_ms(page) -> float | None:
+    # время загрузки страницы по Navigation Timing
+    try:
+        nav = page.evaluate("() => { const n = performance.getEntriesByType('navigation')[0];"
+                            " return n ? n.loadEventEnd || n.domContentLoadedEventEnd : null; }")
+        return float(nav) if nav else None
+    except Exception:
+        return None
+
+# ----------------- сравнение «с блокировкой / без» -----------------
+
+def compare(url: str, cfg_section: dict | None = None, settle_ms: int = 3000):
+    from playwright.sync_api import sync_playwright
+
+    rows = []
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for fast in (False, True):
+            ctx = browser.new_context()
+            stats = apply(ctx, cfg_section) if fast else TrafficStats(ctx)
+            page = ctx.new_page()
+            started = time.perf_counter()
+            page.goto(url, wait_until="load")
+            wall_ms = (time.perf_counter() - started) * 1000
+            page.wait_for_timeout(settle_ms)  # даём догрузиться фоновым запросам для подсчёта байт
+            rows.append(("блокировка" if fast else "без блокировки", stats, wall_ms, page_load_ms(page)))
+            ctx.close()
+        browser.close()
+
+    print(f"\n=== Быстрый профиль: {url[:60]} ===")
+    print(f"{'режим':<16} {'запросов':>9} {'КБ':>9} {'goto→load, мс':>14} {'loadEvent, мс':>14}")
+    for name, st, wall, load in rows:
+        load_s = f"{load:14.0f}" if load is not None else f"{'—':>14}"
+        print(f"{name:<16} {st.requests:9d} {st.bytes / 1024:9.0f} {wall:14.0f} {load_s}")
+    print()
+
+if __name__ == "__main__":
+    import json, sys
+    from pathlib import Path
+    cfg = json.loads(Path(__file__).with_name("config.json").read_text(encoding="utf-8"))
+    compare(sys.argv[1] if len(sys.argv) > 1 else cfg["tma_url"], cfg.get("fast_profile"))
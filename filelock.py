@@ -0,0 +1,50 @@
+# filelock.py — блокировка файла между процессами (и потоками одного процесса)
+#
+#   with filelock.FileLock(path.with_name(path.name + ".lock")):
+#       state = read(path); ...; write(path, state)
+#
+# Нужна там, где общий файл читают-меняют-пишут несколько процессов сразу:
+# .browser_server.json, selector_cache.json, auth.json. fcntl.flock на POSIX,
+# msvcrt.locking на Windows; сам .lock-файл пустой и не удаляется.
+import os, threading
+from pathlib import Path
+
+try:
+    import fcntl
+
+    def _lock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_fd(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock_fd(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class FileLock:
+    # flock привязан к открытому файлу, а не к потоку — потоки одного процесса
+    # дополнительно идут через обычный Lock
+    def __init__(self, path: Path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        _lock_fd(self._fd)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            _unlock_fd(self._fd)
+        finally:
+            os.close(self._fd)
+            self._thread_lock.release()
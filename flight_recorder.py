@@ -0,0 +1,192 @@
+# flight_recorder.py — скользящая запись Playwright trace и сети; на диск — только при ошибке
+#
+# Полный trace на каждом прогоне слишком дорог. Здесь трассировка контекста идёт
+# кусками (start_chunk/stop_chunk): на границе каждой UI-фазы (traced-функции
+# purchase_runner, шаги purchase_flows) текущий кусок закрывается во временный zip;
+# API-спаны (balances_api, credit_poll, token_from_storage) кусок не режут — иначе
+# при опросе зачисления окно keep_steps заполнялось бы ими без UI. Хранятся
+# только последние keep_steps кусков за последние keep_s секунд. Сеть — кольцо
+# из последних har_entries запросов (ссылки на объекты Playwright, без тел),
+# HAR собирается из него только при сохранении.
+#
+# Если сценарий не прошёл, persist() копирует куски (свежие — в первую очередь,
+# не больше max_mb) и network.har в flight/<время>-<имя>/; иначе всё выбрасывается.
+#   npx playwright show-trace flight/…/03-diamonds_buy.zip
+#
+# Включение в config.json:
+#   "flight_recorder": {"enabled": true, "keep_steps": 4, "keep_s": 60, "max_mb": 50,
+#                       "screenshots": true, "snapshots": true, "har_entries": 500}
+import contextvars, json, os, shutil, tempfile, time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+import tracing
+
+DEFAULTS = {
+    "enabled": False,
+    "keep_steps": 4,
+    "keep_s": 60,
+    "max_mb": 50,
+    "screenshots": True,
+    "snapshots": True,
+    "har_entries": 500,
+    "dir": str(Path(__file__).with_name("flight")),
+}
+REDACT = {"authorization", "cookie", "set-cookie"}
+UI_CATS = {"flow", "step"}  # категории спанов tracing, на которых режется кусок
+
+# активный рекордер прогона: фазы отмечаются через tracing.phase без передачи параметров
+_current = contextvars.ContextVar("flight_recorder", default=None)
+
+def log(msg):
+    print(f"[flight] {msg}", flush=True)
+
+def _on_phase(label: str, cat: str):
+    rec = _current.get()
+    if rec is not None and cat in UI_CATS:
+        rec.step(label)
+
+class _NoRecorder:
+    def step(self, name: str):
+        pass
+
+    def persist(self, reason: str = "") -> Path | None:
+        return None
+
+    def close(self):
+        pass
+
+_NO_RECORDER = _NoRecorder()
+
+class FlightRecorder:
+    def __init__(self, ctx, opts: dict, name: str):
+        self.ctx = ctx
+        self.opts = opts
+        self.name = name
+        self.tmp = Path(tempfile.mkdtemp(prefix="flight-"))
+        self.chunks: deque = deque()  # (zip, фаза, начало, конец)
+        self.net: deque = deque(maxlen=opts["har_entries"])
+        self.seq = 0
+        self.overhead_s = 0.0
+        self.phase = "start"
+        self.phase_started = time.time()
+        ctx.on("response", self._on_response)
+        ctx.on("requestfailed", self._on_failed)
+        t0 = time.perf_counter()
+        ctx.tracing.start(screenshots=opts["screenshots"], snapshots=opts["snapshots"], sources=False)
+        ctx.tracing.start_chunk(title=self.phase)
+        self.overhead_s += time.perf_counter() - t0
+        self._token = _current.set(self)
+
+    def _on_response(self, response):
+        self.net.append((time.time(), response.request, response))
+
+    def _on_failed(self, request):
+        self.net.append((time.time(), request, None))
+
+    def _rotate(self, next_phase: str | None):
+        # закрыть текущий кусок во временный zip и начать следующий
+        t0 = time.perf_counter()
+        now = time.time()
+        self.seq += 1
+        path = self.tmp / f"{self.seq:03d}.zip"
+        try:
+            self.ctx.tracing.stop_chunk(path=str(path))
+            self.chunks.append((path, self.phase, self.phase_started, now))
+        except Exception as e:
+            log(f"Кусок трассировки не записан: {e}")
+        while len(self.chunks) > self.opts["keep_steps"] or (
+                self.chunks and now - self.chunks[0][3] > self.opts["keep_s"]):
+            self.chunks.popleft()[0].unlink(missing_ok=True)
+        if next_phase is not None:
+            try:
+                self.ctx.tracing.start_chunk(title=next_phase)
+            except Exception as e:
+                log(f"Новый кусок трассировки не начат: {e}")
+            self.phase, self.phase_started = next_phase, now
+        self.overhead_s += time.perf_counter() - t0
+
+    def step(self, name: str):
+        self._rotate(name)
+
+    def persist(self, reason: str = "") -> Path | None:
+        # вызывается из finally сценария — ошибка записи не должна мешать закрыть браузер
+        try:
+            return self._persist(reason)
+        except Exception as e:
+            log(f"{self.name}: запись не сохранена: {e}")
+            return None
+
+    def _persist(self, reason: str) -> Path:
+        # последний кусок + предыдущие подряд (от свежих к старым) в пределах max_mb, и HAR
+        self._rotate(self.phase)
+        out = Path(self.opts["dir"]) / f"{time.strftime('%Y%m%d-%H%M%S')}-{self.name.replace('/', '_')}-{os.getpid()}"
+        out.mkdir(parents=True, exist_ok=True)
+        # только непрерывный хвост: первый кусок, что не влез (или пропал), обрывает выборку
+        budget = self.opts["max_mb"] * 2**20
+        kept = []
+        for path, phase, _, _ in reversed(self.chunks):
+            size = path.stat().st_size if path.exists() else 0
+            if not size or size > budget:
+                if not kept and size:
+                    log(f"{self.name}: последний кусок trace ({size / 2**20:.1f} МБ) больше max_mb — не сохранён.")
+                break
+            budget -= size
+            kept.append((path, phase))
+        for i, (path, phase) in enumerate(reversed(kept), 1):
+            safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in phase)
+            shutil.copyfile(path, out / f"{i:02d}-{safe}.zip")
+        (out / "network.har").write_text(json.dumps(self.har(), ensure_ascii=False), encoding="utf-8")
+        if reason:
+            (out / "reason.txt").write_text(reason + "\n", encoding="utf-8")
+        log(f"{self.name}: {len(kept)} кусков trace + {len(self.net)} запросов сохранено в {out}"
+            + (f" ({reason})" if reason else ""))
+        return out
+
+    def har(self) -> dict:
+        entries = []
+        for ts, req, resp in list(self.net):
+            t = req.timing or {}
+            start_ms = t.get("startTime") or ts * 1000
+            wait = max(0.0, t.get("responseStart", -1) - max(0.0, t.get("requestStart", 0))) \
+                if t.get("responseStart", -1) >= 0 else -1
+            total = t.get("responseEnd", -1)
+            entries.append({
+                "startedDateTime": datetime.fromtimestamp(start_ms / 1000, timezone.utc).isoformat(),
+                "time": total if total >= 0 else 0,
+                "request": {"method": req.method, "url": req.url, "httpVersion": "HTTP/1.1",
+                            "headers": _headers(req.headers), "queryString": [], "cookies": [],
+                            "headersSize": -1, "bodySize": -1},
+                "response": {"status": resp.status if resp else 0,
+                             "statusText": resp.status_text if resp else (req.failure or ""),
+                             "httpVersion": "HTTP/1.1", "headers": _headers(resp.headers) if resp else [],
+                             "cookies": [], "redirectURL": "", "headersSize": -1, "bodySize": -1,
+                             "content": {"size": -1, "mimeType": (resp.headers.get("content-type", "") if resp else "")}},
+                "cache": {},
+                "timings": {"send": 0, "wait": wait, "receive": -1},
+                "_resourceType": req.resource_type,
+            })
+        return {"log": {"version": "1.2", "creator": {"name": "flight_recorder", "version": "1"},
+                        "pages": [], "entries": entries}}
+
+    def close(self):
+        try:
+            self.ctx.tracing.stop()
+        except Exception:
+            pass
+        _current.reset(self._token)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        log(f"{self.name}: накладные расходы записи {self.overhead_s * 1000:.0f} мс, кусков {self.seq}.")
+
+def _headers(h: dict) -> list[dict]:
+    # токены и cookie в HAR не попадают
+    return [{"name": k, "value": "<redacted>" if k.lower() in REDACT else v} for k, v in h.items()]
+
+def start(ctx, cfg_section: dict | None, name: str):
+    # FlightRecorder или пустышка, если запись выключена
+    opts = {**DEFAULTS, **(cfg_section or {})}
+    if not opts["enabled"]:
+        return _NO_RECORDER
+    tracing.on_phase(_on_phase)
+    return FlightRecorder(ctx, opts, name)
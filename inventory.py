@@ -0,0 +1,117 @@
+# inventory.py — постраничное чтение инвентаря с предзагрузкой следующих страниц
+#
+#   for item in iter_inventory(token, page_size=200, prefetch=4):
+#       ...
+#
+# Предметы отдаются по мере прихода страниц; одновременно в полёте не больше
+# prefetch страниц, так что в памяти держится максимум prefetch + 1 страница,
+# сколько бы предметов ни было у аккаунта.
+#
+# Конец инвентаря: по total / has_more / total_pages из ответа, если API их отдаёт;
+# иначе — пустая страница, страница с тем же первым предметом, что и предыдущая
+# (сервер игнорирует page), или страница короче тех, что сервер уже отдавал
+# (сервер может урезать limit, поэтому короткая первая страница — ещё не конец).
+# Первая страница запрашивается одна: по её total или pages считается номер
+# последней, и страницы за ним не запрашиваются вовсе (отменить уже ушедший запрос
+# нельзя). Без total/pages предзагрузка идёт вслепую, как раньше.
+import json, math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import api_client
+
+DEFAULT_PAGE_SIZE = 200
+DEFAULT_PREFETCH = 4
+
+TOTAL_KEYS = ("total", "total_count", "totalCount", "total_items", "totalItems")
+HAS_MORE_KEYS = ("has_more", "hasMore", "has_next", "hasNext")
+PAGES_KEYS = ("total_pages", "totalPages", "pages", "last_page", "lastPage")
+ID_KEYS = ("id", "_id", "uuid", "item_id")
+
+def _page_meta(data) -> dict:
+    # total / has_more / pages из конверта страницы или его meta/pagination
+    meta = {}
+    if not isinstance(data, dict):
+        return meta
+    scopes = [data] + [data[k] for k in ("meta", "pagination") if isinstance(data.get(k), dict)]
+    for scope in scopes:
+        for name, keys in (("total", TOTAL_KEYS), ("has_more", HAS_MORE_KEYS), ("pages", PAGES_KEYS)):
+            for k in keys:
+                v = scope.get(k)
+                if name not in meta and isinstance(v, (bool, int)) and (name == "has_more") == isinstance(v, bool):
+                    meta[name] = v
+    return meta
+
+def _last_page(meta: dict, first_len: int) -> int | None:
+    # номер последней страницы из pages или total; длина первой страницы — настоящий limit сервера
+    if "pages" in meta:
+        return max(1, meta["pages"])
+    if "total" in meta and first_len:
+        return max(1, math.ceil(meta["total"] / first_len))
+    return None
+
+def _item_key(item):
+    if isinstance(item, dict):
+        for k in ID_KEYS:
+            if item.get(k) is not None:
+                return item[k]
+    return json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+
+def _fetch_page(c: api_client.ApiClient, token: str, page: int, page_size: int, filters: dict):
+    data = c.get_inventory_page(token, page=page, limit=page_size, **filters)
+    return api_client.unwrap_items(data), _page_meta(data)
+
+def iter_pages(token: str, page_size: int = DEFAULT_PAGE_SIZE, prefetch: int = DEFAULT_PREFETCH,
+               client: api_client.ApiClient | None = None, **filters):
+    # отдаёт списки предметов постранично; ошибки запроса пробрасываются
+    c = client or api_client.client()
+    prefetch = max(1, prefetch)
+    with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="inv") as pool:
+        pending = deque()
+        next_page = 1
+        last = None
+        page = 0
+        seen = 0
+        longest = 0  # самая длинная страница, что сервер отдал, — его настоящий limit
+        prev_first = None
+        try:
+            while True:
+                # до ответа первой страницы — только она
+                while len(pending) < (prefetch if page else 1) and (last is None or next_page <= last):
+                    pending.append(pool.submit(_fetch_page, c, token, next_page, page_size, filters))
+                    next_page += 1
+                if not pending:
+                    return
+                items, meta = pending.popleft().result()
+                page += 1
+                if not items:
+                    return
+                if page == 1:
+                    last = _last_page(meta, len(items))
+                first = _item_key(items[0])
+                if page > 1 and first == prev_first:
+                    return
+                yield items
+                seen += len(items)
+                if "has_more" in meta:
+                    if not meta["has_more"]:
+                        return
+                elif "total" in meta:
+                    if seen >= meta["total"]:
+                        return
+                elif "pages" in meta:
+                    if page >= meta["pages"]:
+                        return
+                elif longest and len(items) < longest:
+                    return
+                longest = max(longest, len(items))
+                prev_first = first
+        finally:
+            # страницы за концом инвентаря (или после break у вызывающего) не ждём
+            for fut in pending:
+                fut.cancel()
+
+def iter_inventory(token: str, page_size: int = DEFAULT_PAGE_SIZE, prefetch: int = DEFAULT_PREFETCH,
+                   client: api_client.ApiClient | None = None, **filters):
+    for items in iter_pages(token, page_size, prefetch, client, **filters):
+        yield from items
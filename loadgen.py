@@ -0,0 +1,324 @@
+# loadgen.py — open-loop нагрузка на API балансов и инвентаря с HDR-гистограммами
+#
+#   python loadgen.py --mock --rate 500 --duration 30              # локальный mock_api в процессе
+#   python loadgen.py --base-url http://127.0.0.1:8088 --rate 200 --mint-tokens 50
+#   python loadgen.py --rate 20 --duration 60 --accounts acc1 acc2 # настоящий стенд, токены аккаунтов
+#
+# Open-loop: запросы отправляются по расписанию (равномерно или пуассоновски с
+# --poisson) независимо от того, ответил ли сервер на предыдущие. Задержка считается
+# от запланированного момента отправки, а не от фактического, — иначе медленный
+# сервер тормозит генератор и прячет собственные задержки (coordinated omission).
+# Отдельно показывается чистое время обслуживания запроса.
+#
+# Токены раздаются по кругу: из auth.json, из .accounts/<имя>/auth.json,
+# из файла --tokens-file (по токену на строку) или выпускаются --mint-tokens
+# (только для mock_api: он принимает любой неистёкший JWT).
+import argparse, itertools, json, math, random, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+import api_client
+import mock_api
+import token_cache
+from purchase_runner import ACCOUNTS_DIR
+
+DEFAULT_MIX = "balances=0.8,inventory=0.2"
+
+def log(msg):
+    print(f"[load] {msg}", flush=True)
+
+# ----------------- HDR-гистограмма -----------------
+
+class Histogram:
+    # лог-линейные корзины, как в HdrHistogram: на каждую степень двойки 64
+    # линейных подкорзины — относительная погрешность < 1% на всём диапазоне,
+    # память — сотни счётчиков, сколько бы значений ни записали
+    SUB_BITS = 7
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.total = 0
+        self.max = 0
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def _index(self, v: int) -> int:
+        e = max(0, v.bit_length() - self.SUB_BITS)
+        return (e << (self.SUB_BITS - 1)) + (v >> e)
+
+    def _value(self, idx: int) -> int:
+        # середина корзины
+        half = 1 << (self.SUB_BITS - 1)
+        e = max(0, idx // half - 1)
+        sub = idx - (e << (self.SUB_BITS - 1))
+        return (sub << e) + ((1 << e) >> 1)
+
+    def record(self, us: float):
+        v = max(1, int(us))
+        with self._lock:
+            self.counts[self._index(v)] += 1
+            self.total += 1
+            self.sum += v
+            if v > self.max:
+                self.max = v
+
+    def percentile(self, q: float) -> int:
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(self._value(idx), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def distribution(self, ticks: int = 5):
+        # строки «значение, перцентиль, накопленное, 1/(1-p)» как в .hgrm: всё
+        # чаще к хвосту — по ticks точек на каждую половину оставшегося диапазона
+        q, step = 0.0, 0.5 / ticks
+        # дальше 1 - 1/total новых значений нет — хвост заканчивается max
+        while q < 1.0 - 1.0 / max(1, self.total):
+            v = self.percentile(q)
+            yield v, q, math.ceil(q * self.total), 1.0 / (1.0 - q)
+            q += step
+            if q >= 1.0 - 2 * step:
+                step /= 2
+        yield self.max, 1.0, self.total, float("inf")
+
+    def write_hgrm(self, path: Path, unit_ratio: float = 1000.0):
+        # формат HdrHistogram percentile distribution (значения в мс) — для HdrHistogram Plotter
+        lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}", ""]
+        for v, q, n, inv in self.distribution():
+            inv_s = f"{inv:14.2f}" if inv != float("inf") else f"{'':>14}"
+            lines.append(f"{v / unit_ratio:12.3f} {q:14.12f} {n:10d} {inv_s}")
+        lines.append(f"#[Mean    = {self.mean() / unit_ratio:12.3f}, Max = {self.max / unit_ratio:12.3f}]")
+        lines.append(f"#[Total count    = {self.total:12d}]")
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+# ----------------- запросы -----------------
+
+def _balances(c: api_client.ApiClient, token: str) -> requests.Response:
+    return c.get(api_client.BALANCES_PATH, token)
+
+def _inventory(c: api_client.ApiClient, token: str) -> requests.Response:
+    # та же первая страница, что запрашивает get_user_inventory
+    return c.get(api_client.INVENTORY_PATH, token, params={
+        "page": 1, "limit": 200, "filter": "ALL", "rarity_filter": "ALL",
+        "tradeable": "false", "for_trade": "false"})
+
+OPS = {"balances": _balances, "inventory": _inventory}
+
+def classify(status: int) -> str:
+    if status < 400:
+        return "ok"
+    if status in (401, 429):
+        return str(status)
+    return "5xx" if status >= 500 else "4xx"
+
+def parse_mix(spec: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPS:
+            raise argparse.ArgumentTypeError(f"неизвестный эндпоинт {name!r} (есть: {', '.join(OPS)})")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+# ----------------- токены -----------------
+
+def load_tokens(args) -> list[str]:
+    tokens = []
+    if args.tokens_file:
+        tokens += [t.strip() for t in Path(args.tokens_file).read_text(encoding="utf-8").splitlines() if t.strip()]
+    for acc in args.accounts or []:
+        t = token_cache.for_file(ACCOUNTS_DIR / acc / "auth.json").get()
+        if t:
+            tokens.append(t)
+        else:
+            log(f"У аккаунта {acc} нет действующего токена — пропускаю.")
+    if args.mint_tokens:
+        tokens += [mock_api.make_token(sub=f"load-{i}") for i in range(args.mint_tokens)]
+    if not tokens:
+        t = token_cache.for_file(Path(__file__).with_name("auth.json")).get()
+        if t:
+            tokens.append(t)
+    return tokens
+
+# ----------------- генератор -----------------
+
+class LoadGen:
+    def __init__(self, client: api_client.ApiClient, tokens: list[str], mix: list[tuple[str, float]],
+                 rate: float, concurrency: int = 64, poisson: bool = False):
+        self.client = client
+        self.tokens = tokens
+        self.names = [n for n, _ in mix]
+        self.weights = [w for _, w in mix]
+        self.rate = rate
+        self.concurrency = concurrency
+        self.poisson = poisson
+        self.latency = {n: Histogram() for n in self.names}   # от запланированного старта
+        self.service = {n: Histogram() for n in self.names}   # от фактической отправки
+        self.errors = {n: Counter() for n in self.names}
+        self._errors_lock = threading.Lock()
+        self.sched_lag = Histogram()                          # насколько генератор опоздал с отправкой
+        self.sent = 0
+        self.elapsed_s = 0.0
+
+    def _fire(self, name: str, token: str, intended: float, record: bool):
+        started = time.perf_counter()
+        try:
+            cls = classify(OPS[name](self.client, token).status_code)
+        except requests.Timeout:
+            cls = "timeout"
+        except requests.ConnectionError:
+            cls = "conn"
+        except Exception:
+            cls = "other"
+        done = time.perf_counter()
+        if not record:
+            return
+        self.latency[name].record((done - intended) * 1e6)
+        self.service[name].record((done - started) * 1e6)
+        with self._errors_lock:
+            self.errors[name][cls] += 1
+
+    def _schedule(self, start: float):
+        # моменты отправки: равномерно 1/rate или пуассоновский поток с тем же средним
+        if not self.poisson:
+            for i in itertools.count():
+                yield start + i / self.rate
+        t = start
+        while True:
+            yield t
+            t += random.expovariate(self.rate)
+
+    def run(self, duration_s: float, warmup_s: float = 0.0):
+        tokens = itertools.cycle(self.tokens)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load") as pool:
+            start = time.perf_counter()
+            measure_from = start + warmup_s
+            end = measure_from + duration_s
+            for intended in self._schedule(start):
+                if intended >= end:
+                    break
+                now = time.perf_counter()
+                if intended > now:
+                    time.sleep(intended - now)
+                record = intended >= measure_from
+                if record:
+                    self.sched_lag.record(max(0.0, time.perf_counter() - intended) * 1e6)
+                    self.sent += 1
+                name = random.choices(self.names, self.weights)[0]
+                pool.submit(self._fire, name, next(tokens), intended, record)
+            log("Расписание исчерпано, жду ответы на отправленные запросы…")
+        self.elapsed_s = time.perf_counter() - measure_from
+
+    # ----------------- отчёт -----------------
+
+    def summary(self) -> dict:
+        out = {"target_rps": self.rate, "sent": self.sent, "seconds": round(self.elapsed_s, 2),
+               "schedule_lag_p99_ms": round(self.sched_lag.percentile(0.99) / 1000, 2), "endpoints": {}}
+        done = 0
+        for name in self.names:
+            h, s = self.latency[name], self.service[name]
+            done += h.total
+            out["endpoints"][name] = {
+                "count": h.total,
+                "errors": dict(self.errors[name]),
+                **{f"p{k}_ms": round(h.percentile(q) / 1000, 2)
+                   for k, q in (("50", 0.5), ("95", 0.95), ("99", 0.99), ("999", 0.999))},
+                "max_ms": round(h.max / 1000, 2),
+                "mean_ms": round(h.mean() / 1000, 2),
+                "service_p50_ms": round(s.percentile(0.5) / 1000, 2),
+                "service_p99_ms": round(s.percentile(0.99) / 1000, 2),
+            }
+        out["achieved_rps"] = round(done / self.elapsed_s, 1) if self.elapsed_s else 0.0
+        return out
+
+    def report(self, summary: dict):
+        print(f"\n=== Нагрузка: цель {self.rate:g} rps, отправлено {summary['sent']}, "
+              f"получено {summary['achieved_rps']:g} rps за {summary['seconds']:g} с ===")
+        print(f"{'эндпоинт':<10} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'p99.9':>8} {'max':>8} "
+              f"{'сервис p50/p99':>16}  ошибки")
+        for name, e in summary["endpoints"].items():
+            errs = ", ".join(f"{k}: {v}" for k, v in sorted(e["errors"].items())) or "—"
+            print(f"{name:<10} {e['count']:7d} {e['p50_ms']:8.1f} {e['p95_ms']:8.1f} {e['p99_ms']:8.1f} "
+                  f"{e['p999_ms']:8.1f} {e['max_ms']:8.1f} {e['service_p50_ms']:7.1f}/{e['service_p99_ms']:<8.1f}  {errs}")
+        print("(мс; задержка — от запланированной отправки, сервис — от фактической)")
+        if summary["schedule_lag_p99_ms"] > 10:
+            print(f"⚠ генератор опаздывал с отправкой: p99 {summary['schedule_lag_p99_ms']} мс "
+                  f"— цель выше, чем тянет этот процесс")
+        for name in self.names:
+            h = self.latency[name]
+            if not h.total:
+                continue
+            print(f"\n{name}: распределение задержки")
+            for v, q, n, _ in h.distribution(ticks=2):
+                bar = "#" * min(50, max(1, round(math.log2(v / 1000 + 1) * 5)))
+                print(f"  {q * 100:9.4f}%  {v / 1000:9.1f} мс  {bar}")
+        print()
+
+def main():
+    ap = argparse.ArgumentParser(description="Open-loop нагрузка на API балансов/инвентаря")
+    ap.add_argument("--rate", type=float, default=50, help="целевые запросы в секунду")
+    ap.add_argument("--duration", type=float, default=30, help="длительность замера, с")
+    ap.add_argument("--warmup", type=float, default=2, help="прогрев без записи, с")
+    ap.add_argument("--concurrency", type=int, default=64, help="потоков и соединений в пуле")
+    ap.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"доли эндпоинтов ({DEFAULT_MIX})")
+    ap.add_argument("--poisson", action="store_true", help="пуассоновский поток вместо равномерного")
+    ap.add_argument("--timeout", type=float, default=10, help="таймаут запроса, с")
+    ap.add_argument("--base-url", help="адрес API (по умолчанию api_base_url из config.json)")
+    ap.add_argument("--mock", action="store_true", help="поднять mock_api в этом процессе")
+    ap.add_argument("--mock-latency", type=mock_api.parse_latency, default=mock_api.parse_latency("lognormal:20:0.5"))
+    ap.add_argument("--tokens-file", help="файл с токенами, по одному на строку")
+    ap.add_argument("--accounts", nargs="+", help="взять токены из .accounts/<имя>/auth.json")
+    ap.add_argument("--mint-tokens", type=int, default=0, help="выпустить N тестовых JWT (для mock_api)")
+    ap.add_argument("--json", help="сохранить сводку в JSON")
+    ap.add_argument("--hgrm", help="префикс файлов .hgrm (HdrHistogram) по эндпоинтам")
+    args = ap.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.mock:
+        state = mock_api.MockState(faults=mock_api.Faults(latency=args.mock_latency))
+        server, base_url = mock_api.serve(state)
+        args.mint_tokens = args.mint_tokens or 16
+    tokens = load_tokens(args)
+    if not tokens:
+        log("Нет ни одного токена: укажи --tokens-file, --accounts или --mint-tokens.")
+        return 2
+
+    # без ретраев: генератор меряет сервер, а не стратегию повторов клиента
+    client = api_client.ApiClient(base_url or api_client.client().base_url, pool_size=args.concurrency,
+                                  retries=0, timeout_s=args.timeout)
+    log(f"{client.base_url}: {args.rate:g} rps × {args.duration:g} с, токенов {len(tokens)}, "
+        f"потоков {args.concurrency}, смесь {', '.join(f'{n}={w:g}' for n, w in args.mix)}")
+    gen = LoadGen(client, tokens, args.mix, args.rate, args.concurrency, args.poisson)
+    try:
+        gen.run(args.duration, args.warmup)
+    finally:
+        if server:
+            server.shutdown()
+
+    summary = gen.summary()
+    gen.report(summary)
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+        log(f"Сводка сохранена в {args.json}")
+    if args.hgrm:
+        for name, h in gen.latency.items():
+            if h.total:
+                path = Path(f"{args.hgrm}.{name}.hgrm")
+                h.write_hgrm(path)
+                log(f"Гистограмма {name}: {path}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,354 @@
+# mock_api.py — локальная замена API zargates: балансы, инвентарь, зачисление покупок
+#
+# Отвечает по тем же путям, что и demo-api-rd.zargates.com, так что api_client,
+# его ретраи, inventory и balance_index работают с ним без изменений:
+#
+#   python mock_api.py --port 8088 --latency lognormal:40:0.6 --p429 0.05 --p5xx 0.02
+#   # config.json: "api_base_url": "http://127.0.0.1:8088"
+#
+# Задержки и отказы (401, 429 с Retry-After, 500/502/503/504) задаются ключами CLI
+# или файлом --faults faults.json, можно отдельно по эндпоинтам:
+#   {"latency": {"kind": "lognormal", "median_ms": 40, "sigma": 0.6, "spike_p": 0.01, "spike_ms": 1500},
+#    "p429": 0.02, "endpoints": {"inventory": {"p5xx": 0.1}}}
+# Формы ответа — все, что разбирают balance_index и api_client.unwrap_items;
+# rotate чередует их от запроса к запросу.
+#
+# Покупка (POST /api/bench/purchase) зачисляется не сразу, а через credit_delay_s —
+# как на настоящем бэкенде, чтобы credit_poll было что ждать. Офлайн-бенчмарк
+# (bench_offline.py) поднимает этот же сервер в потоке:
+#   state = mock_api.MockState(credit_delay_s=0.5)
+#   server, base_url = mock_api.serve(state)     # http://127.0.0.1:<порт>
+import argparse, base64, itertools, json, math, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import api_client
+import token_cache
+
+AUTH_PATH = "/api/v1/auth/telegram"
+PURCHASE_PATH = "/api/bench/purchase"
+ENDPOINTS = {
+    AUTH_PATH: "auth",
+    api_client.BALANCES_PATH: "balances",
+    api_client.INVENTORY_PATH: "inventory",
+    PURCHASE_PATH: "purchase",
+}
+
+# актив -> имя в ответе balances (форма {"data": [{"asset": ..., "amount": ...}]})
+API_ASSETS = {"diamonds": "DIAMOND", "emeralds": "EMERALD", "sapphires": "SAPPHIRE"}
+DEFAULT_BALANCES = {"diamonds": 100.0, "emeralds": 50.0, "sapphires": 20.0}
+
+BALANCE_SHAPES = ("list", "map", "flat", "nested")
+INVENTORY_SHAPES = ("data", "items", "inventory", "list")
+SERVER_ERRORS = (500, 502, 503, 504)
+
+def log(msg):
+    print(f"[mock] {msg}", flush=True)
+
+def make_token(sub: str = "bench", ttl_s: float = 3600) -> str:
+    # JWT без подписи: token_cache читает только exp из payload
+    enc = lambda obj: base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+    payload = {"sub": sub, "exp": int(time.time() + ttl_s)}
+    return f"{enc({'alg': 'none', 'typ': 'JWT'})}.{enc(payload)}.bench"
+
+def fake_items(n: int) -> list[dict]:
+    rarities = ("COMMON", "RARE", "EPIC", "LEGENDARY")
+    return [{"id": i, "offer_id": 1000 + i, "name": f"Item #{i}", "rarity": rarities[i % 4],
+             "tradeable": i % 3 == 0, "price": {"amount": i % 97, "asset": "DIAMOND"}}
+            for i in range(1, n + 1)]
+
+# ----------------- задержки и отказы -----------------
+
+def parse_latency(spec: str) -> dict:
+    # "fixed:20", "uniform:10:80", "exp:30", "lognormal:40:0.6" (медиана, sigma)
+    kind, *nums = spec.split(":")
+    nums = [float(x) for x in nums]
+    if kind == "fixed":
+        return {"kind": kind, "ms": nums[0]}
+    if kind == "uniform":
+        return {"kind": kind, "min_ms": nums[0], "max_ms": nums[1]}
+    if kind == "exp":
+        return {"kind": kind, "mean_ms": nums[0]}
+    if kind == "lognormal":
+        return {"kind": kind, "median_ms": nums[0], "sigma": nums[1] if len(nums) > 1 else 0.5}
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+def sample_latency_ms(spec: dict | None) -> float:
+    if not spec:
+        return 0.0
+    kind = spec.get("kind", "fixed")
+    if kind == "uniform":
+        ms = random.uniform(spec["min_ms"], spec["max_ms"])
+    elif kind == "exp":
+        ms = random.expovariate(1.0 / spec["mean_ms"]) if spec["mean_ms"] > 0 else 0.0
+    elif kind == "lognormal":
+        ms = random.lognormvariate(math.log(spec["median_ms"]), spec.get("sigma", 0.5))
+    else:
+        ms = spec.get("ms", 0.0)
+    # редкие выбросы поверх основного распределения — хвост p99
+    if spec.get("spike_p") and random.random() < spec["spike_p"]:
+        ms += spec.get("spike_ms", 1000.0)
+    return ms
+
+class Faults:
+    KEYS = ("latency", "p401", "p429", "p5xx", "retry_after_s")
+
+    def __init__(self, latency: dict | None = None, p401: float = 0.0, p429: float = 0.0,
+                 p5xx: float = 0.0, retry_after_s: float = 1.0, endpoints: dict | None = None):
+        self.latency = latency
+        self.p401 = p401
+        self.p429 = p429
+        self.p5xx = p5xx
+        self.retry_after_s = retry_after_s
+        # эндпоинт -> Faults с переопределёнными полями
+        self.endpoints = {name: self._override(spec) for name, spec in (endpoints or {}).items()}
+
+    def _override(self, spec: dict) -> "Faults":
+        base = {k: getattr(self, k) for k in self.KEYS}
+        return Faults(**{**base, **{k: v for k, v in spec.items() if k in self.KEYS}})
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Faults":
+        return cls(**{k: v for k, v in d.items() if k in cls.KEYS or k == "endpoints"})
+
+    def for_endpoint(self, name: str) -> "Faults":
+        return self.endpoints.get(name, self)
+
+    def pick_status(self) -> int | None:
+        # одна случайная величина на запрос: доли отказов не перекрываются
+        r = random.random()
+        if r < self.p401:
+            return 401
+        r -= self.p401
+        if r < self.p429:
+            return 429
+        r -= self.p429
+        if r < self.p5xx:
+            return random.choice(SERVER_ERRORS)
+        return None
+
+    def describe(self) -> str:
+        lat = self.latency or {}
+        lat_s = ":".join(str(v) for v in lat.values()) if lat else "нет"
+        return f"задержка {lat_s}, 401 {self.p401:.1%}, 429 {self.p429:.1%}, 5xx {self.p5xx:.1%}"
+
+# ----------------- состояние -----------------
+
+class MockState:
+    def __init__(self, balances: dict | None = None, inventory_size: int = 1500,
+                 credit_delay_s: float = 0.5, token_ttl_s: float = 3600, faults: Faults | None = None,
+                 balances_shape: str = "list", inventory_shape: str = "data"):
+        self.balances = {**DEFAULT_BALANCES, **(balances or {})}
+        self.items = fake_items(inventory_size)
+        self.credit_delay_s = credit_delay_s
+        self.token_ttl_s = token_ttl_s
+        self.faults = faults or Faults()
+        self.balances_shape = balances_shape
+        self.inventory_shape = inventory_shape
+        self._rotation = itertools.count()
+        self._pending: list[tuple[float, str, float]] = []  # (когда, актив, сумма)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.statuses: dict[str, dict[int, int]] = {}
+
+    def count(self, endpoint: str, status: int):
+        with self._lock:
+            self.requests += 1
+            by_status = self.statuses.setdefault(endpoint, {})
+            by_status[status] = by_status.get(status, 0) + 1
+
+    def issue_token(self) -> str:
+        return make_token(ttl_s=self.token_ttl_s)
+
+    def authorized(self, header: str | None) -> bool:
+        # любой bearer подходит (в т.ч. настоящие токены из auth.json), кроме истёкшего JWT
+        if not header or not header.lower().startswith("bearer "):
+            return False
+        token = header[7:].strip()
+        exp = token_cache.jwt_exp(token)
+        return bool(token) and (exp is None or exp > time.time())
+
+    def purchase(self, asset: str, amount: float):
+        with self._lock:
+            self._pending.append((time.perf_counter() + self.credit_delay_s, asset, amount))
+
+    def _apply_due(self):
+        now = time.perf_counter()
+        due = [p for p in self._pending if p[0] <= now]
+        if due:
+            self._pending = [p for p in self._pending if p[0] > now]
+            for _, asset, amount in due:
+                self.balances[asset] = self.balances.get(asset, 0.0) + amount
+
+    def _shape(self, shape: str, shapes: tuple) -> str:
+        return shapes[next(self._rotation) % len(shapes)] if shape == "rotate" else shape
+
+    def balances_payload(self, shape: str | None = None) -> dict:
+        with self._lock:
+            self._apply_due()
+            bal = dict(self.balances)
+        shape = self._shape(shape or self.balances_shape, BALANCE_SHAPES)
+        if shape == "map":
+            # {"balances": {"Diamonds": "110"}} — числа строками, как в старом API
+            return {"balances": {k.capitalize(): f"{v:g}" for k, v in bal.items()}}
+        if shape == "flat":
+            return {k.rstrip("s"): v for k, v in bal.items()}
+        if shape == "nested":
+            return {"result": {"payload": {"items": [
+                {"currency": k, "available_balance": f"{v:g}"} for k, v in bal.items()]}}}
+        return {"data": [{"asset": API_ASSETS.get(k, k.upper()), "amount": v} for k, v in bal.items()]}
+
+    def inventory_page(self, page: int, limit: int, shape: str | None = None):
+        start = (max(1, page) - 1) * limit
+        items = self.items[start:start + limit]
+        shape = self._shape(shape or self.inventory_shape, INVENTORY_SHAPES)
+        if shape == "list":
+            return items
+        return {shape: items, "page": page, "limit": limit, "total": len(self.items)}
+
+# ----------------- HTTP -----------------
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # по умолчанию 5 — под нагрузкой соединения отбрасываются
+
+class Handler(BaseHTTPRequestHandler):
+    state: MockState = None
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего API за балансировщиком
+    # заголовки и тело уходят разными write: без TCP_NODELAY ответ ждёт delayed ACK (~40 мс)
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, code: int, obj, headers: dict | None = None):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        n = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            return {}
+
+    def reply(self, endpoint: str, code: int, obj, headers: dict | None = None):
+        self.state.count(endpoint, code)
+        self.send_json(code, obj, headers)
+
+    def handle_api(self, method: str) -> bool:
+        # True — запрос к API обработан; иначе подкласс отдаёт статику
+        url = urlsplit(self.path)
+        if not url.path.startswith("/api/"):
+            return False
+        st = self.state
+        endpoint = ENDPOINTS.get(url.path, "other")
+        body = self.read_json() if method == "POST" else {}
+
+        faults = st.faults.for_endpoint(endpoint)
+        delay_ms = sample_latency_ms(faults.latency)
+        if delay_ms:
+            time.sleep(delay_ms / 1000.0)
+        injected = faults.pick_status()
+        if injected == 429:
+            self.reply(endpoint, 429, {"message": "Too Many Requests"},
+                       {"Retry-After": f"{faults.retry_after_s:g}"})
+            return True
+        if injected in SERVER_ERRORS:
+            self.reply(endpoint, injected, {"message": "Injected failure"})
+            return True
+
+        if method == "POST" and endpoint == "auth":
+            self.reply(endpoint, 200, {"accessToken": st.issue_token()})
+            return True
+        if injected == 401 or not st.authorized(self.headers.get("Authorization")):
+            self.reply(endpoint, 401, {"message": "Unauthorized"})
+            return True
+        if method == "GET" and endpoint == "balances":
+            self.reply(endpoint, 200, st.balances_payload())
+        elif method == "GET" and endpoint == "inventory":
+            q = parse_qs(url.query)
+            page = int(q.get("page", ["1"])[0])
+            limit = int(q.get("limit", ["999"])[0])
+            self.reply(endpoint, 200, st.inventory_page(page, limit))
+        elif method == "POST" and endpoint == "purchase":
+            st.purchase(str(body.get("asset")), float(body.get("amount") or 0))
+            self.reply(endpoint, 200, {"status": "pending"})
+        else:
+            self.reply(endpoint, 404, {"message": "Not found"})
+        return True
+
+    def do_GET(self):
+        if not self.handle_api("GET"):
+            self.send_json(404, {"message": "Not found"})
+
+    def do_POST(self):
+        if not self.handle_api("POST"):
+            self.send_json(404, {"message": "Not found"})
+
+def serve(state: MockState, host: str = "127.0.0.1", port: int = 0, handler=Handler):
+    # сервер в фоновом потоке; порт 0 — любой свободный. Возвращает (server, base_url)
+    cls = type("BoundHandler", (handler,), {"state": state})
+    server = Server((host, port), cls)
+    threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    log(f"API слушает {base_url}")
+    return server, base_url
+
+def report(state: MockState):
+    with state._lock:
+        statuses = {ep: dict(s) for ep, s in state.statuses.items()}
+    if not statuses:
+        return
+    print("\n=== mock API: ответы ===")
+    for ep, by_status in sorted(statuses.items()):
+        codes = "  ".join(f"{code}: {n}" for code, n in sorted(by_status.items()))
+        print(f"{ep:<10} {codes}")
+    print(f"балансы:   {state.balances_payload('list')['data']}")
+    print("========================\n")
+
+def main():
+    ap = argparse.ArgumentParser(description="Локальная замена API zargates с задержками и отказами")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8088)
+    ap.add_argument("--latency", type=parse_latency, default=None,
+                    help="fixed:MS | uniform:MIN:MAX | exp:MEAN | lognormal:MEDIAN:SIGMA")
+    ap.add_argument("--p401", type=float, default=0.0, help="доля ответов 401")
+    ap.add_argument("--p429", type=float, default=0.0, help="доля ответов 429")
+    ap.add_argument("--p5xx", type=float, default=0.0, help="доля ответов 5xx")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After у 429, с")
+    ap.add_argument("--faults", help="JSON с настройками отказов (перекрывает ключи выше)")
+    ap.add_argument("--balances-shape", default="list", choices=BALANCE_SHAPES + ("rotate",))
+    ap.add_argument("--inventory-shape", default="data", choices=INVENTORY_SHAPES + ("rotate",))
+    ap.add_argument("--inventory-size", type=int, default=1500)
+    ap.add_argument("--credit-delay", type=float, default=0.5, help="через сколько зачисляется покупка, с")
+    args = ap.parse_args()
+
+    if args.faults:
+        with open(args.faults, encoding="utf-8") as f:
+            faults = Faults.from_dict(json.load(f))
+    else:
+        faults = Faults(latency=args.latency, p401=args.p401, p429=args.p429, p5xx=args.p5xx,
+                        retry_after_s=args.retry_after)
+    state = MockState(inventory_size=args.inventory_size, credit_delay_s=args.credit_delay, faults=faults,
+                      balances_shape=args.balances_shape, inventory_shape=args.inventory_shape)
+    server, base_url = serve(state, args.host, args.port)
+    log(f"{faults.describe()}; формы: balances={args.balances_shape}, inventory={args.inventory_shape}")
+    log(f"Токен для запросов: {state.issue_token()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        report(state)
+
+if __name__ == "__main__":
+    main()
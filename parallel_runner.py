@@ -0,0 +1,90 @@
+# parallel_runner.py — параллельный прогон сценариев покупки по нескольким аккаунтам
+#
+# Пример:
+#   python parallel_runner.py --workers 3 --accounts acc1 acc2 acc3 --scenarios diamonds emeralds
+#
+# У каждого аккаунта своя папка .accounts/<имя>/ с профилем Chrome (profile/),
+# auth.json и balances.json. В профиль нужно один раз залогиниться в Telegram Web
+# (например, обычным запуском buy_*.py с этим профилем).
+import argparse, json, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import balance_store
+import purchase_runner
+from purchase_runner import SCENARIOS, credit_stats, print_summary
+
+SUMMARY_FILE = Path(__file__).with_name("parallel_summary.json")
+
+def log(msg):
+    print(f"[runner] {msg}", flush=True)
+
+# ----------------- воркер -----------------
+
+def run_account(account: str, scenarios: list[str], batch: str | None = None) -> list[dict]:
+    # сценарии одного аккаунта идут последовательно: профиль Chrome нельзя открыть дважды
+    if batch:
+        balance_store.set_batch(batch)
+    # профиль и файлы сценариев — в папке аккаунта
+    profile_dir, files = purchase_runner.bind_account(account)
+    results = []
+    for scenario in scenarios:
+        started = time.perf_counter()
+        try:
+            res = purchase_runner.scenario(scenario).run(user_data_dir=profile_dir, interactive=False, files=files)
+        except Exception as e:
+            res = {"scenario": scenario, "ok": False, "delta": None, "error": str(e)}
+        res["account"] = account
+        res["seconds"] = round(time.perf_counter() - started, 2)
+        results.append(res)
+    return results
+
+# ----------------- раздача по пулу и сводка -----------------
+
+def run_parallel(accounts: list[str], scenarios: list[str], workers: int) -> dict:
+    started = time.perf_counter()
+    # один id пачки на все процессы — снимки и зачисления воркеров собираются в balances.db вместе
+    batch = balance_store.new_batch_id("parallel")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_account, acc, scenarios, batch): acc for acc in accounts}
+        for fut in as_completed(futures):
+            acc = futures[fut]
+            try:
+                account_results = fut.result()
+            except Exception as e:
+                account_results = [{"account": acc, "scenario": s, "ok": False, "delta": None, "error": str(e)}
+                                   for s in scenarios]
+            for res in account_results:
+                log(f"{res['account']}/{res['scenario']}: {'OK' if res['ok'] else 'FAIL'} "
+                    f"Δ={res.get('delta')} за {res.get('seconds', '—')} с")
+            results.extend(account_results)
+
+    wall = time.perf_counter() - started
+    ok = sum(1 for r in results if r["ok"])
+    return {
+        "workers": workers,
+        "batch": batch,
+        "jobs": len(results),
+        "purchases_ok": ok,
+        "purchases_failed": len(results) - ok,
+        "wall_seconds": round(wall, 2),
+        "purchases_per_minute": round(ok / (wall / 60.0), 2) if wall > 0 else 0.0,
+        **credit_stats(results),
+        "results": sorted(results, key=lambda r: (r["account"], r["scenario"])),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Параллельный прогон buy_* сценариев по аккаунтам")
+    ap.add_argument("--workers", type=int, default=2, help="число процессов в пуле")
+    ap.add_argument("--accounts", nargs="+", required=True, help="имена аккаунтов (папки в .accounts/)")
+    ap.add_argument("--scenarios", nargs="+", default=["diamonds"], choices=sorted(SCENARIOS))
+    args = ap.parse_args()
+
+    summary = run_parallel(args.accounts, args.scenarios, args.workers)
+    print_summary(summary)
+    SUMMARY_FILE.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    log(f"Сводка сохранена в {SUMMARY_FILE.name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# purchase_flows.py — сценарии покупки внутри WebApp как данные + движок шагов
+#
+# Описание сценария (FLOWS) компилируется один раз в план — кортеж Step с готовыми
+# селекторами, таймаутами и фолбэками. План кешируется на процесс и одинаково
+# исполняется sync- (purchase_runner.py) и async-движком (async_flow.py).
+import time
+from functools import lru_cache
+from typing import NamedTuple
+
+import dom_probe
+import selector_cache
+import tracing
+import waits
+
+def log(msg):
+    print(f"[flow] {msg}", flush=True)
+
+# ----------------- описания сценариев -----------------
+
+BUY_BUTTON_READY = "button.card__submit-button, .card__submit-button"
+CONTINUE_BLUE = (
+    'button.button_blue_gradient:has-text("Продолжить"), '
+    'button.box__button_continue:has-text("Продолжить"), '
+    'button:has-text("Continue")'
+)
+CONTINUE_YELLOW = 'button.button_yellow_gradient:has-text("Продолжить"), button:has-text("Continue")'
+OTP_INPUTS = "div.code input.code__input"
+
+def _deposit_flow(card: str, asset: str) -> dict:
+    # алмазы и изумруды: пополнение → «Купить за N» → Продолжить → код → Подтвердить → Продолжить
+    return {
+        "title": f"пополнения {asset}",
+        "card": card,
+        "amount": "10",
+        "otp": "1111",
+        "steps": [
+            {"name": "deposit", "click": ["div.balances__deposit .button__image, div.balances__deposit"],
+             "in_card": True, "timeout": 8000, "force": False,
+             "log": f"нажал пополнение у {asset}."},
+            {"name": "buy", "ready": BUY_BUTTON_READY, "budget": 3000, "ready_timeout": 12000, "required": True,
+             "click": [
+                 'button.card__submit-button:has(span.card__button-amount:has-text("{amount}"))',
+                 'button.card__submit-button:has-text("Купить за"), button.card__submit-button:has-text("Buy")',
+                 'button:has-text("Купить за"), button:has-text("Buy")',
+             ],
+             "timeout": 5000, "force_timeout": 3000, "retries": 4, "scroll_px": 400,
+             "log": 'нажал кнопку "Купить за".'},
+            {"name": "continue_blue", "ready": CONTINUE_BLUE, "budget": 2000, "ready_timeout": 6000,
+             "click": [CONTINUE_BLUE], "log": 'нажал "Продолжить" (синяя).'},
+            {"name": "otp", "ready": OTP_INPUTS, "budget": 2000, "ready_timeout": 8000, "required": True,
+             "fill": OTP_INPUTS, "log": "ввёл код {otp}."},
+            {"name": "confirm", "click": ['button:has-text("Подтвердить"), button:has-text("Confirm")'],
+             "log": 'нажал "Подтвердить".'},
+            {"name": "continue_yellow", "ready": CONTINUE_YELLOW, "budget": 2000, "ready_timeout": 6000,
+             "click": [CONTINUE_YELLOW], "hidden_after": 800, "log": 'нажал "Продолжить" (жёлтая).'},
+        ],
+    }
+
+FLOWS = {
+    "diamonds": _deposit_flow('img[alt="Diamonds"], img[src*="diamondsBalance"]', "алмазов"),
+    "emeralds": _deposit_flow('img[src*="emeraldsBalance"]', "изумрудов"),
+    "sapphires": {
+        "title": "покупки сапфиров",
+        "card": 'img[alt="Sapphires"]',
+        "amount": "10",
+        # после Confirm в WebApp Telegram открывает окно оплаты Stars (purchase_runner.buy)
+        "pay": True,
+        "steps": [
+            {"name": "deposit", "click": ["div.balances__deposit .button__image, div.balances__deposit"],
+             "in_card": True, "timeout": 6000, "force": False, "log": "открыл окно покупки сапфиров."},
+            {"name": "package", "ready": "div.buy__buy-item .radio", "budget": 400, "ready_timeout": 6000,
+             "click": ['div.buy__buy-item .radio:has(.radio__cash:has-text("{amount}"))'],
+             "optional": True, "timeout": 4000, "force": False,
+             "log": "выбрал пакет на {amount} сапфиров."},
+            {"name": "confirm", "ready": 'button.button_blue_gradient, .box__actions button:has-text("Confirm")',
+             "ready_enabled": True, "budget": 300, "ready_timeout": 5000,
+             "click": ['button.button_blue_gradient, .box__actions button:has-text("Confirm")'],
+             "timeout": 5000, "force": False, "log": "нажал Confirm."},
+        ],
+    },
+}
+
+# ----------------- компиляция в план -----------------
+
+class Step(NamedTuple):
+    name: str
+    selectors: tuple      # цепочка фолбэков для клика (или один селектор полей для fill)
+    fill: bool
+    value: str
+    in_card: bool
+    ready: str | None     # условие готовности вместо старой фиксированной паузы
+    ready_enabled: bool
+    budget_ms: int        # сколько стоила старая пауза — для отчёта waits
+    ready_timeout_ms: int
+    required: bool
+    optional: bool
+    timeout_ms: int
+    force: bool
+    force_timeout_ms: int
+    retries: int
+    scroll_px: int
+    hidden_after_ms: int | None
+    message: str
+
+class Plan(NamedTuple):
+    name: str
+    title: str
+    card: str
+    steps: tuple
+
+@lru_cache(maxsize=None)
+def compile_flow(name: str, amount: str | None = None) -> Plan:
+    spec = FLOWS[name]
+    params = {"amount": amount or spec.get("amount", ""), "otp": spec.get("otp", "")}
+    steps = []
+    for s in spec["steps"]:
+        fill = "fill" in s
+        selectors = (s["fill"],) if fill else tuple(sel.format(**params) for sel in s["click"])
+        timeout = s.get("timeout", 6000)
+        steps.append(Step(
+            name=s["name"],
+            selectors=selectors,
+            fill=fill,
+            value=params["otp"] if fill else "",
+            in_card=s.get("in_card", False),
+            ready=s.get("ready"),
+            ready_enabled=s.get("ready_enabled", False),
+            budget_ms=s.get("budget", 0),
+            ready_timeout_ms=s.get("ready_timeout", 10000),
+            required=s.get("required", False),
+            optional=s.get("optional", False),
+            timeout_ms=timeout,
+            force=s.get("force", True),
+            force_timeout_ms=s.get("force_timeout", timeout),
+            retries=s.get("retries", 1),
+            scroll_px=s.get("scroll_px", 0),
+            hidden_after_ms=s.get("hidden_after"),
+            message=s["log"].format(**params),
+        ))
+    return Plan(name, spec["title"], spec["card"], tuple(steps))
+
+def _cache_key(plan: Plan, step: Step) -> str:
+    return f"{plan.name}/{step.name}"
+
+def _bind(frame, plan: Plan, step: Step) -> list:
+    # локаторы — чисто клиентские объекты, создаются без обращения к браузеру;
+    # в цепочке фолбэков первым идёт победитель прошлых прогонов
+    root = frame.locator("div.balances__item", has=frame.locator(plan.card)) if step.in_card else frame
+    selectors = step.selectors
+    if len(selectors) > 1:
+        selectors = selector_cache.ordered(_cache_key(plan, step), selectors)
+    return [(sel, root.locator(sel)) for sel in selectors]
+
+def _record_winner(key: str, locs: list, idx: int):
+    # варианты перед победителем промахнулись — записываем промахи и победу
+    for sel, _ in locs[:idx]:
+        selector_cache.miss(key, sel)
+    selector_cache.hit(key, locs[idx][0], probes=idx + 1)
+
+def report_steps(plan: Plan, timings: list[tuple[str, float, bool]]):
+    print(f"\n=== Шаги сценария {plan.name} ===")
+    for name, took, ok in timings:
+        print(f"{name:<18} {took * 1000:8.0f} мс  {'OK' if ok else 'FAIL'}")
+    print(f"{'итого':<18} {sum(t for _, t, _ in timings) * 1000:8.0f} мс")
+    print("=" * (len(plan.name) + 22) + "\n")
+
+# ----------------- исполнение (sync) -----------------
+
+def _nudge_sync(frame, step: Step):
+    # кнопка могла уехать за вьюпорт — прокручиваем и даём UI дорисоваться
+    if step.scroll_px:
+        try:
+            frame.page.mouse.wheel(0, step.scroll_px)
+        except Exception:
+            pass
+    frame.wait_for_timeout(400)
+
+def _click_sync(frame, step: Step, locs: list, key: str) -> bool:
+    if len(locs) == 1 and step.retries == 1:
+        # один селектор — полагаемся на авто-ожидание Playwright
+        target = locs[0][1].first
+        if step.optional and not locs[0][1].count():
+            return False
+        target.scroll_into_view_if_needed()
+        try:
+            target.click(timeout=step.timeout_ms)
+        except Exception:
+            if not step.force:
+                raise
+            target.click(timeout=step.force_timeout_ms, force=True)
+        return True
+    cands = None if step.in_card else dom_probe.candidates([sel for sel, _ in locs])
+    for _ in range(step.retries):
+        if cands is not None:
+            # вся цепочка — одним evaluate, клик сразу по выбранному элементу
+            try:
+                win = dom_probe.probe_click(frame, cands, timeout=step.timeout_ms)
+            except Exception:
+                win = None
+            if win is not None:
+                _record_winner(key, locs, win["src"])
+                return True
+            _nudge_sync(frame, step)
+            continue
+        idx = next((i for i, (_, l) in enumerate(locs) if l.count()), None)
+        if idx is None:
+            frame.wait_for_timeout(500)
+            continue
+        loc = locs[idx][1]
+        try:
+            loc.first.scroll_into_view_if_needed()
+        except Exception:
+            pass
+        try:
+            loc.first.click(timeout=step.timeout_ms)
+            _record_winner(key, locs, idx)
+            return True
+        except Exception:
+            try:
+                loc.first.click(timeout=step.force_timeout_ms, force=True)
+                _record_winner(key, locs, idx)
+                return True
+            except Exception:
+                _nudge_sync(frame, step)
+    if step.optional:
+        return False
+    raise TimeoutError(f"Не удалось нажать: {step.selectors[0]}")
+
+def _run_step_sync(frame, plan: Plan, step: Step):
+    if step.ready:
+        ok = waits.wait_for(frame, step.ready, budget_ms=step.budget_ms, label=f"{plan.name}: {step.name}",
+                            enabled=step.ready_enabled, timeout_ms=step.ready_timeout_ms)
+        if not ok and step.required:
+            raise TimeoutError(f"Не дождался: {step.ready}")
+    locs = _bind(frame, plan, step)
+    if step.fill:
+        inputs = locs[0][1]
+        for i in range(inputs.count()):
+            inputs.nth(i).fill(step.value[min(i, len(step.value) - 1)])
+            frame.wait_for_timeout(100)
+    elif not _click_sync(frame, step, locs, _cache_key(plan, step)):
+        log(f"В WebApp: шаг {step.name} пропущен — элемент не найден (возможно, уже выбран).")
+        return
+    if step.hidden_after_ms is not None:
+        waits.wait_locator(locs[0][1].first, state="hidden", budget_ms=step.hidden_after_ms,
+                           label=f"{plan.name}: {step.name} закрылся", timeout_ms=5000)
+    log(f"В WebApp: {step.message}")
+
+def run_flow(frame, name: str, amount: str | None = None) -> bool:
+    plan = compile_flow(name, amount)
+    timings = []
+    ok = True
+    for step in plan.steps:
+        tracing.phase(f"{plan.name}/{step.name}", "step")
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"{plan.name}/{step.name}", cat="step"):
+                _run_step_sync(frame, plan, step)
+            timings.append((step.name, time.perf_counter() - started, True))
+        except Exception as e:
+            timings.append((step.name, time.perf_counter() - started, False))
+            log(f"В WebApp: сценарий {plan.title} не завершён на шаге {step.name}: {e}")
+            ok = False
+            break
+    report_steps(plan, timings)
+    return ok
+
+# ----------------- исполнение (async) -----------------
+
+async def _nudge_async(frame, step: Step):
+    if step.scroll_px:
+        try:
+            await frame.page.mouse.wheel(0, step.scroll_px)
+        except Exception:
+            pass
+    await frame.wait_for_timeout(400)
+
+async def _click_async(frame, step: Step, locs: list, key: str) -> bool:
+    if len(locs) == 1 and step.retries == 1:
+        target = locs[0][1].first
+        if step.optional and not await locs[0][1].count():
+            return False
+        await target.scroll_into_view_if_needed()
+        try:
+            await target.click(timeout=step.timeout_ms)
+        except Exception:
+            if not step.force:
+                raise
+            await target.click(timeout=step.force_timeout_ms, force=True)
+        return True
+    cands = None if step.in_card else dom_probe.candidates([sel for sel, _ in locs])
+    for _ in range(step.retries):
+        if cands is not None:
+            try:
+                win = await dom_probe.probe_click_async(frame, cands, timeout=step.timeout_ms)
+            except Exception:
+                win = None
+            if win is not None:
+                _record_winner(key, locs, win["src"])
+                return True
+            await _nudge_async(frame, step)
+            continue
+        idx = None
+        for i, (_, l) in enumerate(locs):
+            if await l.count():
+                idx = i
+                break
+        if idx is None:
+            await frame.wait_for_timeout(500)
+            continue
+        loc = locs[idx][1]
+        try:
+            await loc.first.scroll_into_view_if_needed()
+        except Exception:
+            pass
+        try:
+            await loc.first.click(timeout=step.timeout_ms)
+            _record_winner(key, locs, idx)
+            return True
+        except Exception:
+            try:
+                await loc.first.click(timeout=step.force_timeout_ms, force=True)
+                _record_winner(key, locs, idx)
+                return True
+            except Exception:
+                await _nudge_async(frame, step)
+    if step.optional:
+        return False
+    raise TimeoutError(f"Не удалось нажать: {step.selectors[0]}")
+
+async def _run_step_async(frame, plan: Plan, step: Step):
+    if step.ready:
+        ok = await waits.wait_for_async(frame, step.ready, budget_ms=step.budget_ms,
+                                        label=f"{plan.name}: {step.name}", enabled=step.ready_enabled,
+                                        timeout_ms=step.ready_timeout_ms)
+        if not ok and step.required:
+            raise TimeoutError(f"Не дождался: {step.ready}")
+    locs = _bind(frame, plan, step)
+    if step.fill:
+        inputs = locs[0][1]
+        for i in range(await inputs.count()):
+            await inputs.nth(i).fill(step.value[min(i, len(step.value) - 1)])
+            await frame.wait_for_timeout(100)
+    elif not await _click_async(frame, step, locs, _cache_key(plan, step)):
+        log(f"В WebApp: шаг {step.name} пропущен — элемент не найден (возможно, уже выбран).")
+        return
+    if step.hidden_after_ms is not None:
+        await waits.wait_locator_async(locs[0][1].first, state="hidden", budget_ms=step.hidden_after_ms,
+                                       label=f"{plan.name}: {step.name} закрылся", timeout_ms=5000)
+    log(f"В WebApp: {step.message}")
+
+async def run_flow_async(frame, name: str, amount: str | None = None) -> bool:
+    plan = compile_flow(name, amount)
+    timings = []
+    ok = True
+    for step in plan.steps:
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"{plan.name}/{step.name}", cat="step"):
+                await _run_step_async(frame, plan, step)
+            timings.append((step.name, time.perf_counter() - started, True))
+        except Exception as e:
+            timings.append((step.name, time.perf_counter() - started, False))
+            log(f"В WebApp: сценарий {plan.title} не завершён на шаге {step.name}: {e}")
+            ok = False
+            break
+    report_steps(plan, timings)
+    return ok
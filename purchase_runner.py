@@ -0,0 +1,678 @@
+# purchase_runner.py — общий каркас buy_* сценариев: запуск, шаги Telegram, токен, балансы, уборка
+#
+#   purchase_runner.run("diamonds", "diamonds")        # то же, что python buy_diamonds.py
+#   profile, files = purchase_runner.bind_account("acc1")
+#   purchase_runner.scenario("sapphires").run(profile, interactive=False, files=files)
+#
+# buy_*.py задают только план WebApp (purchase_flows.FLOWS) и актив. Всё остальное —
+# здесь и один раз: Chrome / browser_server / снимок входа, быстрый профиль,
+# трассировка, журнал событий, flight recorder, токен, опрос зачисления, история
+# балансов, отчёты и уборка (Session). Шаги Telegram (Play → модалка → iframe →
+# оплата Stars) — в sync- и async-варианте, как движок шагов в purchase_flows:
+# sync — для run() и batch_run.py, async (*_async) — для async_flow.py.
+import atexit, importlib, json, re, time
+from pathlib import Path
+from typing import NamedTuple
+from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+
+import api_client
+import balance_index
+import balance_store
+import browser_server
+import credit_poll
+import debug_capture
+import dom_probe
+import fast_profile
+import flight_recorder
+import purchase_flows
+import selector_cache
+import snapshot
+import storage_state
+import token_cache
+import token_sniffer
+import tracing
+import waits
+
+CONFIG_FILE  = Path(__file__).with_name("config.json")
+ACCOUNTS_DIR = Path(__file__).with_name(".accounts")
+TG_WEB_URL   = "https://web.telegram.org/a/"
+
+# сценарий -> модуль с его планом и активом
+SCENARIOS = {
+    "diamonds":  "buy_diamonds",
+    "emeralds":  "buy_emeralds",
+    "sapphires": "buy_sapphires_for_stars",
+}
+
+def log(msg):
+    print(f"[flow] {msg}", flush=True)
+
+# ----------------- файлы сценария и аккаунты -----------------
+
+class Files(NamedTuple):
+    auth: Path          # токен (token_cache)
+    balances: Path      # последний снимок балансов для следующего прогона
+    raw_balances: Path  # сырой ответ API — для отладки структуры
+
+    @classmethod
+    def under(cls, d: Path) -> "Files":
+        return cls(d / "auth.json", d / "balances.json", d / "balances_api_raw.json")
+
+ROOT_FILES = Files.under(Path(__file__).parent)
+
+def scenario(name: str):
+    # модуль buy_* сценария: PLAN, ASSET, run()
+    return importlib.import_module(SCENARIOS[name])
+
+def account_dir(account: str) -> Path:
+    d = ACCOUNTS_DIR / account
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def bind_account(account: str) -> tuple[str, Files]:
+    # у аккаунта своя папка .accounts/<имя>/: профиль Chrome, auth.json, balances.json;
+    # история balances.db пишется под его именем
+    d = account_dir(account)
+    balance_store.set_account(account)
+    return str(d / "profile"), Files.under(d)
+
+# ----------------- утилиты чтения/записи -----------------
+
+def load_config() -> dict:
+    with CONFIG_FILE.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_balances(path: Path) -> dict | None:
+    try:
+        return snapshot.read_obj(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def save_balances(files: Files, balances: dict, scenario: str):
+    # balances.json — последний снимок для следующего прогона; история — в balances.db
+    balance_store.record(balances, scenario=scenario)
+    try:
+        snapshot.write_obj(files.balances, balances)
+        print(f"[balances] {files.balances.name} обновлён.")
+    except Exception as e:
+        print(f"[balances] Не удалось сохранить {files.balances.name}: {e}")
+
+def save_raw_balances(files: Files, obj):
+    try:
+        snapshot.write_obj(files.raw_balances, obj)
+        print(f"[balances] Сырой ответ сохранён в {files.raw_balances}")
+    except Exception as e:
+        print(f"[balances] Не удалось сохранить {files.raw_balances}: {e}")
+
+# ----------------- Playwright запуск -----------------
+
+_playwright = None
+
+def playwright():
+    # один Playwright на процесс: общий Chrome контекстов из снимков (storage_state)
+    # переживает run() и достаётся следующему сценарию воркера
+    global _playwright
+    if _playwright is None:
+        _playwright = sync_playwright().start()
+        atexit.register(_playwright.stop)
+    return _playwright
+
+def launch_ctx(p, user_data_dir=".pw_telegram", headless=False):
+    # Нужен установленный канал Chrome:  playwright install chrome
+    ctx = p.chromium.launch_persistent_context(
+        user_data_dir=user_data_dir,
+        headless=headless,
+        channel="chrome",
+        args=browser_server.LAUNCH_ARGS,
+        viewport=browser_server.VIEWPORT,
+    )
+    log("✔ Запущен Chrome-канал.")
+    return ctx
+
+# ----------------- шаги Telegram: Play → модалка → iframe → оплата -----------------
+
+PLAY_ANY = 'button:has-text("Play"), a:has-text("Play")'
+AFTER_PLAY = 'div[role="dialog"] button, div[role="dialog"] iframe, iframe[src*="http"]'
+WEBAPP_IFRAME = 'div[role="dialog"] iframe, iframe[src*="http"]'
+
+# варианты кнопки Play; первый — точный селектор инлайн-кнопки бота (берём последнюю)
+PLAY_VARIANTS = [
+    'button.Button.tiny.primary:has(span.inline-button-text:has-text("Play"))',
+    'button:has-text("Play")',
+    'a:has-text("Play")',
+    r'role=button[name=/\bPlay\b/i]',
+]
+
+MODAL_VARIANTS = [
+    'div[role="dialog"] button:has-text("Confirm")',
+    'div[role="dialog"] button:has-text("Open")',
+    'div[role="dialog"] button:has-text("Continue")',
+    'div[role="dialog"] button:has-text("Открыть")',
+    'div[role="dialog"] button:has-text("Продолжить")',
+    'button:has-text("Confirm")',
+    'button:has-text("Open")',
+    'button:has-text("Continue")',
+    'button:has-text("Открыть")',
+    'button:has-text("Продолжить")',
+]
+
+WEBAPP_URL_KEYS = ("tgwebapp", "twa", "zargates", "demo-twa", "zargates.com")
+
+PAY_RE = re.compile(r"(Confirm.*Pay|Оплатить|Подтвердить.*оплат|Оплата|Pay)", re.I)
+# кнопка оплаты ищется одним evaluate на фрейм (dom_probe) вместо count/is_visible/filter
+PAY_CANDIDATES = [{"css": "button, .Button, [role=button]", "text": PAY_RE.pattern}]
+
+def _is_webapp_frame(fr) -> bool:
+    u = fr.url or ""
+    return "http" in u and any(k in u for k in WEBAPP_URL_KEYS)
+
+@tracing.traced("open_tg")
+def open_tg(page, url):
+    page.goto(url, wait_until="domcontentloaded")
+    log(f"Открыл Telegram Web: {page.url}")
+    # ждём, пока в чате отрисуется кнопка Play (раньше — фиксированные 3 с)
+    waits.wait_for(page, PLAY_ANY, budget_ms=3000, label="open_tg: кнопка Play", timeout_ms=10000)
+
+@tracing.traced("click_play", check=bool)
+def click_play(page) -> bool:
+    # победитель прошлого прогона пробуется первым (selector_cache)
+    for i, sel in enumerate(selector_cache.ordered("tg/play", PLAY_VARIANTS), 1):
+        loc = page.locator(sel)
+        target = loc.last if sel == PLAY_VARIANTS[0] else loc.first
+        try:
+            if not loc.count():
+                selector_cache.miss("tg/play", sel)
+                continue
+            target.scroll_into_view_if_needed()
+            target.click(timeout=6000)
+        except Exception:
+            selector_cache.miss("tg/play", sel)
+            continue
+        selector_cache.hit("tg/play", sel, probes=i)
+        # после Play появляется модалка подтверждения или сразу iframe WebApp
+        waits.wait_for(page, AFTER_PLAY, budget_ms=7000, label="click_play: модалка/iframe", timeout_ms=15000)
+        log(f"Нажал Play: {sel}")
+        return True
+    return False
+
+@tracing.traced("confirm_modal")
+def maybe_confirm_modal(page) -> bool:
+    # все варианты проверяются одним evaluate (dom_probe), порядок — из selector_cache
+    order = selector_cache.ordered("tg/modal", MODAL_VARIANTS)
+    try:
+        win = dom_probe.probe_click(page, dom_probe.candidates(order), timeout=4000)
+    except Exception:
+        win = None
+    if win is None:
+        return False
+    sel = order[win["src"]]
+    # варианты перед сработавшим промахнулись — как в purchase_flows._record_winner
+    for missed in order[:win["src"]]:
+        selector_cache.miss("tg/modal", missed)
+    selector_cache.hit("tg/modal", sel, probes=win["src"] + 1)
+    waits.wait_for(page, WEBAPP_IFRAME, state="attached", budget_ms=500, label="modal: iframe WebApp",
+                   timeout_ms=5000)
+    log(f"Нажал подтверждение: {sel}")
+    return True
+
+@tracing.traced("webapp_iframe", check=lambda fr: fr is not None)
+def wait_webapp_iframe(page, timeout_ms=30000):
+    try:
+        page.wait_for_selector(WEBAPP_IFRAME, timeout=timeout_ms)
+    except PWTimeout:
+        return None
+    # iframe уже в DOM — ждём, пока он перейдёт на URL WebApp
+    f = waits.wait_frame(page, WEBAPP_URL_KEYS, budget_ms=0, label="iframe: навигация WebApp", timeout_ms=10000)
+    if f:
+        return f
+    el = page.query_selector('div[role="dialog"] iframe') or page.query_selector('iframe[src*="http"]')
+    return el.content_frame() if el else None
+
+@tracing.traced("confirm_and_pay", check=bool)
+def click_confirm_and_pay(page, timeout_ms=30000) -> bool:
+    log("Жду модалку оплаты и кнопку 'Confirm and Pay'…")
+    deadline = time.time() + timeout_ms / 1000.0
+    # модалка оплаты появляется после Confirm в WebApp (раньше — пауза 600 мс + ожидание).
+    # Ждём саму видимую кнопку оплаты: «любой dialog» совпадал со скрытыми диалогами
+    # Telegram и держал ожидание до таймаута
+    waits.wait_locator(page.get_by_role("button", name=PAY_RE).first, budget_ms=600,
+                       label="pay: модалка оплаты", timeout_ms=10000)
+
+    def _try_click_button_on(target) -> bool:
+        try:
+            if dom_probe.probe_click(target, PAY_CANDIDATES, timeout=2500) is None:
+                return False
+        except Exception:
+            return False
+        # после клика кнопка оплаты пропадает вместе с модалкой
+        waits.wait_locator(target.get_by_role("button", name=PAY_RE).first, state="hidden",
+                           budget_ms=600, label="pay: модалка закрылась", timeout_ms=5000)
+        return True
+
+    while time.time() < deadline:
+        if _try_click_button_on(page):
+            log("✅ Нажал 'Confirm and Pay' (на основной странице).")
+            return True
+        for fr in page.frames:
+            try:
+                if _try_click_button_on(fr):
+                    log("✅ Нажал 'Confirm and Pay' внутри iframe.")
+                    return True
+            except Exception:
+                continue
+        try: page.mouse.wheel(0, 200)
+        except Exception: pass
+        page.wait_for_timeout(400)
+
+    log("⚠ Не нашёл/не нажал кнопку 'Confirm and Pay' в отведённое время.")
+    return False
+
+@tracing.traced("purchase_flow", check=bool)
+def _webapp_flow(frame, plan: str, amount: str | None) -> bool:
+    return purchase_flows.run_flow(frame, plan, amount)
+
+def buy(page, frame, plan: str, amount: str | None = None) -> bool:
+    # шаги WebApp по плану purchase_flows; у плана с "pay" — затем окно оплаты Telegram
+    ok = _webapp_flow(frame, plan, amount)
+    if ok and purchase_flows.FLOWS[plan].get("pay"):
+        ok = click_confirm_and_pay(page, timeout_ms=30000)
+    return ok
+
+# ----------------- токен из WebApp (iframe) и балансы -----------------
+
+def _safe_json_loads(s):
+    try:
+        return json.loads(s)
+    except Exception:
+        return None
+
+def _extract_token_from_obj(obj) -> str | None:
+    if not isinstance(obj, (dict, list, str)):
+        return None
+    if isinstance(obj, str):
+        if obj.strip().startswith("{") or obj.strip().startswith("["):
+            parsed = _safe_json_loads(obj)
+            if parsed is not None:
+                return _extract_token_from_obj(parsed)
+        return None
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            lk = str(k).lower()
+            if lk in ("accesstoken", "access_token", "token", "bearer", "authorization"):
+                if isinstance(v, str) and v:
+                    return v.replace("Bearer ", "").strip()
+        for v in obj.values():
+            t = _extract_token_from_obj(v)
+            if t: return t
+    if isinstance(obj, list):
+        for v in obj:
+            t = _extract_token_from_obj(v)
+            if t: return t
+    return None
+
+STORAGES = ("localStorage", "sessionStorage")
+
+@tracing.traced("token_from_storage", cat="token", check=bool)
+def get_auth_token_from_webapp_frame(app_frame) -> str | None:
+    for storage in STORAGES:
+        try:
+            token = _extract_token_from_obj(app_frame.evaluate(f"() => Object.fromEntries(Object.entries({storage}))"))
+        except Exception:
+            continue
+        if token:
+            print(f"[auth] Токен найден в {storage} iframe.")
+            return token
+    return None
+
+@tracing.traced("balances_api", cat="api", check=lambda r: r[0] is not None)
+def fetch_balances_from_api(auth_token: str) -> tuple[dict | None, int | None]:
+    # общий клиент с keep-alive, пулом соединений и ретраями (api_client.py)
+    return api_client.client().fetch_balances(auth_token)
+
+def compare_and_report(asset: str, old_balances: dict | None, new_balances: dict | None) -> float | None:
+    old_val = balance_index.value(old_balances, asset) if old_balances else None
+    new_val = balance_index.value(new_balances, asset) if new_balances else None
+
+    print(f"\n=== {asset.capitalize()} balance check ===")
+    print(f"old (balances.json): {old_val if old_val is not None else '—'}")
+    print(f"new (API):           {new_val if new_val is not None else '—'}")
+    if old_val is not None and new_val is not None:
+        delta = new_val - old_val
+        print(f"Δ change:            {delta:+.6f}")
+    else:
+        delta = None
+        print("Δ change:            невозможно вычислить (нет старого или нового значения)")
+    day = balance_store.delta_since(asset, time.time() - 86400, current=new_val) if new_val is not None else None
+    if day is not None:
+        print(f"Δ за 24 ч (история): {day:+.6f}")
+    print("==============================\n")
+    return delta
+
+# ----------------- сессия: браузер, наблюдатели и уборка -----------------
+
+class Session:
+    # Браузер сценария и всё, что вешается на его контекст. Выход из with — уборка
+    # в одном месте: кеш селекторов, трасса, история балансов, журнал событий и
+    # flight recorder на диск, если сценарий не прошёл (ok=False).
+    def __init__(self, p, cfg: dict, user_data_dir: str, name: str, files: Files = ROOT_FILES,
+                 launcher=None, interactive: bool = False):
+        self.p = p
+        self.cfg = cfg
+        self.user_data_dir = user_data_dir
+        self.name = name
+        self.files = files
+        self.launcher = launcher or launch_ctx
+        self.interactive = interactive
+        self.tokens = token_cache.for_file(files.auth)
+        self.metrics: dict = {}
+        self.ok = False
+        self.failure = "сценарий не прошёл"
+        # False — вызывающий сам сохраняет окно записи (batch_run — по каждой покупке)
+        self.persist_on_failure = True
+
+    def __enter__(self):
+        cfg = self.cfg
+        fast_cfg = cfg.get("fast_profile") or {}
+        self.fast = bool(fast_cfg.get("enabled"))
+        self.started = time.perf_counter()
+        # "storage_state" — лёгкий контекст из снимка входа вместо persistent-профиля (storage_state.py)
+        self.from_snapshot = bool((cfg.get("storage_state") or {}).get("enabled"))
+        if self.from_snapshot:
+            launch = lambda: storage_state.launch(self.p, self.user_data_dir, cfg, headless=self.fast)
+        else:
+            launch = lambda: self.launcher(self.p, self.user_data_dir, headless=self.fast)
+        # при "cdp_url" в config.json подключаемся к browser_server.py вместо холодного запуска
+        with tracing.span("browser_launch", cat="browser") as sp:
+            self.ctx, self.page, self._release, self.mode = browser_server.open_context(
+                self.p, launch, cdp_url=cfg.get("cdp_url"), fresh=bool(cfg.get("cdp_fresh_context")),
+            )
+            sp.set(mode=self.mode)
+        # быстрый профиль: headless + блокировка медиа/шрифтов/аналитики (fast_profile.py)
+        self.traffic = None
+        if self.fast:
+            self.traffic = fast_profile.apply(self.ctx, fast_cfg)
+        elif cfg.get("measure_traffic"):
+            self.traffic = fast_profile.TrafficStats(self.ctx)
+        # console/pageerror/requestfailed — в кольцевой буфер, на диск только при ошибке
+        self.debug = debug_capture.attach(self.page, cfg.get("debug_capture"), name=self.name)
+        # скользящий Playwright trace + HAR, сохраняются только при ошибке
+        self.recorder = flight_recorder.start(self.ctx, cfg.get("flight_recorder"), name=self.name)
+        self.api_idle = waits.ApiIdleTracker(self.page)
+        # токен ловим из первого запроса WebApp к API — сразу, как приложение авторизовалось
+        self.sniffer = token_sniffer.TokenSniffer(self.ctx)
+        self.sniffer.on_token(self.tokens.put)
+        return self
+
+    def __exit__(self, *exc):
+        selector_cache.save()
+        tracing.flush()
+        balance_store.flush()
+        if not self.ok:
+            self.debug.dump(self.failure)
+            if self.persist_on_failure:
+                self.recorder.persist(self.failure)
+        self.debug.close()
+        self.recorder.close()
+        if self.interactive:
+            input("Нажми Enter, чтобы закрыть браузер…")
+        self._release()
+        return False
+
+    def open_webapp(self, tg_web_url: str):
+        # полный путь Telegram → WebApp; возвращает фрейм или None
+        open_tg(self.page, tg_web_url)
+        self.metrics.setdefault("page_load_ms", fast_profile.page_load_ms(self.page))
+        clicked = click_play(self.page)
+        if "startup_to_first_click" not in self.metrics:
+            self.metrics["startup_to_first_click"] = browser_server.report_first_click(self.started, self.mode)
+        if not clicked:
+            log("Не удалось найти/нажать Play в чате. Проверь, что ты в чате с ботом и есть кнопка.")
+        maybe_confirm_modal(self.page)
+        return wait_webapp_iframe(self.page, timeout_ms=30000)
+
+    def token(self, frame) -> str | None:
+        # сеть (TokenSniffer) → auth.json с проверкой exp → storage фрейма → любой фрейм WebApp
+        with tracing.span("token", cat="token") as sp:
+            token = self.sniffer.wait(self.page, timeout_ms=3000 if frame else 0)
+            source = "network" if token else "auth.json"
+            token = token or self.tokens.get()
+            sp.set(ok=bool(token), source=source)
+        frames = [frame] if frame else []
+        frames += [fr for fr in self.page.frames if fr is not frame and _is_webapp_frame(fr)]
+        for fr in frames if not token else ():
+            token = get_auth_token_from_webapp_frame(fr)
+            if token:
+                self.tokens.put(token)
+                break
+        return token
+
+    def fetch_balances(self, token: str | None, frame) -> tuple[dict | None, int | None, str | None]:
+        # -> (балансы, код, токен); на 401 — один повтор со свежим токеном
+        balances, code = fetch_balances_from_api(token)
+        if code == 401:
+            print("[balances] 401 Unauthorized — беру свежий токен и повторяю запрос.")
+            self.tokens.invalidate(token)
+            t2 = self.sniffer.token if self.sniffer.token != token else None
+            if not t2 and frame:
+                t2 = get_auth_token_from_webapp_frame(frame)
+            if t2 and t2 != token:
+                self.tokens.put(t2)
+                token = t2
+                balances, code = fetch_balances_from_api(token)
+        return balances, code, token
+
+    def report(self) -> dict:
+        waits.report_savings()
+        selector_cache.report()
+        api_client.client().report()
+        token_cache.report()
+        debug_capture.report()
+        balance_store.report()
+        if not self.traffic:
+            return {}
+        self.traffic.report("Трафик (быстрый профиль)" if self.fast else "Трафик")
+        return {"traffic_kb": round(self.traffic.bytes / 1024)}
+
+# ----------------- основной сценарий -----------------
+
+def run(plan: str, asset: str, user_data_dir=".pw_telegram", interactive=True, files: Files = ROOT_FILES,
+        cfg: dict | None = None, launcher=None) -> dict:
+    # plan — сценарий WebApp из purchase_flows.FLOWS, asset — актив для сверки балансов
+    cfg = load_config() if cfg is None else cfg
+    result = {"scenario": plan, "ok": False, "delta": None}
+    tracing.configure(cfg.get("trace"))
+    balance_store.configure(cfg.get("balance_store"))
+    tracing.set_lane(plan)
+    tg_web_url = cfg.get("tg_web_url") or TG_WEB_URL
+
+    with Session(playwright(), cfg, user_data_dir, plan, files, launcher, interactive) as s:
+        # 1–3) Play → модалка → iframe WebApp
+        frame = s.open_webapp(tg_web_url)
+        if frame:
+            log(f"✅ WebApp iframe найден. URL: {frame.url}")
+            # WebApp догружает балансы — ждём, пока его запросы к API затихнут
+            s.api_idle.wait_idle(budget_ms=0, label="WebApp: запросы к API", timeout_ms=10000)
+            # 4) внутри WebApp — шаги покупки по плану
+            result["ok"] = s.ok = buy(s.page, frame, plan)
+            flow_done = time.perf_counter()
+        else:
+            log("⚠ WebApp iframe не нашёлся/не загрузился.")
+
+        # 5) балансы: запрос и сравнение (всегда, даже если покупка не прошла)
+        token = s.token(frame)
+        new_balances, code, token = s.fetch_balances(token, frame)
+        old_balances = load_balances(files.balances)
+
+        # зачисление может прийти не сразу — опрашиваем до ожидаемого изменения
+        if result["ok"] and new_balances:
+            poll_cfg = cfg.get("credit_poll") or {}
+            expected = (poll_cfg.get("expected_delta") or {}).get(asset)
+            extract = lambda obj: balance_index.value(obj, asset)
+            credit = credit_poll.wait_for_credit(
+                lambda: fetch_balances_from_api(token), extract,
+                extract(old_balances) if old_balances else None, new_balances,
+                flow_done=flow_done, expected=expected, cfg=poll_cfg,
+            )
+            new_balances = credit["balances"]
+            result["time_to_credit_ms"] = credit["time_to_credit_ms"]
+            balance_store.record_credit(asset, credit, expected)
+
+        if new_balances:
+            save_raw_balances(files, new_balances)
+        result["delta"] = compare_and_report(asset, old_balances, new_balances)
+        if new_balances:
+            save_balances(files, new_balances, scenario=plan)
+        if s.from_snapshot and s.mode == "cold" and result["ok"]:
+            # сессия прошла — обновляем снимок из контекста, профиль не трогаем
+            storage_state.save(s.ctx, storage_state.state_path(user_data_dir))
+
+        result.update(s.metrics)
+        result.update(s.report())
+    return result
+
+# ----------------- шаги Telegram (async) для async_flow.py -----------------
+
+@tracing.traced("open_tg")
+async def open_tg_async(page, url):
+    await page.goto(url, wait_until="domcontentloaded")
+    log(f"Открыл Telegram Web: {page.url}")
+    await waits.wait_for_async(page, PLAY_ANY, budget_ms=3000, label="open_tg: кнопка Play", timeout_ms=10000)
+
+@tracing.traced("click_play", check=bool)
+async def click_play_async(page) -> bool:
+    for i, sel in enumerate(selector_cache.ordered("tg/play", PLAY_VARIANTS), 1):
+        loc = page.locator(sel)
+        target = loc.last if sel == PLAY_VARIANTS[0] else loc.first
+        try:
+            if not await loc.count():
+                selector_cache.miss("tg/play", sel)
+                continue
+            await target.scroll_into_view_if_needed()
+            await target.click(timeout=6000)
+        except Exception:
+            selector_cache.miss("tg/play", sel)
+            continue
+        selector_cache.hit("tg/play", sel, probes=i)
+        await waits.wait_for_async(page, AFTER_PLAY, budget_ms=7000, label="click_play: модалка/iframe",
+                                   timeout_ms=15000)
+        log(f"Нажал Play: {sel}")
+        return True
+    return False
+
+@tracing.traced("confirm_modal")
+async def maybe_confirm_modal_async(page) -> bool:
+    order = selector_cache.ordered("tg/modal", MODAL_VARIANTS)
+    try:
+        win = await dom_probe.probe_click_async(page, dom_probe.candidates(order), timeout=4000)
+    except Exception:
+        win = None
+    if win is None:
+        return False
+    sel = order[win["src"]]
+    for missed in order[:win["src"]]:
+        selector_cache.miss("tg/modal", missed)
+    selector_cache.hit("tg/modal", sel, probes=win["src"] + 1)
+    await waits.wait_for_async(page, WEBAPP_IFRAME, state="attached", budget_ms=500,
+                               label="modal: iframe WebApp", timeout_ms=5000)
+    log(f"Нажал подтверждение: {sel}")
+    return True
+
+@tracing.traced("webapp_iframe", check=lambda fr: fr is not None)
+async def wait_webapp_iframe_async(page, timeout_ms=30000):
+    try:
+        await page.wait_for_selector(WEBAPP_IFRAME, timeout=timeout_ms)
+    except PWTimeout:
+        return None
+    for f in page.frames:
+        if _is_webapp_frame(f):
+            return f
+    try:
+        return await page.wait_for_event("framenavigated", predicate=_is_webapp_frame, timeout=10000)
+    except PWTimeout:
+        pass
+    el = await page.query_selector('div[role="dialog"] iframe') or await page.query_selector('iframe[src*="http"]')
+    return await el.content_frame() if el else None
+
+@tracing.traced("confirm_and_pay", check=bool)
+async def click_confirm_and_pay_async(page, timeout_ms=30000) -> bool:
+    log("Жду модалку оплаты и кнопку 'Confirm and Pay'…")
+    deadline = time.time() + timeout_ms / 1000.0
+    await waits.wait_locator_async(page.get_by_role("button", name=PAY_RE).first, budget_ms=600,
+                                   label="pay: модалка оплаты", timeout_ms=10000)
+
+    async def _try_click_button_on(target) -> bool:
+        try:
+            if await dom_probe.probe_click_async(target, PAY_CANDIDATES, timeout=2500) is None:
+                return False
+        except Exception:
+            return False
+        await waits.wait_locator_async(target.get_by_role("button", name=PAY_RE).first, state="hidden",
+                                       budget_ms=600, label="pay: модалка закрылась", timeout_ms=5000)
+        return True
+
+    while time.time() < deadline:
+        if await _try_click_button_on(page):
+            log("✅ Нажал 'Confirm and Pay' (на основной странице).")
+            return True
+        for fr in page.frames:
+            if await _try_click_button_on(fr):
+                log("✅ Нажал 'Confirm and Pay' внутри iframe.")
+                return True
+        try:
+            await page.mouse.wheel(0, 200)
+        except Exception:
+            pass
+        await page.wait_for_timeout(400)
+
+    log("⚠ Не нашёл/не нажал кнопку 'Confirm and Pay' в отведённое время.")
+    return False
+
+@tracing.traced("purchase_flow", check=bool)
+async def _webapp_flow_async(frame, plan: str, amount: str | None) -> bool:
+    return await purchase_flows.run_flow_async(frame, plan, amount)
+
+async def buy_async(page, frame, plan: str, amount: str | None = None) -> bool:
+    ok = await _webapp_flow_async(frame, plan, amount)
+    if ok and purchase_flows.FLOWS[plan].get("pay"):
+        ok = await click_confirm_and_pay_async(page, timeout_ms=30000)
+    return ok
+
+@tracing.traced("token_from_storage", cat="token", check=bool)
+async def get_auth_token_from_webapp_frame_async(app_frame) -> str | None:
+    for storage in STORAGES:
+        try:
+            token = _extract_token_from_obj(
+                await app_frame.evaluate(f"() => Object.fromEntries(Object.entries({storage}))"))
+        except Exception:
+            continue
+        if token:
+            return token
+    return None
+
+# ----------------- сводка многих прогонов (parallel_runner, async_flow) -----------------
+
+def credit_stats(results: list[dict]) -> dict:
+    # time-to-credit по успешным покупкам: от конца сценария до зачисления в API
+    ttc = sorted(r["time_to_credit_ms"] for r in results if r.get("time_to_credit_ms") is not None)
+    pct = lambda q: ttc[min(len(ttc) - 1, round(q * (len(ttc) - 1)))] if ttc else None
+    return {
+        "credited": len(ttc),
+        "time_to_credit_p50_ms": pct(0.50),
+        "time_to_credit_p95_ms": pct(0.95),
+        "time_to_credit_max_ms": ttc[-1] if ttc else None,
+    }
+
+def print_summary(summary: dict):
+    print("\n=== Параллельный прогон ===")
+    print(f"воркеров:          {summary['workers']}")
+    print(f"сценариев:         {summary['jobs']} (успешно {summary['purchases_ok']}, "
+          f"ошибок {summary['purchases_failed']})")
+    print(f"время:             {summary['wall_seconds']:.1f} с")
+    print(f"покупок в минуту:  {summary['purchases_per_minute']:.2f}")
+    if summary.get("credited"):
+        print(f"time-to-credit:    p50 {summary['time_to_credit_p50_ms']} мс, "
+              f"p95 {summary['time_to_credit_p95_ms']} мс, max {summary['time_to_credit_max_ms']} мс "
+              f"({summary['credited']} зачислений)")
+    if summary.get("batch"):
+        print(f"история:           python balance_store.py batch {summary['batch']}")
+    print("===========================\n")
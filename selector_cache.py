@@ -0,0 +1,107 @@
+# selector_cache.py — запоминаем, какой вариант из цепочки селекторов сработал
+#
+# Ключ — "страница/шаг" (например "tg/play", "diamonds/buy"). Победитель прошлого
+# прогона пробуется первым и остаётся им, пока не промахнётся EVICT_AFTER раз подряд;
+# тогда запись удаляется и победителем становится следующий сработавший вариант.
+# save() сливает изменения процесса с файлом на диске под файловой блокировкой —
+# воркеры parallel_runner не затирают победителей друг друга.
+import json
+from pathlib import Path
+
+import filelock
+import snapshot
+
+CACHE_FILE = Path(__file__).with_name("selector_cache.json")
+EVICT_AFTER = 3
+
+_cache: dict | None = None
+# ключи, изменённые этим процессом: ключ -> вытесненный победитель (None — запись обновлена)
+_changed: dict[str, str | None] = {}
+# статистика текущего процесса: ключ -> {"hits", "misses", "probes", "evicted"}
+_stats: dict[str, dict[str, int]] = {}
+
+def _read_file() -> dict:
+    try:
+        return json.loads(CACHE_FILE.read_text(encoding="utf-8")) or {}
+    except Exception:
+        return {}
+
+def _load() -> dict:
+    global _cache
+    if _cache is None:
+        _cache = _read_file()
+    return _cache
+
+def _stat(key: str) -> dict:
+    return _stats.setdefault(key, {"hits": 0, "misses": 0, "probes": 0, "evicted": 0})
+
+def ordered(key: str, variants):
+    # победитель — первым, остальные в исходном порядке
+    winner = _load().get(key, {}).get("winner")
+    if winner in variants:
+        return [winner] + [v for v in variants if v != winner]
+    return list(variants)
+
+def hit(key: str, variant: str, probes: int):
+    # variant сработал после probes проб (1 — с первой попытки); перед этим вызывающий
+    # отмечает miss() каждому варианту, который пробовал раньше
+    entry = _load().setdefault(key, {})
+    winner = entry.get("winner")
+    st = _stat(key)
+    st["probes"] += probes
+    if winner == variant and probes == 1:
+        st["hits"] += 1
+    else:
+        st["misses"] += 1
+    if winner is None:
+        entry["winner"] = variant
+        entry["misses"] = 0
+        _changed[key] = None
+    elif winner == variant and entry.get("misses"):
+        # серия промахов прервалась
+        entry["misses"] = 0
+        _changed[key] = None
+    # сработал другой вариант, а победитель ещё не вытеснен — его промах уже учтён miss()
+
+def miss(key: str, variant: str):
+    # промах победителя; после EVICT_AFTER подряд — забываем его
+    entry = _load().get(key)
+    if not entry or entry.get("winner") != variant:
+        return
+    entry["misses"] = entry.get("misses", 0) + 1
+    if entry["misses"] >= EVICT_AFTER:
+        del _load()[key]
+        _stat(key)["evicted"] += 1
+        _changed[key] = variant
+    else:
+        _changed[key] = None
+
+def save():
+    # свежий файл + свои изменения: чужие ключи остаются, вытесненная запись удаляется,
+    # только если другой процесс не успел записать туда нового победителя
+    if not _changed:
+        return
+    try:
+        with filelock.FileLock(CACHE_FILE.with_name(CACHE_FILE.name + ".lock")):
+            merged = _read_file()
+            for key, evicted in _changed.items():
+                entry = _load().get(key)
+                if entry is not None:
+                    merged[key] = entry
+                elif merged.get(key, {}).get("winner") == evicted:
+                    del merged[key]
+            snapshot.write_obj(CACHE_FILE, merged)
+        _load().clear()
+        _load().update(merged)
+        _changed.clear()
+    except Exception as e:
+        print(f"[selectors] Не удалось сохранить {CACHE_FILE.name}: {e}")
+
+def report():
+    if not _stats:
+        return
+    print("\n=== Кеш селекторов ===")
+    for key, st in sorted(_stats.items()):
+        total = st["hits"] + st["misses"]
+        print(f"{key:<24} попаданий {st['hits']}/{total}, проб {st['probes']}, вытеснено {st['evicted']}")
+    print("======================\n")
@@ -0,0 +1,81 @@
+# snapshot.py — снимки инвентаря/балансов: JSONL (опционально .gz), атомарная запись
+#
+#   snapshot.write("inventory.jsonl.gz", inventory.iter_inventory(token))  # поток записей
+#   snapshot.write_obj("balances.json", balances)                          # один объект
+#   for item in snapshot.iter_records("inventory.jsonl.gz"): ...           # ленивое чтение
+#
+# Запись идёт во временный файл рядом, сбрасывается на диск (fsync) и подменяет
+# старый через os.replace — падение посреди записи или сразу после неё оставляет
+# прежний снимок целым. Права — как у прежнего файла (mkstemp создаёт 0600), для
+# нового — 0644. Сжатие — по суффиксу .gz.
+# Снимок из одного объекта — это одна строка компактного JSON, т.е. обычный
+# .json-файл: json.load и старые читатели его понимают.
+import gzip, json, os, stat, tempfile
+from pathlib import Path
+
+GZIP_LEVEL = 5  # выше почти не выигрывает по размеру, а пишет заметно дольше
+NEW_FILE_MODE = 0o644
+
+def _open(path: Path, mode: str, gz: bool):
+    if gz:
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=GZIP_LEVEL)
+    return open(path, mode, encoding="utf-8")
+
+def _mode(path: Path) -> int:
+    try:
+        return stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        return NEW_FILE_MODE
+
+def write(path, records) -> int:
+    # записи — любой итерируемый источник (генератор страниц в т.ч.); возвращает их число
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent or ".")
+    tmp = Path(tmp)
+    count = 0
+    try:
+        with open(fd, "wb") as raw:
+            # сжатие по имени целевого файла, а не временного; GzipFile поверх raw при
+            # close() дописывает хвост gzip, но сам raw не закрывает — его ещё fsync
+            out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL) \
+                if path.suffix == ".gz" else raw
+            for rec in records:
+                out.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+                out.write(b"\n")
+                count += 1
+            if out is not raw:
+                out.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.chmod(tmp, _mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return count
+
+def write_obj(path, obj):
+    write(path, [obj])
+
+def iter_records(path):
+    # по строке за раз; битая хвостовая строка (снимок не из write) пропускается
+    path = Path(path)
+    with _open(path, "r", path.suffix == ".gz") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return
+
+def read_obj(path):
+    # первый объект снимка; понимает и старые многострочные .json с indent=2
+    path = Path(path)
+    with _open(path, "r", path.suffix == ".gz") as f:
+        first = f.readline()
+        try:
+            return json.loads(first)
+        except json.JSONDecodeError:
+            return json.loads(first + f.read())
@@ -1,10 +1,18 @@
 import json
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from playwright.sync_api import sync_playwright
 
+import api_client
+import async_api
+import inventory
+import snapshot
+import token_cache
+
 # === Константы ===
 TMA_URL = "https://twa-rd.zargates.com/#tgWebAppData=user%3D%257B%2522id%2522%253A402312903%252C%2522first_name%2522%253A%2522Roman%2522%252C%2522last_name%2522%253A%2522Kos%2522%252C%2522username%2522%253A%2522RomanKos%2522%252C%2522language_code%2522%253A%2522en%2522%252C%2522allows_write_to_pm%2522%253Atrue%252C%2522photo_url%2522%253A%2522https%253A%255C%252F%255C%252Ft.me%255C%252Fi%255C%252Fuserpic%255C%252F320%255C%252F9lMrMkO8Q6MmXxm8EuGUIzego5uUPNreBgqH3zsnJtY.svg%2522%257D%26chat_instance%3D7225054925153986100%26chat_type%3Dsender%26auth_date%3D1755763054%26signature%3DNwJdRDjYAgfAjLD7W3Ybex5nMsChiKs0Ui8A6i1SEVnC0P1iCHjmAaizGsVXDRwsWlaXVKywxnL6X9ivBnaQAA%26hash%3D1a193a7aca7bf647ad2c875db700f8abb863d5da1533b410a0b7c79698f61fb8&tgWebAppVersion=9.1&tgWebAppPlatform=weba&tgWebAppThemeParams=%7B%22bg_color%22%3A%22%23212121%22%2C%22text_color%22%3A%22%23ffffff%22%2C%22hint_color%22%3A%22%23aaaaaa%22%2C%22link_color%22%3A%22%238774e1%22%2C%22button_color%22%3A%22%238774e1%22%2C%22button_text_color%22%3A%22%23ffffff%22%2C%22secondary_bg_color%22%3A%22%230f0f0f%22%2C%22header_bg_color%22%3A%22%23212121%22%2C%22accent_text_color%22%3A%22%238774e1%22%2C%22section_bg_color%22%3A%22%23212121%22%2C%22section_header_text_color%22%3A%22%23aaaaaa%22%2C%22subtitle_text_color%22%3A%22%23aaaaaa%22%2C%22destructive_text_color%22%3A%22%23e53935%22%7D"
 
+INVENTORY_FILE = "inventory.jsonl.gz"  # читается лениво: snapshot.iter_records
+
 # === Утилиты ===
 def get_auth_token_from_page(page):
     local_storage = page.evaluate("() => window.localStorage")
@@ -21,39 +29,16 @@ def get_auth_token_from_page(page):
 
 
 def get_user_balances(auth_token):
-    url = "https://demo-api-rd.zargates.com/api/v1/balances"
-    headers = {"accept": "application/json", "authorization": f"Bearer {auth_token}"}
-    r = requests.get(url, headers=headers)
-    r.raise_for_status()
-    return r.json()
+    return api_client.client().get_balances(auth_token)
 
 
 def get_user_inventory(auth_token):
-    url = (
-        "https://demo-api-rd.zargates.com/api/v1/offer-manager/user/inventory"
-        "?page=1&limit=999&filter=ALL&rarity_filter=ALL&tradeable=false&for_trade=false"
-    )
-    headers = {"accept": "application/json", "authorization": f"Bearer {auth_token}"}
-    r = requests.get(url, headers=headers)
-    r.raise_for_status()
-    data = r.json()
-
-    # Вытаскиваем именно массив предметов
-    if isinstance(data, dict):
-        if "data" in data and isinstance(data["data"], list):
-            return data["data"]
-        if "items" in data and isinstance(data["items"], list):
-            return data["items"]
-        if "inventory" in data and isinstance(data["inventory"], list):
-            return data["inventory"]
-    elif isinstance(data, list):
-        return data
-    return []
+    # все страницы, а не только первые 999 предметов
+    return list(inventory.iter_inventory(auth_token))
 
 
 def save_json(filename, data):
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    snapshot.write_obj(filename, data)
     print(f"💾 {filename} сохранён")
 
 
@@ -70,16 +55,18 @@ def test_tma_and_api():
         assert auth_token, "❌ Не удалось получить токен авторизации из браузера"
 
         # сохраняем токен
-        save_json("auth.json", {"auth_token": auth_token})
-
-        # получаем и сохраняем балансы
-        balances = get_user_balances(auth_token)
-        save_json("balances.json", balances)
-
-        # получаем и сохраняем только массив предметов
-        inventory = get_user_inventory(auth_token)
-        save_json("inventory.json", inventory)
-        print(f"📦 Найдено {len(inventory)} предметов")
+        token_cache.for_file("auth.json").put(auth_token)
+
+        # балансы запрашиваем в фоне, пока инвентарь постранично пишется на диск
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            balances_fut = pool.submit(async_api.fetch_many_sync, [auth_token], ["balances"])
+            count = snapshot.write(INVENTORY_FILE, inventory.iter_inventory(auth_token))
+            res = balances_fut.result()[auth_token]["balances"]
+
+        print(f"💾 {INVENTORY_FILE} сохранён")
+        assert res["ok"], f"❌ Ошибка запроса balances: {res['error']}"
+        save_json("balances.json", res["data"])
+        print(f"📦 Найдено {count} предметов")
 
         input("Нажми Enter, чтобы закрыть браузер...")
         browser.close()
@@ -0,0 +1,217 @@
+# storage_state.py — снимок входа (cookies + localStorage + IndexedDB) вместо тяжёлого профиля
+#
+# Один раз из залогиненного профиля экспортируется storage_state, дальше каждый
+# сценарий получает лёгкий непостоянный контекст из снимка за миллисекунды, и
+# несколько контекстов одного аккаунта могут работать параллельно. Chrome для
+# таких контекстов один на процесс (shared_browser) — сценарии его не перезапускают.
+#
+# Включается в config.json:
+#   "storage_state": {"enabled": true, "max_age_h": 12}
+# Снимок лежит рядом с профилем: .pw_telegram -> .pw_telegram.state.json.
+# Старше max_age_h — переэкспортируется из профиля (всегда headless; если профиль
+# не залогинен, ensure() падает с подсказкой, а не открывает окно); после удачного
+# прогона снимок обновляется из самого контекста (Telegram ротирует ключи в storage).
+#
+#   python storage_state.py --export            # экспорт вручную
+#   python storage_state.py --compare --runs 5  # профиль против снимка: время и память
+import argparse, json, statistics, time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import snapshot
+from browser_server import LAUNCH_ARGS, VIEWPORT
+
+CONFIG_FILE = Path(__file__).with_name("config.json")
+DEFAULT_MAX_AGE_H = 12
+EXPORT_HINT = "проверь, что профиль залогинен в Telegram Web, и повтори: python storage_state.py --export"
+# признак того, что Telegram Web A открылся залогиненным (список чатов)
+LOGGED_IN = "#LeftColumn, .chat-list"
+
+def log(msg):
+    print(f"[state] {msg}", flush=True)
+
+def state_path(user_data_dir) -> Path:
+    d = Path(user_data_dir)
+    return d.with_name(d.name + ".state.json")
+
+def is_stale(path: Path, max_age_h: float = DEFAULT_MAX_AGE_H) -> bool:
+    try:
+        return time.time() - path.stat().st_mtime > max_age_h * 3600
+    except FileNotFoundError:
+        return True
+
+def _webapp_origin(cfg: dict) -> str | None:
+    parts = urlsplit(cfg.get("tma_url") or "")
+    return f"{parts.scheme}://{parts.netloc}/" if parts.netloc else None
+
+def save(ctx, path: Path):
+    # атомарно и через свой временный файл (snapshot.write_obj): снимок одного
+    # аккаунта читают и обновляют параллельные воркеры
+    snapshot.write_obj(path, ctx.storage_state(indexed_db=True))
+
+async def save_async(ctx, path: Path):
+    snapshot.write_obj(path, await ctx.storage_state(indexed_db=True))
+
+# ----------------- экспорт из профиля -----------------
+
+def export(p, user_data_dir, cfg: dict, headless: bool = True) -> Path:
+    path = state_path(user_data_dir)
+    started = time.perf_counter()
+    ctx = p.chromium.launch_persistent_context(
+        user_data_dir=str(user_data_dir), headless=headless, channel="chrome",
+        args=LAUNCH_ARGS, viewport=VIEWPORT,
+    )
+    try:
+        page = ctx.new_page()
+        page.goto(cfg.get("tg_web_url") or "https://web.telegram.org/a/", wait_until="domcontentloaded")
+        page.wait_for_selector(LOGGED_IN, timeout=30000)
+        # origin WebApp — чтобы его localStorage тоже попал в снимок
+        origin = _webapp_origin(cfg)
+        if origin:
+            page.goto(origin, wait_until="commit")
+        save(ctx, path)
+    finally:
+        ctx.close()
+    log(f"Снимок {path.name} экспортирован из {user_data_dir} за {time.perf_counter() - started:.1f} с.")
+    return path
+
+async def export_async(p, user_data_dir, cfg: dict, headless: bool = True) -> Path:
+    path = state_path(user_data_dir)
+    started = time.perf_counter()
+    ctx = await p.chromium.launch_persistent_context(
+        user_data_dir=str(user_data_dir), headless=headless, channel="chrome",
+        args=LAUNCH_ARGS, viewport=VIEWPORT,
+    )
+    try:
+        page = await ctx.new_page()
+        await page.goto(cfg.get("tg_web_url") or "https://web.telegram.org/a/", wait_until="domcontentloaded")
+        await page.wait_for_selector(LOGGED_IN, timeout=30000)
+        origin = _webapp_origin(cfg)
+        if origin:
+            await page.goto(origin, wait_until="commit")
+        await save_async(ctx, path)
+    finally:
+        await ctx.close()
+    log(f"Снимок {path.name} экспортирован из {user_data_dir} за {time.perf_counter() - started:.1f} с.")
+    return path
+
+# ----------------- контексты из снимка -----------------
+
+def _needs_export(user_data_dir, cfg: dict) -> Path | None:
+    path = state_path(user_data_dir)
+    max_age_h = (cfg.get("storage_state") or {}).get("max_age_h", DEFAULT_MAX_AGE_H)
+    if not is_stale(path, max_age_h):
+        return None
+    log(f"Снимок {path.name} отсутствует или устарел — экспортирую из профиля (headless).")
+    return path
+
+def ensure(p, user_data_dir, cfg: dict) -> Path:
+    path = _needs_export(user_data_dir, cfg)
+    if path is None:
+        return state_path(user_data_dir)
+    try:
+        return export(p, user_data_dir, cfg)
+    except Exception as e:
+        raise RuntimeError(f"Снимок {path.name} не экспортирован из {user_data_dir}: {e}; {EXPORT_HINT}") from e
+
+async def ensure_async(p, user_data_dir, cfg: dict) -> Path:
+    path = _needs_export(user_data_dir, cfg)
+    if path is None:
+        return state_path(user_data_dir)
+    try:
+        return await export_async(p, user_data_dir, cfg)
+    except Exception as e:
+        raise RuntimeError(f"Снимок {path.name} не экспортирован из {user_data_dir}: {e}; {EXPORT_HINT}") from e
+
+# Chrome на процесс: экземпляр Playwright + режим -> браузер
+_browsers: dict[tuple[int, bool], object] = {}
+
+def shared_browser(p, headless: bool):
+    key = (id(p), headless)
+    browser = _browsers.get(key)
+    if browser is None or not browser.is_connected():
+        browser = p.chromium.launch(headless=headless, channel="chrome", args=LAUNCH_ARGS)
+        _browsers[key] = browser
+        log("✔ Запущен общий Chrome для контекстов из снимков.")
+    return browser
+
+def launch(p, user_data_dir, cfg: dict, headless: bool = False):
+    # замена launch_ctx: новый контекст из снимка в общем Chrome процесса; возвращает ctx.
+    # Вызывающий закрывает только ctx — Chrome остаётся для следующего сценария
+    path = ensure(p, user_data_dir, cfg)
+    browser = shared_browser(p, headless)
+    started = time.perf_counter()
+    ctx = browser.new_context(storage_state=path, viewport=VIEWPORT)
+    log(f"✔ Контекст из снимка {path.name} за {(time.perf_counter() - started) * 1000:.0f} мс.")
+    return ctx
+
+# ----------------- сравнение: профиль против снимка -----------------
+
+def _chrome_rss_mb() -> float | None:
+    # память всех процессов Chrome под нашим процессом; psutil необязателен
+    try:
+        import psutil
+    except ImportError:
+        return None
+    total = 0
+    for proc in psutil.Process().children(recursive=True):
+        try:
+            if "chrom" in proc.name().lower():
+                total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 2**20
+
+def compare(user_data_dir, cfg: dict, runs: int = 5):
+    from playwright.sync_api import sync_playwright
+
+    rows = {"профиль": [], "снимок": []}
+    mem = {}
+    with sync_playwright() as p:
+        path = ensure(p, user_data_dir, cfg)
+        for _ in range(runs):
+            started = time.perf_counter()
+            ctx = p.chromium.launch_persistent_context(
+                user_data_dir=str(user_data_dir), headless=True, channel="chrome",
+                args=LAUNCH_ARGS, viewport=VIEWPORT,
+            )
+            rows["профиль"].append((time.perf_counter() - started) * 1000)
+            mem["профиль"] = _chrome_rss_mb()
+            ctx.close()
+
+        # браузер запускается один раз (как browser_server / async_flow), контексты — из снимка
+        browser = p.chromium.launch(headless=True, channel="chrome", args=LAUNCH_ARGS)
+        for _ in range(runs):
+            started = time.perf_counter()
+            ctx = browser.new_context(storage_state=path, viewport=VIEWPORT)
+            rows["снимок"].append((time.perf_counter() - started) * 1000)
+            mem["снимок"] = _chrome_rss_mb()
+            ctx.close()
+        browser.close()
+
+    print(f"\n=== Старт контекста: профиль против снимка ({runs} раз, медиана) ===")
+    print(f"{'режим':<10} {'создание, мс':>13} {'Chrome RSS, МБ':>15}")
+    for name, times in rows.items():
+        m = mem.get(name)
+        mem_s = f"{m:15.0f}" if m is not None else f"{'—':>15}"
+        print(f"{name:<10} {statistics.median(times):13.0f} {mem_s}")
+    print(f"размер снимка: {path.stat().st_size / 1024:.0f} КБ\n")
+
+def main():
+    ap = argparse.ArgumentParser(description="Снимок storage_state из профиля Telegram")
+    ap.add_argument("--profile", default=".pw_telegram")
+    ap.add_argument("--export", action="store_true", help="экспортировать снимок сейчас")
+    ap.add_argument("--compare", action="store_true", help="сравнить старт из профиля и из снимка")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    cfg = json.loads(CONFIG_FILE.read_text(encoding="utf-8"))
+
+    if args.export:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            export(p, args.profile, cfg)
+    if args.compare:
+        compare(args.profile, cfg, args.runs)
+
+if __name__ == "__main__":
+    main()
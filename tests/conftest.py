@@ -0,0 +1,5 @@
+# conftest.py — модули репозитория лежат в корне, тесты импортируют их напрямую
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,82 @@
+# test_api_client.py — ретраи, экспоненциальная задержка и Retry-After против mock_api
+import pytest
+import requests
+
+import api_client, mock_api
+from mock_api import Faults, MockState
+
+@pytest.fixture
+def api(monkeypatch):
+    # mock_api в фоновом потоке + общий клиент на него; паузы не спят, а копятся в sleeps
+    servers = []
+    sleeps = []
+    monkeypatch.setattr(api_client, "_client", None)
+    monkeypatch.setattr(api_client.time, "sleep", sleeps.append)
+    monkeypatch.setattr(api_client.random, "uniform", lambda lo, hi: hi)  # без джиттера
+
+    def start(faults: Faults, **client_kw):
+        state = MockState(inventory_size=10, faults=faults)
+        server, base_url = mock_api.serve(state)
+        servers.append(server)
+        client = api_client.configure(base_url=base_url, **{"backoff_s": 0.1, **client_kw})
+        return state, client
+    start.sleeps = sleeps
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_no_faults_single_attempt(api):
+    state, client = api(Faults())
+    assert client.fetch_balances("t")[1] == 200
+    assert state.statuses == {"balances": {200: 1}}
+    assert api.sleeps == []
+    assert client.stats()[api_client.BALANCES_PATH]["ok"] == 1
+
+def test_5xx_retries_with_exponential_backoff_then_returns_last(api):
+    state, client = api(Faults(p5xx=1.0), retries=3, backoff_max_s=0.3)
+    resp = client.get(api_client.BALANCES_PATH, "t")
+    assert resp.status_code in mock_api.SERVER_ERRORS
+    assert sum(state.statuses["balances"].values()) == 4
+    assert api.sleeps == pytest.approx([0.1, 0.2, 0.3])  # 0.1·2^n, потолок backoff_max_s
+    st = client.stats()[api_client.BALANCES_PATH]
+    assert (st["retry"], st["error"], st["ok"]) == (3, 1, 0)
+
+def test_429_waits_for_retry_after(api):
+    state, client = api(Faults(p429=1.0, retry_after_s=2), retries=2)
+    assert client.get(api_client.BALANCES_PATH, "t").status_code == 429
+    assert state.statuses == {"balances": {429: 3}}
+    assert api.sleeps == [2.0, 2.0]  # Retry-After больше экспоненциальной задержки
+
+def test_retry_after_does_not_shorten_backoff(api):
+    _, client = api(Faults(p429=1.0, retry_after_s=0), retries=2, backoff_s=0.5)
+    client.get(api_client.BALANCES_PATH, "t")
+    assert api.sleeps == [0.5, 1.0]
+
+def test_recovers_after_transient_failures(api, monkeypatch):
+    # две первые попытки — 5xx, третья проходит
+    rolls = iter([0.0, 0.0])
+    monkeypatch.setattr(mock_api.random, "random", lambda: next(rolls, 0.99))
+    state, client = api(Faults(p5xx=0.5), retries=3)
+    balances, code = client.fetch_balances("t")
+    assert code == 200 and balances
+    assert state.statuses["balances"][200] == 1
+    assert sum(state.statuses["balances"].values()) == 3
+    assert api.sleeps == pytest.approx([0.1, 0.2])
+    st = client.stats()[api_client.BALANCES_PATH]
+    assert (st["retry"], st["ok"], st["error"]) == (2, 1, 0)
+
+def test_4xx_is_not_retried(api):
+    state, client = api(Faults(p401=1.0), retries=3)
+    assert client.fetch_balances("t") == (None, 401)
+    assert state.statuses == {"balances": {401: 1}}
+    assert api.sleeps == []
+
+def test_network_error_raised_after_retries(api):
+    _, client = api(Faults(), retries=2)
+    client.base_url = "http://127.0.0.1:9"  # discard: соединение отклоняется
+    with pytest.raises(requests.ConnectionError):
+        client.get(api_client.BALANCES_PATH, "t")
+    assert api.sleeps == pytest.approx([0.1, 0.2])
+    st = client.stats()[api_client.BALANCES_PATH]
+    assert (st["retry"], st["error"]) == (2, 1)
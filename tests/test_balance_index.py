@@ -0,0 +1,63 @@
+# test_balance_index.py — индекс активов за один проход и запомненные пути
+import pytest
+
+import balance_index
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    balance_index._learned.clear()
+    balance_index._stats.update(fast=0, scan=0)
+
+@pytest.mark.parametrize("raw, num", [
+    (5, 5.0), (2.5, 2.5), ("10", 10.0), ("1.2k", 1200.0), ("3.4M", 3_400_000.0), ("2B", 2e9),
+    (" 1 000 ", 1000.0), ("1_000", 1000.0), ("-5", -5.0), ("1e3", 1000.0), ("+2.5", 2.5),
+])
+def test_coerce_num(raw, num):
+    assert balance_index._coerce_num(raw) == pytest.approx(num)
+
+@pytest.mark.parametrize("raw", [None, True, "abc", "", {"a": 1}, [1]])
+def test_coerce_num_rejects(raw):
+    assert balance_index._coerce_num(raw) is None
+
+def test_build_flat_and_records():
+    index = balance_index.build({
+        "diamond": 5,
+        "data": [{"asset": "EMERALD", "amount": "1.2k"}, {"type": "Sapphire", "balance": 3}],
+    })
+    assert index["diamond"][:2] == (5.0, ("diamond",))
+    assert index["emerald"] == (1200.0, ("data", 0, "amount"), "asset")
+    assert index["sapphire"] == (3.0, ("data", 1, "balance"), "type")
+
+def test_build_prefers_shallowest_occurrence():
+    index = balance_index.build({"diamonds": 7, "history": {"old": {"diamonds": 1}}})
+    assert index["diamonds"][0] == 7.0
+
+@pytest.mark.parametrize("shape", [
+    {"diamond": 5, "emerald": 120, "sapphire": 0},
+    {"balances": {"Diamonds": 5, "Emeralds": "120", "Sapphires": 0}},
+    {"data": [{"asset": "DIAMOND", "amount": 5}, {"asset": "emerald", "amount": 120},
+              {"asset": "sapphire", "amount": 0}]},
+])
+def test_values_all_shapes(shape):
+    assert balance_index.values(shape, ("diamonds", "emeralds", "sapphires")) == {
+        "diamonds": 5.0, "emeralds": 120.0, "sapphires": 0.0,
+    }
+
+def test_second_response_of_same_shape_skips_scan():
+    obj = {"data": [{"asset": "diamond", "amount": 5}, {"asset": "emerald", "amount": 1}]}
+    balance_index.values(obj, ("diamonds", "emeralds"))
+    obj["data"][0]["amount"] = 6
+    assert balance_index.values(obj, ("diamonds", "emeralds")) == {"diamonds": 6.0, "emeralds": 1.0}
+    assert balance_index._stats == {"fast": 1, "scan": 1}
+
+def test_shifted_list_falls_back_to_scan():
+    balance_index.value({"data": [{"asset": "diamond", "amount": 5}, {"asset": "emerald", "amount": 1}]},
+                        "emeralds")
+    shifted = {"data": [{"asset": "emerald", "amount": 9}, {"asset": "diamond", "amount": 5}]}
+    assert balance_index.value(shifted, "emeralds") == 9.0
+    assert balance_index._stats["scan"] == 2
+
+def test_missing_asset_and_empty_response():
+    assert balance_index.values({"diamond": 1}, ("rubies",)) == {"rubies": None}
+    assert balance_index.value(None, "diamonds") is None
+    assert balance_index.value({}, "diamonds") is None
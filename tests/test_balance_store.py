@@ -0,0 +1,123 @@
+# test_balance_store.py — история балансов во временной SQLite и запросы по ней
+import sqlite3, time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import balance_store
+import parallel_runner
+
+T0 = 1_700_000_000.0
+
+@pytest.fixture
+def store(tmp_path):
+    balance_store.configure({"path": str(tmp_path / "balances.db"), "flush_ms": 10})
+    balance_store.set_account("acc1")
+    balance_store.set_batch("b1")
+    yield tmp_path / "balances.db"
+    balance_store._close()
+    balance_store.configure(None)
+
+def snap(diamonds, emeralds, ts, **kw):
+    balance_store.record({"balances": {"Diamonds": diamonds, "Emeralds": emeralds}}, ts=ts, **kw)
+
+def test_record_appends_rows_per_asset(store):
+    snap(10, 5, T0)
+    snap(20, 5, T0 + 10)
+    balance_store.flush()
+    rows = sqlite3.connect(store).execute(
+        "SELECT account, asset, ts, value, batch FROM balances ORDER BY ts, asset").fetchall()
+    assert rows == [("acc1", "diamonds", T0, 10.0, "b1"), ("acc1", "emeralds", T0, 5.0, "b1"),
+                    ("acc1", "diamonds", T0 + 10, 20.0, "b1"), ("acc1", "emeralds", T0 + 10, 5.0, "b1")]
+
+def test_record_skips_unknown_assets_and_empty(store):
+    assert balance_store.record({"balances": {"Diamonds": 1}}) == 1
+    assert balance_store.record(None) == 0
+
+def test_delta_since(store):
+    snap(10, 5, T0)
+    snap(20, 5, T0 + 100)
+    snap(35, 15, T0 + 200)
+    assert balance_store.value_at("diamonds", T0 + 150) == 20.0
+    assert balance_store.delta_since("diamonds", T0 + 150) == 15.0
+    assert balance_store.delta_since("diamonds", T0 + 150, current=40) == 20.0
+    # раньше T истории нет — база = первый снимок после T
+    assert balance_store.delta_since("diamonds", T0 - 1000) == 25.0
+    assert balance_store.delta_since("diamonds", T0, account="other") is None
+
+def test_deltas_since_lists_every_pair(store):
+    snap(10, 5, T0)
+    snap(20, 6, T0 + 100)
+    assert balance_store.deltas_since(T0 + 50) == [
+        {"account": "acc1", "asset": "diamonds", "delta": 10.0},
+        {"account": "acc1", "asset": "emeralds", "delta": 1.0},
+    ]
+
+def test_batch_deltas_start_from_snapshot_before_batch(store):
+    balance_store.set_batch("b0")
+    snap(10, 5, T0)
+    balance_store.set_batch("b1")
+    snap(20, 5, T0 + 100)
+    snap(30, 5, T0 + 200)
+    balance_store.set_account("acc2")
+    snap(7, 0, T0 + 150)
+    snap(9, 0, T0 + 250)
+    got = {(r["account"], r["asset"]): r for r in balance_store.batch_deltas("b1")}
+    assert got["acc1", "diamonds"]["delta"] == 20.0 and got["acc1", "diamonds"]["snapshots"] == 2
+    assert got["acc1", "emeralds"]["delta"] == 0.0
+    # у acc2 до пачки снимков нет — от первого в пачке
+    assert got["acc2", "diamonds"]["delta"] == 2.0
+    assert balance_store.last_batch() == "b1"
+
+def test_credit_latency(store):
+    for ms in (800, 1200, 1000):
+        balance_store.record_credit("diamonds", {"credited": True, "time_to_credit_ms": ms, "polls": 2}, 10)
+    balance_store.record_credit("diamonds", {"credited": False, "time_to_credit_ms": None, "polls": 9}, 10)
+    balance_store.set_batch("b2")
+    balance_store.record_credit("sapphires", {"credited": True, "time_to_credit_ms": 500, "polls": 1}, 10)
+    lat = balance_store.credit_latency()
+    assert lat["diamonds"] == {"n": 4, "credited": 3, "p50": 1000, "p95": 1200, "max": 1200}
+    assert set(balance_store.credit_latency(batch="b2")) == {"sapphires"}
+    assert set(balance_store.credit_latency(asset="diamonds")) == {"diamonds"}
+
+def test_concurrent_writers_batch_into_few_transactions(store):
+    def worker(i):
+        balance_store.set_account(f"w{i}")
+        for k in range(500):
+            balance_store.record({"diamonds": k}, ts=T0 + k)
+
+    writes_before = balance_store._stats["writes"]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(worker, range(8)))
+    balance_store.flush()
+    assert sqlite3.connect(store).execute("SELECT COUNT(*) FROM balances").fetchone() == (4000,)
+    assert balance_store._stats["writes"] - writes_before < 4000 / 10
+
+def test_disabled_store_writes_nothing(tmp_path):
+    balance_store.configure({"enabled": False, "path": str(tmp_path / "off.db")})
+    try:
+        assert balance_store.record({"diamonds": 1}) == 0
+        assert balance_store.delta_since("diamonds", T0) is None
+        assert not (tmp_path / "off.db").exists()
+    finally:
+        balance_store.configure(None)
+
+def test_run_parallel_summary_keeps_batch_id(monkeypatch):
+    def fake_run_account(account, scenarios, batch=None):
+        return [{"account": account, "scenario": s, "ok": True, "delta": 10, "seconds": 0.1} for s in scenarios]
+
+    monkeypatch.setattr(parallel_runner, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(parallel_runner, "run_account", fake_run_account)
+    summary = parallel_runner.run_parallel(["acc1", "acc2"], ["diamonds"], workers=2)
+    assert isinstance(summary["batch"], str) and summary["batch"].startswith("parallel-")
+    assert summary["jobs"] == 2
+
+def test_stop_then_reconfigure_does_not_wait(tmp_path):
+    balance_store.configure({"path": str(tmp_path / "a.db"), "flush_ms": 10})
+    balance_store.record({"diamonds": 1})
+    started = time.perf_counter()
+    balance_store._close()
+    balance_store.configure({"path": str(tmp_path / "b.db")})
+    balance_store._close()
+    balance_store.configure(None)
+    assert time.perf_counter() - started < 2
@@ -0,0 +1,111 @@
+# test_credit_poll.py — условие зачисления и опрос балансов до него
+import asyncio, time
+
+import pytest
+
+import credit_poll
+
+FAST = {"deadline_s": 2, "first_delay_s": 0.001, "max_delay_s": 0.005}
+
+@pytest.mark.parametrize("old, new, expected, ok", [
+    (100, 110, 10, True),
+    (100, 115, 10, True),     # пришло больше ожидаемого
+    (100, 105, 10, False),    # пока частично
+    (100, 90, -10, True),     # списание
+    (100, 110, -10, False),   # знак не тот
+    (100, 101, None, True),   # без expected — любое изменение
+    (100, 100, None, False),
+    (None, 110, 10, False),
+    (100, None, 10, False),
+])
+def test_credited(old, new, expected, ok):
+    assert credit_poll._credited(old, new, expected) is ok
+
+def test_delays_grow_and_stop_at_deadline():
+    delays = list(credit_poll._delays({**credit_poll.DEFAULTS, "deadline_s": 0.05, "first_delay_s": 0.01,
+                                       "max_delay_s": 0.02}, time.perf_counter()))
+    assert delays and all(0 < d <= 0.02 * 1.2 for d in delays)
+
+def _fetcher(values):
+    it = iter(values)
+    return lambda: ({"diamonds": next(it)}, 200)
+
+def test_wait_for_credit_polls_until_expected_delta():
+    res = credit_poll.wait_for_credit(
+        _fetcher([100, 105, 110]), lambda b: b["diamonds"], 100, {"diamonds": 100},
+        flow_done=time.perf_counter(), expected=10, cfg=FAST,
+    )
+    assert res["credited"] and res["polls"] == 4 and res["balances"] == {"diamonds": 110}
+    assert res["time_to_credit_ms"] is not None
+
+def test_wait_for_credit_without_old_value_does_not_poll():
+    res = credit_poll.wait_for_credit(
+        _fetcher([]), lambda b: b["diamonds"], None, {"diamonds": 110},
+        flow_done=time.perf_counter(), expected=10, cfg=FAST,
+    )
+    assert not res["credited"] and res["polls"] == 1 and res["time_to_credit_ms"] is None
+
+def test_wait_for_credit_stops_on_401():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return None, 401
+
+    res = credit_poll.wait_for_credit(fetch, lambda b: b["diamonds"], 100, {"diamonds": 100},
+                                      flow_done=time.perf_counter(), expected=10, cfg=FAST)
+    assert not res["credited"] and len(calls) == 1
+
+def test_wait_for_credit_async():
+    it = iter([100, 110])
+
+    async def fetch():
+        return {"diamonds": next(it)}, 200
+
+    res = asyncio.run(credit_poll.wait_for_credit_async(
+        fetch, lambda b: b["diamonds"], 100, {"diamonds": 100},
+        flow_done=time.perf_counter(), expected=10, cfg=FAST,
+    ))
+    assert res["credited"] and res["polls"] == 3
+
+SPEND = {"expected_delta": {"diamonds": 10, "emeralds": 5, "sapphires": 10},
+         "spend": {"diamonds": {"sapphires": 4}, "emeralds": {"sapphires": 2}}}
+
+def test_expected_deltas_net_out_the_spend():
+    bought = ["diamonds", "sapphires", "diamonds", "emeralds"]
+    assert credit_poll.expected_deltas(bought, SPEND) == {"diamonds": 20, "sapphires": 0, "emeralds": 5}
+    assert credit_poll.expected_deltas(["diamonds"], SPEND) == {"diamonds": 10, "sapphires": -4}
+
+def test_expected_deltas_unknown_gain_waits_for_any_change():
+    cfg = {"expected_delta": {"diamonds": 10}, "spend": {"diamonds": {"sapphires": 4}}}
+    assert credit_poll.expected_deltas(["diamonds", "sapphires"], cfg) == {"diamonds": 10, "sapphires": None}
+    assert credit_poll.expected_deltas(["emeralds"], None) == {"emeralds": None}
+
+def test_wait_for_credits_one_fetch_per_tick_for_all_assets():
+    answers = iter([{"diamonds": 105, "sapphires": 16}, {"diamonds": 110, "sapphires": 16},
+                    {"diamonds": 110, "sapphires": 12}])
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return next(answers), 200
+
+    res = credit_poll.wait_for_credits(
+        fetch, lambda b, a: b[a], {"diamonds": 100, "sapphires": 20}, {"diamonds": 100, "sapphires": 20},
+        flow_done=time.perf_counter(), expected={"diamonds": 10, "sapphires": -8}, cfg=FAST,
+    )
+    assert len(calls) == 3 and res["polls"] == 4
+    assert res["balances"] == {"diamonds": 110, "sapphires": 12}
+    d, s = res["assets"]["diamonds"], res["assets"]["sapphires"]
+    assert d["credited"] and s["credited"] and d["time_to_credit_ms"] <= s["time_to_credit_ms"]
+
+def test_wait_for_credits_reports_each_asset_separately():
+    res = credit_poll.wait_for_credits(
+        lambda: ({"diamonds": 110, "sapphires": 20}, 200), lambda b, a: b[a],
+        {"diamonds": 100, "sapphires": 20}, {"diamonds": 100, "sapphires": 20},
+        flow_done=time.perf_counter(), expected={"diamonds": 10, "sapphires": -4},
+        cfg={**FAST, "deadline_s": 0.05},
+    )
+    assert res["assets"]["diamonds"]["credited"]
+    assert not res["assets"]["sapphires"]["credited"]
+    assert res["assets"]["sapphires"]["time_to_credit_ms"] is None
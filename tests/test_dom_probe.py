@@ -0,0 +1,38 @@
+# test_dom_probe.py — перевод Playwright-селекторов в кандидатов для PROBE_JS
+import dom_probe
+
+def test_split_top_ignores_commas_in_brackets_and_quotes():
+    sel = 'button:has-text("Да, купить"), div[data-x="a,b"], span:has(b, i)'
+    assert dom_probe._split_top(sel) == [
+        'button:has-text("Да, купить")', 'div[data-x="a,b"]', "span:has(b, i)",
+    ]
+
+def test_split_top_drops_empty_parts():
+    assert dom_probe._split_top(" a ,, b ,") == ["a", "b"]
+
+def test_convert_plain_css():
+    assert dom_probe._convert("div.balances__item") == ({"css": "div.balances__item"},)
+
+def test_convert_has_text_escapes_regex():
+    (c,) = dom_probe._convert('button:has-text("Pay ⭐ 10 (x)")')
+    assert c == {"css": "button", "text": r"Pay ⭐ 10 \(x\)"}
+
+def test_convert_has_child_text():
+    (c,) = dom_probe._convert('button:has(span:has-text("Open"))')
+    assert c == {"css": "button", "has": {"css": "span", "text": "Open"}}
+
+def test_convert_list_keeps_order():
+    conv = dom_probe._convert('a.x, button:has-text("OK")')
+    assert [c["css"] for c in conv] == ["a.x", "button"]
+
+def test_convert_rejects_non_css_engines():
+    assert dom_probe._convert("role=button") is None
+    assert dom_probe._convert('text="Play"') is None
+    assert dom_probe._convert('div:text-is("Play")') is None
+
+def test_candidates_tag_source_index():
+    cands = dom_probe.candidates(["a, b", 'button:has-text("Go")'])
+    assert [(c["css"], c["src"]) for c in cands] == [("a", 0), ("b", 0), ("button", 1)]
+
+def test_candidates_none_if_any_selector_unsupported():
+    assert dom_probe.candidates(["a", "role=button"]) is None
@@ -0,0 +1,50 @@
+# test_filelock.py — блокировка чтения-изменения-записи общего файла
+import json, multiprocessing, threading
+
+import filelock
+
+def _bump(path, lock_path, times):
+    lock = filelock.FileLock(lock_path)
+    for _ in range(times):
+        with lock:
+            n = json.loads(path.read_text())["n"]
+            path.write_text(json.dumps({"n": n + 1}))
+
+def test_threads_serialise(tmp_path):
+    path = tmp_path / "counter.json"
+    path.write_text('{"n": 0}')
+    lock = filelock.FileLock(tmp_path / "counter.json.lock")
+
+    def bump():
+        for _ in range(50):
+            with lock:
+                n = json.loads(path.read_text())["n"]
+                path.write_text(json.dumps({"n": n + 1}))
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert json.loads(path.read_text()) == {"n": 200}
+
+def test_processes_serialise(tmp_path):
+    path = tmp_path / "counter.json"
+    path.write_text('{"n": 0}')
+    procs = [multiprocessing.Process(target=_bump, args=(path, tmp_path / "counter.json.lock", 50))
+             for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert json.loads(path.read_text()) == {"n": 200}
+
+def test_lock_is_released_on_error(tmp_path):
+    lock = filelock.FileLock(tmp_path / "x.lock")
+    try:
+        with lock:
+            raise RuntimeError("сбой")
+    except RuntimeError:
+        pass
+    with lock:
+        pass
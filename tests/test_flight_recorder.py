@@ -0,0 +1,114 @@
+# test_flight_recorder.py — нарезка кусков trace по UI-фазам и выбор кусков в persist()
+import pytest
+
+import flight_recorder, tracing
+
+KB = 1024
+
+class FakeTracing:
+    # stop_chunk пишет zip заданного размера; 0 — кусок не появился на диске
+    def __init__(self):
+        self.sizes, self.titles = [], []
+
+    def start(self, **kw):
+        pass
+
+    def start_chunk(self, title=None):
+        self.titles.append(title)
+
+    def stop_chunk(self, path):
+        size = self.sizes.pop(0) if self.sizes else KB
+        if size:
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+
+    def stop(self):
+        pass
+
+class FakeContext:
+    def __init__(self):
+        self.tracing = FakeTracing()
+
+    def on(self, event, fn):
+        pass
+
+@pytest.fixture
+def rec(monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, "_phase_hooks", [])
+    opts = {**flight_recorder.DEFAULTS, "enabled": True, "keep_steps": 10, "dir": str(tmp_path / "flight")}
+    made = []
+
+    def make(**over):
+        r = flight_recorder.start(FakeContext(), {**opts, **over}, "t")
+        made.append(r)
+        return r
+    yield make
+    for r in made:
+        r.close()
+
+def saved(out):
+    return sorted(p.name for p in out.glob("*.zip"))
+
+def test_only_ui_phases_rotate(rec):
+    r = rec()
+    tracing.phase("open_tg")
+    tracing.phase("diamonds/buy", "step")
+    tracing.phase("balances_api", "api")
+    tracing.phase("credit_poll", "api")
+    tracing.phase("token_from_storage", "token")
+    assert r.ctx.tracing.titles == ["start", "open_tg", "diamonds/buy"]
+    assert [c[1] for c in r.chunks] == ["start", "open_tg"]
+
+def test_traced_passes_its_category(rec):
+    r = rec()
+
+    @tracing.traced("balances_api", cat="api")
+    def api():
+        return 1
+
+    @tracing.traced("click_play")
+    def ui():
+        return 1
+
+    api(), ui(), api()
+    assert r.ctx.tracing.titles == ["start", "click_play"]
+
+def test_keep_steps_drops_oldest(rec):
+    r = rec(keep_steps=2)
+    for name in ("a", "b", "c", "d"):
+        tracing.phase(name)
+    assert [c[1] for c in r.chunks] == ["b", "c"]
+    assert len(list(r.tmp.glob("*.zip"))) == 2
+
+def test_persist_keeps_all_that_fit(rec):
+    r = rec(max_mb=10 * KB / 2**20)
+    r.ctx.tracing.sizes = [KB, KB, KB]
+    tracing.phase("a"), tracing.phase("b")
+    out = r.persist("boom")
+    assert saved(out) == ["01-start.zip", "02-a.zip", "03-b.zip"]
+    assert (out / "reason.txt").read_text(encoding="utf-8") == "boom\n"
+    assert (out / "network.har").exists()
+
+def test_persist_takes_contiguous_tail_within_budget(rec):
+    # start 1К, a 3К, b 1К, c 1К (последний режет persist) при бюджете 2.5К: b и c
+    # влезают, a нет и обрывает выборку — start, хоть и влез бы, не сохраняется
+    r = rec(max_mb=2.5 * KB / 2**20)
+    r.ctx.tracing.sizes = [KB, 3 * KB, KB, KB]
+    tracing.phase("a"), tracing.phase("b"), tracing.phase("c")
+    out = r.persist()
+    assert saved(out) == ["01-b.zip", "02-c.zip"]
+
+def test_persist_stops_at_missing_chunk(rec):
+    r = rec()
+    r.ctx.tracing.sizes = [KB, 0, KB]
+    tracing.phase("a"), tracing.phase("b")
+    out = r.persist()
+    assert saved(out) == ["01-b.zip"]
+
+def test_persist_skips_oversized_last_chunk(rec, capsys):
+    r = rec(max_mb=KB / 2**20)
+    r.ctx.tracing.sizes = [KB, 2 * KB]
+    tracing.phase("a")
+    out = r.persist()
+    assert saved(out) == []
+    assert "больше max_mb" in capsys.readouterr().out
@@ -0,0 +1,72 @@
+# test_inventory.py — конец инвентаря и предзагрузка страниц на ответах mock_api
+import threading
+
+import pytest
+
+import inventory
+import mock_api
+
+class MockClient:
+    # вместо HTTP — MockState.inventory_page; запоминает запрошенные страницы
+    def __init__(self, state: mock_api.MockState, shape: str | None = None, meta: dict | None = None):
+        self.state, self.shape, self.meta = state, shape, meta
+        self.pages: list[int] = []
+        self._lock = threading.Lock()
+
+    def get_inventory_page(self, token, page=1, limit=999, **filters):
+        with self._lock:
+            self.pages.append(page)
+        data = self.state.inventory_page(page, limit, self.shape)
+        if self.meta is not None and isinstance(data, dict):
+            # другой конверт пагинации вместо total
+            del data["total"]
+            data.update(self.meta)
+        return data
+
+def read_all(client, page_size=100, prefetch=4):
+    return [item["id"] for item in inventory.iter_inventory("t", page_size, prefetch, client)]
+
+@pytest.mark.parametrize("shape", mock_api.INVENTORY_SHAPES)
+@pytest.mark.parametrize("size", [0, 1, 100, 250, 300])
+def test_every_shape_reads_every_item_once(shape, size):
+    client = MockClient(mock_api.MockState(inventory_size=size), shape)
+    assert read_all(client) == list(range(1, size + 1))
+
+@pytest.mark.parametrize("shape", ["data", "items", "inventory"])
+def test_total_stops_prefetch_at_the_last_page(shape):
+    client = MockClient(mock_api.MockState(inventory_size=250), shape)
+    read_all(client, prefetch=8)
+    assert sorted(client.pages) == [1, 2, 3]
+
+def test_pages_stops_prefetch_at_the_last_page():
+    client = MockClient(mock_api.MockState(inventory_size=250), "data", meta={"meta": {"total_pages": 3}})
+    assert read_all(client, prefetch=8) == list(range(1, 251))
+    assert sorted(client.pages) == [1, 2, 3]
+
+def test_server_limit_below_page_size_is_taken_from_the_first_page():
+    # сервер урезал limit до 50 — последняя страница считается по нему, а не по page_size
+    state = mock_api.MockState(inventory_size=120)
+    client = MockClient(state, "data")
+    real = state.inventory_page
+    state.inventory_page = lambda page, limit, shape=None: real(page, min(limit, 50), shape)
+    assert read_all(client, page_size=100, prefetch=8) == list(range(1, 121))
+    assert sorted(client.pages) == [1, 2, 3]
+
+def test_has_more_ends_without_total():
+    state = mock_api.MockState(inventory_size=250)
+    client = MockClient(state, "items", meta={"has_more": False})
+    real = state.inventory_page
+    state.inventory_page = lambda page, limit, shape=None: {
+        **real(page, limit, shape), "has_more": page * limit < 250}
+    client.meta = {}
+    assert read_all(client) == list(range(1, 251))
+
+def test_plain_list_ends_on_a_short_page():
+    client = MockClient(mock_api.MockState(inventory_size=250), "list")
+    assert read_all(client, prefetch=1) == list(range(1, 251))
+    assert client.pages == [1, 2, 3]
+
+def test_plain_list_full_last_page_ends_on_an_empty_page():
+    client = MockClient(mock_api.MockState(inventory_size=200), "list")
+    assert read_all(client, prefetch=1) == list(range(1, 201))
+    assert client.pages == [1, 2, 3]
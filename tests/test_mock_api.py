@@ -0,0 +1,57 @@
+# test_mock_api.py — выбор отказа, переопределения по эндпоинтам и разбор задержек
+import random
+from collections import Counter
+
+import pytest
+
+import mock_api
+from mock_api import Faults
+
+@pytest.mark.parametrize("r, status", [(0.05, 401), (0.15, 429), (0.45, None), (0.99, None)])
+def test_pick_status_bands_do_not_overlap(monkeypatch, r, status):
+    monkeypatch.setattr(mock_api.random, "random", lambda: r)
+    assert Faults(p401=0.1, p429=0.1, p5xx=0.0).pick_status() == status
+
+def test_pick_status_5xx_band(monkeypatch):
+    monkeypatch.setattr(mock_api.random, "random", lambda: 0.25)
+    assert Faults(p401=0.1, p429=0.1, p5xx=0.1).pick_status() in mock_api.SERVER_ERRORS
+
+def test_pick_status_rates():
+    random.seed(1)
+    faults = Faults(p401=0.05, p429=0.10, p5xx=0.02)
+    n = 20000
+    got = Counter(faults.pick_status() for _ in range(n))
+    assert got[401] / n == pytest.approx(0.05, abs=0.01)
+    assert got[429] / n == pytest.approx(0.10, abs=0.01)
+    assert sum(got[s] for s in mock_api.SERVER_ERRORS) / n == pytest.approx(0.02, abs=0.005)
+
+def test_no_faults_by_default():
+    assert all(Faults().pick_status() is None for _ in range(1000))
+
+def test_endpoint_override_inherits_base():
+    faults = Faults.from_dict({"p429": 0.2, "retry_after_s": 3,
+                               "endpoints": {"purchase": {"p5xx": 0.5}}, "unknown": 1})
+    purchase = faults.for_endpoint("purchase")
+    assert (purchase.p429, purchase.p5xx, purchase.retry_after_s) == (0.2, 0.5, 3)
+    assert faults.for_endpoint("balances") is faults
+
+@pytest.mark.parametrize("spec, parsed", [
+    ("fixed:20", {"kind": "fixed", "ms": 20.0}),
+    ("uniform:10:80", {"kind": "uniform", "min_ms": 10.0, "max_ms": 80.0}),
+    ("exp:30", {"kind": "exp", "mean_ms": 30.0}),
+    ("lognormal:40", {"kind": "lognormal", "median_ms": 40.0, "sigma": 0.5}),
+])
+def test_parse_latency(spec, parsed):
+    assert mock_api.parse_latency(spec) == parsed
+
+def test_parse_latency_rejects_unknown():
+    with pytest.raises(ValueError):
+        mock_api.parse_latency("pareto:3")
+
+def test_sample_latency_bounds():
+    random.seed(2)
+    assert mock_api.sample_latency_ms(None) == 0.0
+    assert mock_api.sample_latency_ms({"kind": "fixed", "ms": 7}) == 7
+    assert all(10 <= mock_api.sample_latency_ms({"kind": "uniform", "min_ms": 10, "max_ms": 20}) <= 20
+               for _ in range(200))
+    assert mock_api.sample_latency_ms({"kind": "fixed", "ms": 5, "spike_p": 1.0, "spike_ms": 100}) == 105
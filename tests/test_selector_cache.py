@@ -0,0 +1,95 @@
+# test_selector_cache.py — порядок вариантов, вытеснение победителя и слияние в save()
+import json
+
+import pytest
+
+import selector_cache
+
+VARIANTS = ["a", "b", "c"]
+
+@pytest.fixture(autouse=True)
+def cache_file(tmp_path, monkeypatch):
+    # каждый тест — чистое состояние процесса и свой файл кеша
+    monkeypatch.setattr(selector_cache, "CACHE_FILE", tmp_path / "selector_cache.json")
+    monkeypatch.setattr(selector_cache, "_cache", None)
+    monkeypatch.setattr(selector_cache, "_changed", {})
+    monkeypatch.setattr(selector_cache, "_stats", {})
+    return tmp_path / "selector_cache.json"
+
+def restart():
+    # как новый процесс: память пуста, всё читается из файла
+    selector_cache._cache = None
+    selector_cache._changed.clear()
+
+def win(key: str, variant: str):
+    # как _record_winner: варианты перед сработавшим промахнулись
+    order = selector_cache.ordered(key, VARIANTS)
+    idx = order.index(variant)
+    for sel in order[:idx]:
+        selector_cache.miss(key, sel)
+    selector_cache.hit(key, variant, probes=idx + 1)
+
+def test_winner_goes_first_and_the_rest_keep_their_order():
+    assert selector_cache.ordered("k", VARIANTS) == VARIANTS
+    win("k", "c")
+    assert selector_cache.ordered("k", VARIANTS) == ["c", "a", "b"]
+
+def test_winner_not_among_variants_is_ignored():
+    win("k", "c")
+    assert selector_cache.ordered("k", ["a", "b"]) == ["a", "b"]
+
+def test_one_miss_does_not_replace_the_winner():
+    win("k", "a")
+    win("k", "b")
+    assert selector_cache.ordered("k", VARIANTS)[0] == "a"
+
+def test_winner_is_replaced_after_evict_after_misses_in_a_row():
+    win("k", "a")
+    for _ in range(selector_cache.EVICT_AFTER - 1):
+        win("k", "b")
+        assert selector_cache.ordered("k", VARIANTS)[0] == "a"
+    win("k", "b")
+    assert selector_cache.ordered("k", VARIANTS)[0] == "b"
+    assert selector_cache._stats["k"]["evicted"] == 1
+
+def test_a_hit_resets_the_miss_streak():
+    win("k", "a")
+    for _ in range(selector_cache.EVICT_AFTER - 1):
+        win("k", "b")
+    win("k", "a")
+    for _ in range(selector_cache.EVICT_AFTER - 1):
+        win("k", "b")
+    assert selector_cache.ordered("k", VARIANTS)[0] == "a"
+
+def test_save_keeps_keys_written_by_another_process(cache_file):
+    win("mine", "b")
+    cache_file.write_text(json.dumps({"theirs": {"winner": "c", "misses": 0}}), encoding="utf-8")
+    selector_cache.save()
+    saved = json.loads(cache_file.read_text(encoding="utf-8"))
+    assert saved == {"theirs": {"winner": "c", "misses": 0}, "mine": {"winner": "b", "misses": 0}}
+    assert selector_cache.ordered("theirs", VARIANTS)[0] == "c"
+
+def test_save_drops_an_evicted_winner(cache_file):
+    win("k", "a")
+    selector_cache.save()
+    restart()
+    for _ in range(selector_cache.EVICT_AFTER):
+        selector_cache.miss("k", "a")
+    selector_cache.save()
+    assert "k" not in json.loads(cache_file.read_text(encoding="utf-8"))
+
+def test_save_keeps_a_new_winner_from_another_process_over_an_eviction(cache_file):
+    win("k", "a")
+    selector_cache.save()
+    restart()
+    for _ in range(selector_cache.EVICT_AFTER):
+        selector_cache.miss("k", "a")
+    # пока этот процесс промахивался, другой уже записал нового победителя
+    cache_file.write_text(json.dumps({"k": {"winner": "c", "misses": 0}}), encoding="utf-8")
+    selector_cache.save()
+    assert json.loads(cache_file.read_text(encoding="utf-8"))["k"]["winner"] == "c"
+
+def test_save_without_changes_does_not_touch_the_file(cache_file):
+    selector_cache.ordered("k", VARIANTS)
+    selector_cache.save()
+    assert not cache_file.exists()
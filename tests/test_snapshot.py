@@ -0,0 +1,89 @@
+# test_snapshot.py — атомарная запись и чтение снимков JSONL / .gz
+import gzip, json, os, stat
+
+import pytest
+
+import snapshot
+
+RECORDS = [{"id": 1, "name": "Алмаз"}, {"id": 2, "tags": ["a", "b"]}, {"id": 3, "value": 1.5}]
+
+@pytest.mark.parametrize("name", ["inv.jsonl", "inv.jsonl.gz"])
+def test_write_and_iter_round_trip(tmp_path, name):
+    path = tmp_path / name
+    assert snapshot.write(path, iter(RECORDS)) == len(RECORDS)
+    assert list(snapshot.iter_records(path)) == RECORDS
+
+def test_gz_suffix_compresses(tmp_path):
+    path = tmp_path / "inv.jsonl.gz"
+    snapshot.write(path, RECORDS)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline()) == RECORDS[0]
+
+def test_write_obj_is_plain_json(tmp_path):
+    path = tmp_path / "balances.json"
+    snapshot.write_obj(path, {"diamonds": 5})
+    assert json.loads(path.read_text(encoding="utf-8")) == {"diamonds": 5}
+    assert snapshot.read_obj(path) == {"diamonds": 5}
+
+def test_read_obj_understands_indented_json(tmp_path):
+    path = tmp_path / "old.json"
+    path.write_text(json.dumps({"a": {"b": 1}}, indent=2), encoding="utf-8")
+    assert snapshot.read_obj(path) == {"a": {"b": 1}}
+
+def test_iter_records_stops_at_broken_tail(tmp_path):
+    path = tmp_path / "cut.jsonl"
+    path.write_text('{"id": 1}\n{"id": 2}\n{"id": ', encoding="utf-8")
+    assert list(snapshot.iter_records(path)) == [{"id": 1}, {"id": 2}]
+
+def test_failed_write_keeps_old_snapshot(tmp_path):
+    path = tmp_path / "inv.jsonl"
+    snapshot.write(path, RECORDS)
+
+    def broken():
+        yield {"id": 99}
+        raise RuntimeError("обрыв")
+
+    with pytest.raises(RuntimeError):
+        snapshot.write(path, broken())
+    assert list(snapshot.iter_records(path)) == RECORDS
+    assert [p.name for p in tmp_path.iterdir()] == ["inv.jsonl"]
+
+posix_only = pytest.mark.skipif(os.name != "posix", reason="права файлов — POSIX")
+
+@posix_only
+def test_new_file_is_0644_not_mkstemp_0600(tmp_path):
+    path = tmp_path / "balances.json"
+    snapshot.write_obj(path, {"diamonds": 5})
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+@posix_only
+@pytest.mark.parametrize("name", ["inv.jsonl", "inv.jsonl.gz"])
+def test_rewrite_keeps_existing_mode(tmp_path, name):
+    path = tmp_path / name
+    snapshot.write(path, RECORDS)
+    path.chmod(0o640)
+    snapshot.write(path, RECORDS[:1])
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+    assert list(snapshot.iter_records(path)) == RECORDS[:1]
+
+@pytest.mark.parametrize("name", ["inv.jsonl", "inv.jsonl.gz"])
+def test_data_is_fsynced_before_replace(tmp_path, monkeypatch, name):
+    path = tmp_path / name
+    calls = []
+    real_fsync, real_replace = os.fsync, os.replace
+
+    def fsync(fd):
+        # на диск уходит уже полный файл — с хвостом gzip, если он есть
+        calls.append(("fsync", os.fstat(fd).st_size))
+        real_fsync(fd)
+
+    def replace(src, dst):
+        calls.append(("replace", os.path.getsize(src)))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(snapshot.os, "fsync", fsync)
+    monkeypatch.setattr(snapshot.os, "replace", replace)
+    snapshot.write(path, RECORDS)
+    assert [c[0] for c in calls] == ["fsync", "replace"]
+    assert calls[0][1] == calls[1][1] == path.stat().st_size
+    assert list(snapshot.iter_records(path)) == RECORDS
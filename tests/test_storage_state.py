@@ -0,0 +1,97 @@
+# test_storage_state.py — запись снимка, экспорт в ensure() и общий Chrome для контекстов
+import asyncio, json, os, time
+
+import pytest
+
+import storage_state
+
+STATE = {"cookies": [{"name": "stel_ssid", "value": "1"}], "origins": []}
+
+class FakeContext:
+    def __init__(self, browser=None, state=STATE):
+        self.browser, self.state, self.closed = browser, state, False
+
+    def storage_state(self, **kw):
+        assert "path" not in kw  # снимок пишет snapshot.write_obj, а не Playwright
+        return self.state
+
+    def close(self):
+        self.closed = True
+
+class FakeAsyncContext(FakeContext):
+    async def storage_state(self, **kw):
+        return self.state
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected, self.contexts = True, []
+
+    def is_connected(self):
+        return self.connected
+
+    def new_context(self, **kw):
+        self.contexts.append(kw)
+        return FakeContext(self)
+
+class FakePlaywright:
+    def __init__(self):
+        self.launches = []
+        self.chromium = self
+
+    def launch(self, **kw):
+        self.launches.append(kw)
+        return FakeBrowser()
+
+@pytest.fixture(autouse=True)
+def no_shared_browsers(monkeypatch):
+    monkeypatch.setattr(storage_state, "_browsers", {})
+
+def test_save_replaces_the_snapshot_without_leftovers(tmp_path):
+    path = tmp_path / "profile.state.json"
+    path.write_text("old", encoding="utf-8")
+    storage_state.save(FakeContext(), path)
+    assert json.loads(path.read_text(encoding="utf-8")) == STATE
+    assert os.listdir(tmp_path) == ["profile.state.json"]
+
+def test_save_async(tmp_path):
+    path = tmp_path / "profile.state.json"
+    asyncio.run(storage_state.save_async(FakeAsyncContext(), path))
+    assert json.loads(path.read_text(encoding="utf-8")) == STATE
+
+def test_ensure_keeps_a_fresh_snapshot(tmp_path, monkeypatch):
+    storage_state.state_path(tmp_path / "profile").write_text("{}", encoding="utf-8")
+    monkeypatch.setattr(storage_state, "export", lambda *a, **kw: pytest.fail("лишний экспорт"))
+    assert storage_state.ensure(None, tmp_path / "profile", {}) == tmp_path / "profile.state.json"
+
+def test_ensure_exports_a_stale_snapshot_headless(tmp_path, monkeypatch):
+    path = storage_state.state_path(tmp_path / "profile")
+    path.write_text("{}", encoding="utf-8")
+    os.utime(path, (time.time() - 7200, time.time() - 7200))
+    calls = []
+    monkeypatch.setattr(storage_state, "export", lambda p, d, cfg, **kw: calls.append(kw) or path)
+    assert storage_state.ensure(None, tmp_path / "profile", {"storage_state": {"max_age_h": 1}}) == path
+    assert calls == [{}]  # headless по умолчанию export, без окна
+
+def test_ensure_fails_loudly_when_the_export_fails(tmp_path, monkeypatch):
+    def export(*a, **kw):
+        raise TimeoutError("#LeftColumn не появился")
+    monkeypatch.setattr(storage_state, "export", export)
+    with pytest.raises(RuntimeError, match="storage_state.py --export"):
+        storage_state.ensure(None, tmp_path / "profile", {})
+
+def test_launch_reuses_one_browser_per_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_state, "ensure", lambda p, d, cfg: tmp_path / "s.json")
+    p = FakePlaywright()
+    first = storage_state.launch(p, tmp_path / "profile", {}, headless=True)
+    first.close()
+    second = storage_state.launch(p, tmp_path / "profile", {}, headless=True)
+    assert len(p.launches) == 1 and first.browser is second.browser
+    assert len(second.browser.contexts) == 2
+
+def test_launch_relaunches_a_disconnected_browser(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_state, "ensure", lambda p, d, cfg: tmp_path / "s.json")
+    p = FakePlaywright()
+    storage_state.launch(p, tmp_path / "profile", {}, headless=True).browser.connected = False
+    storage_state.launch(p, tmp_path / "profile", {}, headless=True)
+    storage_state.launch(p, tmp_path / "profile", {}, headless=False)
+    assert [kw["headless"] for kw in p.launches] == [True, True, False]
@@ -0,0 +1,46 @@
+# test_token_cache.py — exp из JWT и отдача токена из auth.json с учётом срока
+import base64, json, time
+
+import token_cache
+
+def jwt(payload: dict) -> str:
+    enc = lambda obj: base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+    return f"{enc({'alg': 'none'})}.{enc(payload)}.sig"
+
+def test_jwt_exp_reads_payload_without_padding():
+    assert token_cache.jwt_exp(jwt({"sub": "1", "exp": 1_900_000_000})) == 1_900_000_000.0
+
+def test_jwt_exp_none_without_exp_or_for_non_jwt():
+    assert token_cache.jwt_exp(jwt({"sub": "1"})) is None
+    assert token_cache.jwt_exp("opaque-token") is None
+    assert token_cache.jwt_exp("a.!!!.c") is None
+
+def test_cache_round_trip(tmp_path):
+    cache = token_cache.TokenCache(tmp_path / "auth.json")
+    token = jwt({"exp": time.time() + 3600})
+    cache.put(token)
+    assert cache.get() == token
+    assert json.loads((tmp_path / "auth.json").read_text(encoding="utf-8"))["auth_token"] == token
+
+def test_token_near_expiry_is_not_returned(tmp_path):
+    cache = token_cache.TokenCache(tmp_path / "auth.json", skew_s=60)
+    cache.put(jwt({"exp": time.time() + 30}))
+    refused = token_cache._stats["refused"]
+    assert cache.get() is None
+    assert token_cache._stats["refused"] == refused + 1
+
+def test_token_without_exp_is_trusted(tmp_path):
+    cache = token_cache.TokenCache(tmp_path / "auth.json")
+    cache.put("opaque-token")
+    assert cache.get() == "opaque-token"
+
+def test_invalidate_only_drops_the_same_token(tmp_path):
+    cache = token_cache.TokenCache(tmp_path / "auth.json")
+    cache.put("new-token")
+    cache.invalidate("old-token")
+    assert cache.get() == "new-token"
+    cache.invalidate("new-token")
+    assert cache.get() is None
+
+def test_for_file_shares_one_cache_per_path(tmp_path):
+    assert token_cache.for_file(tmp_path / "auth.json") is token_cache.for_file(tmp_path / "." / "auth.json")
@@ -0,0 +1,102 @@
+# token_cache.py — auth.json с учётом срока жизни JWT, общий для воркеров
+#
+#   cache = token_cache.for_file(AUTH_FILE)
+#   token = cache.get()          # None, если токена нет или он вот-вот истечёт
+#   cache.put(new_token)
+#
+# Токен, у которого до exp осталось меньше SKEW_S, не отдаётся (сам кэш его не
+# обновляет): вызывающий сразу берёт свежий из TokenSniffer или фрейма WebApp,
+# а не узнаёт о протухшем токене по 401 и второму запросу. Чтение и запись — под файловой блокировкой auth.json.lock,
+# так что процессы parallel_runner и задачи async_flow видят один и тот же токен.
+import base64, json, threading, time
+from pathlib import Path
+
+import filelock
+import snapshot
+
+SKEW_S = 60  # запас до exp: запрос с отданным токеном должен успеть до истечения
+
+_stats = {"hits": 0, "stored": 0, "refused": 0, "got_401": 0}
+_stats_lock = threading.Lock()
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+def jwt_exp(token: str) -> float | None:
+    # exp из payload JWT (без проверки подписи); None — не JWT или нет exp
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+class TokenCache:
+    def __init__(self, path: Path, skew_s: float = SKEW_S):
+        self.path = Path(path)
+        self.skew_s = skew_s
+        self._lock = filelock.FileLock(self.path.with_name(self.path.name + ".lock"))
+
+    def _read(self) -> str | None:
+        try:
+            token = snapshot.read_obj(self.path).get("auth_token")
+            return token.strip() if isinstance(token, str) and token.strip() else None
+        except Exception:
+            return None
+
+    def _fresh(self, token: str) -> bool:
+        exp = jwt_exp(token)
+        return exp is None or exp - time.time() > self.skew_s
+
+    def get(self) -> str | None:
+        with self._lock:
+            token = self._read()
+        if not token:
+            return None
+        if not self._fresh(token):
+            # отказ: токен истекает, свежий берёт вызывающий
+            _count("refused")
+            print(f"[auth] Токен в {self.path.name} истекает — нужен свежий.")
+            return None
+        _count("hits")
+        return token
+
+    def put(self, token: str):
+        if not token:
+            return
+        exp = jwt_exp(token)
+        try:
+            with self._lock:
+                if self._read() == token:
+                    return
+                snapshot.write_obj(self.path, {"auth_token": token, "exp": exp})
+            _count("stored")
+            left = f", живёт ещё {(exp - time.time()) / 60:.0f} мин" if exp else ""
+            print(f"[auth] Токен сохранён в {self.path.name}{left}")
+        except Exception as e:
+            print(f"[auth] Не удалось сохранить токен: {e}")
+
+    def invalidate(self, token: str):
+        # API всё же ответил 401 — токен больше не раздаём
+        _count("got_401")
+        with self._lock:
+            if self._read() == token:
+                self.path.unlink(missing_ok=True)
+
+_caches: dict[Path, TokenCache] = {}
+
+def for_file(path) -> TokenCache:
+    path = Path(path).resolve()
+    if path not in _caches:
+        _caches[path] = TokenCache(path)
+    return _caches[path]
+
+def report():
+    with _stats_lock:
+        s = dict(_stats)
+    if not any(s.values()):
+        return
+    print(f"[auth] токен из кэша: {s['hits']}, сохранено: {s['stored']}, "
+          f"отклонено (истекал): {s['refused']}, 401 получено: {s['got_401']}")
@@ -0,0 +1,67 @@
+# token_sniffer.py — bearer-токен из сетевых запросов WebApp к API
+#
+# Слушатель "request" на контексте ловит заголовок authorization: Bearer из
+# первого же запроса WebApp к API (demo-api-rd.zargates.com). Токен есть в момент,
+# когда приложение авторизовалось, — без обхода localStorage/sessionStorage
+# и фреймов после сценария. Обновлённый приложением токен заменяет прежний.
+import time
+from urllib.parse import urlsplit
+
+import api_client
+
+def log(msg):
+    print(f"[token] {msg}", flush=True)
+
+def _api_host() -> str:
+    return urlsplit(api_client.client().base_url).hostname or "zargates.com"
+
+class TokenSniffer:
+    def __init__(self, ctx, host: str | None = None):
+        self.host = host or _api_host()
+        self.token: str | None = None
+        self.captured_at: float | None = None
+        self._started = time.perf_counter()
+        self._callbacks = []
+        ctx.on("request", self._on_request)
+
+    def on_token(self, fn):
+        # fn(token) — вызывается на каждый новый токен (в т.ч. при обновлении)
+        self._callbacks.append(fn)
+        if self.token:
+            fn(self.token)
+
+    def _on_request(self, request):
+        if urlsplit(request.url).hostname != self.host:
+            return
+        auth = request.headers.get("authorization") or ""
+        if not auth.lower().startswith("bearer "):
+            return
+        token = auth[7:].strip()
+        if not token or token == self.token:
+            return
+        first = self.token is None
+        self.token = token
+        if first:
+            self.captured_at = time.perf_counter()
+            log(f"Токен пойман из запроса к {self.host} через "
+                f"{(self.captured_at - self._started) * 1000:.0f} мс после запуска.")
+        else:
+            log("WebApp обновил токен.")
+        for fn in self._callbacks:
+            try:
+                fn(token)
+            except Exception as e:
+                log(f"Ошибка обработчика токена: {e}")
+
+    def wait(self, page, timeout_ms: int = 5000) -> str | None:
+        # wait_for_timeout прокачивает события Playwright, слушатель успевает сработать
+        deadline = time.perf_counter() + timeout_ms / 1000.0
+        while self.token is None and time.perf_counter() < deadline:
+            page.wait_for_timeout(50)
+        return self.token
+
+    async def wait_async(self, page, timeout_ms: int = 5000) -> str | None:
+        deadline = time.perf_counter() + timeout_ms / 1000.0
+        while self.token is None and time.perf_counter() < deadline:
+            await page.wait_for_timeout(50)
+        return self.token
@@ -0,0 +1,170 @@
+# tracing.py — спаны по фазам сценария: JSONL и Chrome trace-event формат
+#
+# Включение: переменная окружения TRACE=1 или в config.json
+#   "trace": {"enabled": true, "dir": "traces"}
+# В конце прогона flush() пишет traces/<время>-<pid>.jsonl (спан на строку) и
+# .trace.json — открывается в chrome://tracing или ui.perfetto.dev.
+#
+#   with tracing.span("open_tg"):
+#       ...
+#   @tracing.traced("click_play", check=bool)   # check — как понять, что шаг удался
+#
+# Выключенный трейсинг: span() отдаёт общий пустой контекст-менеджер, traced —
+# прямой вызов функции после проверки двух флагов.
+import contextvars, functools, inspect, itertools, os, threading, time
+from pathlib import Path
+
+import snapshot
+
+_enabled = os.environ.get("TRACE", "") not in ("", "0")
+_dir = Path(__file__).with_name("traces")
+_spans: list[tuple] = []
+_lock = threading.Lock()
+_t0_ns = time.perf_counter_ns()
+_epoch0 = time.time()
+
+# «дорожка» в трейсе: сценарий/аккаунт; у каждой asyncio-задачи своя копия контекста
+_lane = contextvars.ContextVar("trace_lane", default=None)
+_lane_ids: dict[str, int] = {}
+_lane_seq = itertools.count(1)
+
+def configure(cfg_section: dict | None):
+    global _enabled, _dir
+    cfg_section = cfg_section or {}
+    if cfg_section.get("enabled"):
+        _enabled = True
+    if cfg_section.get("dir"):
+        _dir = Path(cfg_section["dir"])
+
+def enabled() -> bool:
+    return _enabled
+
+# слушатели границ фаз (flight_recorder): вызываются на входе в traced-функцию и шаг
+# сценария — независимо от того, включены ли спаны; fn(label, cat), cat — как у спана
+_phase_hooks: list = []
+
+def on_phase(fn):
+    if fn not in _phase_hooks:
+        _phase_hooks.append(fn)
+
+def phase(label: str, cat: str = "flow"):
+    for fn in _phase_hooks:
+        fn(label, cat)
+
+def set_lane(name: str):
+    _lane.set(name)
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, ok: bool | None = None, **args):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "outcome", "start")
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.outcome = "ok"
+        self.start = 0
+
+    def set(self, ok: bool | None = None, **args):
+        if ok is not None:
+            self.outcome = "ok" if ok else "fail"
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.outcome = "error"
+            self.args["error"] = f"{exc_type.__name__}: {exc}"[:300]
+        lane = _lane.get() or threading.current_thread().name
+        with _lock:
+            _spans.append((self.name, self.cat, self.start, end, self.outcome, lane, self.args))
+        return False
+
+def span(name: str, cat: str = "flow", **args):
+    return _Span(name, cat, args) if _enabled else _NO_SPAN
+
+def traced(name: str | None = None, cat: str = "flow", check=None):
+    # check(result) -> bool: удался ли шаг (например, bool для click_play)
+    def deco(fn):
+        label = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*a, **kw):
+                if _phase_hooks:
+                    phase(label, cat)
+                if not _enabled:
+                    return await fn(*a, **kw)
+                with span(label, cat) as sp:
+                    res = await fn(*a, **kw)
+                    if check is not None:
+                        sp.set(ok=check(res))
+                    return res
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if _phase_hooks:
+                phase(label, cat)
+            if not _enabled:
+                return fn(*a, **kw)
+            with span(label, cat) as sp:
+                res = fn(*a, **kw)
+                if check is not None:
+                    sp.set(ok=check(res))
+                return res
+        return wrapper
+    return deco
+
+# ----------------- экспорт -----------------
+
+def _lane_id(lane: str) -> int:
+    if lane not in _lane_ids:
+        _lane_ids[lane] = next(_lane_seq)
+    return _lane_ids[lane]
+
+def flush(stem: str | None = None) -> Path | None:
+    # пишет накопленные спаны и очищает буфер; возвращает путь .jsonl
+    with _lock:
+        spans = list(_spans)
+        _spans.clear()
+    if not spans:
+        return None
+    _dir.mkdir(parents=True, exist_ok=True)
+    stem = stem or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    pid = os.getpid()
+    to_ms = lambda ns: round((ns - _t0_ns) / 1e6, 3)
+
+    jsonl = _dir / f"{stem}.jsonl"
+    snapshot.write(jsonl, ({
+        "name": name, "cat": cat, "lane": lane, "pid": pid, "outcome": outcome,
+        "start_ms": to_ms(start), "end_ms": to_ms(end), "dur_ms": round((end - start) / 1e6, 3),
+        "wall_start": round(_epoch0 + (start - _t0_ns) / 1e9, 3), **({"args": args} if args else {}),
+    } for name, cat, start, end, outcome, lane, args in spans))
+
+    events = []
+    for name, cat, start, end, outcome, lane, args in spans:
+        events.append({"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": _lane_id(lane),
+                       "ts": (start - _t0_ns) / 1000, "dur": (end - start) / 1000,
+                       "args": {"outcome": outcome, **args}})
+    events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane}}
+               for lane, tid in _lane_ids.items()]
+    snapshot.write_obj(_dir / f"{stem}.trace.json", {"traceEvents": events, "displayTimeUnit": "ms"})
+    print(f"[trace] {len(spans)} спанов: {jsonl} (+ .trace.json)", flush=True)
+    return jsonl
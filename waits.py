@@ -0,0 +1,152 @@
+# waits.py — ожидание реальных условий вместо фиксированных пауз
+import time
+from playwright.sync_api import TimeoutError as PWTimeout
+
+API_HOST = "zargates.com"
+
+# (метка, бюджет старой паузы в мс, фактическое ожидание в мс, условие выполнено)
+_STATS: list[tuple[str, int, float, bool]] = []
+
+def _record(label: str, budget_ms: int, started: float, ok: bool) -> bool:
+    took_ms = (time.perf_counter() - started) * 1000
+    _STATS.append((label, budget_ms, took_ms, ok))
+    status = "" if ok else " — условие не дождались"
+    print(f"[wait] {label}: {took_ms:.0f} мс (было {budget_ms} мс){status}", flush=True)
+    return ok
+
+# ----------------- селекторы -----------------
+
+# ждёт selector в состоянии state (и enabled, если нужно) на page/frame
+def wait_for(target, selector: str, *, budget_ms: int, label: str,
+             state: str = "visible", enabled: bool = False, timeout_ms: int = 10000) -> bool:
+    started = time.perf_counter()
+    deadline = started + timeout_ms / 1000.0
+    try:
+        target.wait_for_selector(selector, state=state, timeout=timeout_ms)
+    except PWTimeout:
+        return _record(label, budget_ms, started, False)
+    if not enabled:
+        return _record(label, budget_ms, started, True)
+    loc = target.locator(selector).first
+    while time.perf_counter() < deadline:
+        try:
+            if loc.is_enabled():
+                return _record(label, budget_ms, started, True)
+        except Exception:
+            pass
+        target.wait_for_timeout(50)
+    return _record(label, budget_ms, started, False)
+
+# то же для готового локатора (например, «кнопка исчезла после клика»)
+def wait_locator(loc, *, budget_ms: int, label: str, state: str = "visible", timeout_ms: int = 10000) -> bool:
+    started = time.perf_counter()
+    try:
+        loc.wait_for(state=state, timeout=timeout_ms)
+    except PWTimeout:
+        return _record(label, budget_ms, started, False)
+    return _record(label, budget_ms, started, True)
+
+# ----------------- фреймы -----------------
+
+# ждёт фрейм, URL которого содержит один из url_keys; возвращает фрейм или None
+def wait_frame(page, url_keys, *, budget_ms: int, label: str, timeout_ms: int = 30000):
+    started = time.perf_counter()
+
+    def matches(fr) -> bool:
+        u = fr.url or ""
+        return "http" in u and any(k in u for k in url_keys)
+
+    for fr in page.frames:
+        if matches(fr):
+            _record(label, budget_ms, started, True)
+            return fr
+    try:
+        fr = page.wait_for_event("framenavigated", predicate=matches, timeout=timeout_ms)
+    except PWTimeout:
+        _record(label, budget_ms, started, False)
+        return None
+    _record(label, budget_ms, started, True)
+    return fr
+
+# ----------------- сеть: тишина на API WebApp -----------------
+
+# считает незавершённые xhr/fetch-запросы страницы к API WebApp
+class ApiIdleTracker:
+    def __init__(self, page, host: str = API_HOST):
+        self.page = page
+        self.host = host
+        self.inflight = 0
+        self.last_change = time.perf_counter()
+        page.on("request",         self._on_start)
+        page.on("requestfinished", self._on_end)
+        page.on("requestfailed",   self._on_end)
+
+    def _is_api(self, request) -> bool:
+        return self.host in request.url and request.resource_type in ("xhr", "fetch")
+
+    def _on_start(self, request):
+        if self._is_api(request):
+            self.inflight += 1
+            self.last_change = time.perf_counter()
+
+    def _on_end(self, request):
+        if self._is_api(request):
+            self.inflight = max(0, self.inflight - 1)
+            self.last_change = time.perf_counter()
+
+    def wait_idle(self, *, budget_ms: int, label: str, quiet_ms: int = 300, timeout_ms: int = 10000) -> bool:
+        # ждём, пока к API нет запросов в полёте хотя бы quiet_ms
+        started = time.perf_counter()
+        deadline = started + timeout_ms / 1000.0
+        while time.perf_counter() < deadline:
+            quiet_for = (time.perf_counter() - self.last_change) * 1000
+            if self.inflight == 0 and quiet_for >= quiet_ms:
+                return _record(label, budget_ms, started, True)
+            # wait_for_timeout прокачивает события Playwright, счётчик обновляется
+            self.page.wait_for_timeout(50)
+        return _record(label, budget_ms, started, False)
+
+# ----------------- итог -----------------
+
+def report_savings():
+    if not _STATS:
+        return
+    budget = sum(s[1] for s in _STATS)
+    actual = sum(s[2] for s in _STATS)
+    misses = sum(1 for s in _STATS if not s[3])
+    print("\n=== Ожидания: факт vs фиксированные паузы ===")
+    print(f"ожиданий:         {len(_STATS)} (не дождались: {misses})")
+    print(f"было (паузы):     {budget / 1000:.1f} с")
+    print(f"стало (факт):     {actual / 1000:.1f} с")
+    print(f"экономия:         {(budget - actual) / 1000:+.1f} с")
+    print("=============================================\n")
+
+# ----------------- async-версии (playwright.async_api) -----------------
+
+async def wait_for_async(target, selector: str, *, budget_ms: int, label: str,
+                         state: str = "visible", enabled: bool = False, timeout_ms: int = 10000) -> bool:
+    started = time.perf_counter()
+    deadline = started + timeout_ms / 1000.0
+    try:
+        await target.wait_for_selector(selector, state=state, timeout=timeout_ms)
+    except PWTimeout:
+        return _record(label, budget_ms, started, False)
+    if not enabled:
+        return _record(label, budget_ms, started, True)
+    loc = target.locator(selector).first
+    while time.perf_counter() < deadline:
+        try:
+            if await loc.is_enabled():
+                return _record(label, budget_ms, started, True)
+        except Exception:
+            pass
+        await target.wait_for_timeout(50)
+    return _record(label, budget_ms, started, False)
+
+async def wait_locator_async(loc, *, budget_ms: int, label: str, state: str = "visible", timeout_ms: int = 10000) -> bool:
+    started = time.perf_counter()
+    try:
+        await loc.wait_for(state=state, timeout=timeout_ms)
+    except PWTimeout:
+        return _record(label, budget_ms, started, False)
+    return _record(label, budget_ms, started, True)